@@ -5,7 +5,7 @@ echo
 
 echo "Starting Backend (FastAPI)..."
 cd store-be
-gnome-terminal --title="Saiyaara Backend" -- bash -c "python3 -m venv venv && source venv/bin/activate && pip install -r requirements.txt && uvicorn main:app --reload --host 0.0.0.0 --port 8000; exec bash" &
+gnome-terminal --title="Saiyaara Backend" -- bash -c "python3 -m venv venv && source venv/bin/activate && pip install -r requirements.txt && python -m app.migrate && uvicorn main:app --reload --host 0.0.0.0 --port 8000; exec bash" &
 
 echo
 echo "Starting Frontend (React)..."
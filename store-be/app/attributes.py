@@ -0,0 +1,118 @@
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import exists, func, insert, tuple_
+from sqlalchemy.orm import Session
+from app.models import Product, ProductAttribute
+
+MAX_VALUES_PER_ATTRIBUTE = 20
+
+# name:value1|value2, name>=number or name<=number
+_FILTER_PATTERN = re.compile(r"^\s*([\w ]+?)\s*(:|>=|<=)\s*(.+?)\s*$")
+
+def normalise_name(name: str) -> str:
+    return re.sub(r"\s+", "_", name.strip().lower())
+
+def normalise_value(value) -> str:
+    return str(value).strip().lower()
+
+def _number(value: str) -> Optional[float]:
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+def set_attributes(db: Session, updates: Dict[int, Dict[str, List[str]]], replace: bool = False) -> int:
+    """Write attribute values for many products with one DELETE and one INSERT.
+
+    Each named attribute is replaced by the given values (an empty list
+    removes it); with `replace` every other attribute of those products is
+    dropped too. Returns the number of values written. Caller commits.
+    """
+    rows, pairs = [], set()
+    for product_id, attributes in updates.items():
+        for name, values in attributes.items():
+            name = normalise_name(name)
+            if not name:
+                raise HTTPException(status_code=400, detail="Attribute names cannot be empty")
+            values = list(dict.fromkeys(normalise_value(value) for value in values if normalise_value(value)))
+            if len(values) > MAX_VALUES_PER_ATTRIBUTE:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"At most {MAX_VALUES_PER_ATTRIBUTE} values per attribute ({name})"
+                )
+            pairs.add((product_id, name))
+            rows.extend(
+                {"product_id": product_id, "name": name, "value": value, "value_number": _number(value)}
+                for value in values
+            )
+
+    if replace and updates:
+        db.query(ProductAttribute).filter(
+            ProductAttribute.product_id.in_(list(updates))
+        ).delete(synchronize_session=False)
+    elif pairs:
+        db.query(ProductAttribute).filter(
+            tuple_(ProductAttribute.product_id, ProductAttribute.name).in_(list(pairs))
+        ).delete(synchronize_session=False)
+
+    if rows:
+        db.execute(insert(ProductAttribute), rows)
+    return len(rows)
+
+def attributes_for(db: Session, product_ids: Iterable[int]) -> Dict[int, Dict[str, List[str]]]:
+    """Attribute values of many products in one query"""
+    ids = list(set(product_ids))
+    result: Dict[int, Dict[str, List[str]]] = {product_id: {} for product_id in ids}
+    if ids:
+        for product_id, name, value in db.query(
+            ProductAttribute.product_id, ProductAttribute.name, ProductAttribute.value
+        ).filter(ProductAttribute.product_id.in_(ids)).order_by(ProductAttribute.name, ProductAttribute.value):
+            result[product_id].setdefault(name, []).append(value)
+    return result
+
+def parse_filters(specs: Optional[List[str]]) -> List[Tuple[str, str, List[str]]]:
+    """Turn `attr` query values into (name, operator, values) filters"""
+    filters = []
+    for spec in specs or []:
+        match = _FILTER_PATTERN.match(spec)
+        if not match:
+            raise HTTPException(status_code=400, detail=f"Invalid attribute filter: {spec}")
+        name, operator, raw = match.groups()
+        if operator == ":":
+            values = [normalise_value(value) for value in raw.split("|") if value.strip()]
+        else:
+            if _number(raw) is None:
+                raise HTTPException(status_code=400, detail=f"{name}{operator} needs a number")
+            values = [raw]
+        filters.append((normalise_name(name), operator, values))
+    return filters
+
+def filter_conditions(filters: List[Tuple[str, str, List[str]]]) -> list:
+    """One EXISTS per filter against the (name, value) indexes; filters are ANDed, values ORed"""
+    conditions = []
+    for name, operator, values in filters:
+        match = [ProductAttribute.product_id == Product.id, ProductAttribute.name == name]
+        if operator == ":":
+            match.append(ProductAttribute.value.in_(values))
+        elif operator == ">=":
+            match.append(ProductAttribute.value_number >= float(values[0]))
+        else:
+            match.append(ProductAttribute.value_number <= float(values[0]))
+        conditions.append(exists().where(*match))
+    return conditions
+
+def value_counts(db: Session, names: Optional[List[str]] = None) -> Dict[str, Dict[str, int]]:
+    """Active product counts per attribute value, for building filter menus"""
+    query = db.query(
+        ProductAttribute.name, ProductAttribute.value, func.count(ProductAttribute.product_id)
+    ).join(Product, Product.id == ProductAttribute.product_id).filter(Product.is_active == True)
+    if names:
+        query = query.filter(ProductAttribute.name.in_([normalise_name(name) for name in names]))
+
+    counts: Dict[str, Dict[str, int]] = {}
+    for name, value, total in query.group_by(ProductAttribute.name, ProductAttribute.value).order_by(
+        ProductAttribute.name, ProductAttribute.value
+    ):
+        counts.setdefault(name, {})[value] = total
+    return counts
@@ -1,26 +1,38 @@
 from datetime import datetime, timedelta
 from typing import Optional
+import logging
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models import User
 
+logger = logging.getLogger(__name__)
+
 # Configuration
 SECRET_KEY = "your-secret-key-here-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+_pwd_context = None
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+def pwd_context():
+    """The bcrypt context, built on first use so passlib and its backend load outside worker startup"""
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return pwd_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, username: str = None):
     to_encode = data.copy()
@@ -34,26 +46,23 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, u
 
 def verify_token(token: str):
     try:
-        print(f"Verifying token: {token[:20]}...")  # Log first 20 chars of token
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        print(f"Decoded payload: {payload}")
         
         email: str = payload.get("sub")
         if email is None:
-            print("No email in token payload")
+            logger.debug("No email in token payload")
             return None
             
         # Check token expiration
         exp = payload.get("exp")
         if exp and datetime.utcnow() > datetime.utcfromtimestamp(exp):
-            print(f"Token expired at {datetime.utcfromtimestamp(exp)}")
+            logger.debug("Token expired at %s", exp)
             return None
             
-        print(f"Token verified for email: {email}")
         return email
         
     except JWTError as e:
-        print(f"JWT Error: {str(e)}")
+        logger.debug("JWT error: %s", e)
         return None
 
 async def get_current_user(
@@ -66,27 +75,35 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    print(f"Received credentials: {credentials.scheme} {credentials.credentials[:10]}...")
-    
     if not credentials or not credentials.credentials:
-        print("No credentials provided")
+        logger.debug("No credentials provided")
         raise credentials_exception
         
     email = verify_token(credentials.credentials)
     if email is None:
-        print(f"Token verification failed for token: {credentials.credentials[:20]}...")
+        logger.info("Token verification failed")
         raise credentials_exception
     
-    print(f"Looking up user with email: {email}")
     user = db.query(User).filter(User.email == email).first()
     
     if user is None:
-        print(f"No user found with email: {email}")
+        logger.info("No user found for token subject %s", email)
         raise credentials_exception
     
-    print(f"Authenticated user: {user.email}, is_admin: {getattr(user, 'is_admin', False)}")
     return user
 
+async def get_optional_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    db: Session = Depends(get_db)
+) -> Optional[User]:
+    """The signed-in user, or None for guests and invalid tokens"""
+    if not credentials or not credentials.credentials:
+        return None
+    email = verify_token(credentials.credentials)
+    if email is None:
+        return None
+    return db.query(User).filter(User.email == email).first()
+
 async def get_current_active_user(current_user: User = Depends(get_current_user)):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+_MISSING = object()
+
+class TTLCache:
+    """Small in-process cache with per-entry expiry and LRU eviction.
+
+    Values are shared between requests, so callers must store plain data
+    (dicts, lists, tuples) rather than ORM instances bound to a session.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so a load that overlapped one is not stored
+        self._generation = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def _store(self, key: Hashable, value: Any, ttl: float = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def set(self, key: Hashable, value: Any, ttl: float = None):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def get_or_set(self, key: Hashable, loader: Callable[[], Any], ttl: float = None) -> Any:
+        """Return the cached value, calling `loader` on a miss.
+
+        A loaded value is only stored if nothing was invalidated while it
+        loaded; otherwise it may predate the change and would be served
+        stale until it expired.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            generation = self._generation
+            value = loader()
+            with self._lock:
+                if generation == self._generation:
+                    self._store(key, value, ttl)
+        return value
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+            self._generation += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
@@ -0,0 +1,247 @@
+import logging
+import os
+import secrets
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import case, event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
+from app.cache import TTLCache
+from app.database import SessionLocal
+from app.models import Cart, CartLine, Product, User
+from app import pricing
+
+logger = logging.getLogger(__name__)
+
+# Cart configuration
+CART_TTL_DAYS = float(os.getenv("CART_TTL_DAYS", "30"))
+CART_CACHE_TTL = float(os.getenv("CART_CACHE_TTL", "15"))
+CART_CLEANUP_INTERVAL_SECONDS = float(os.getenv("CART_CLEANUP_INTERVAL_SECONDS", "3600"))
+CART_CLEANUP_BATCH_SIZE = 500
+MAX_LINE_QUANTITY = 99
+MAX_CART_LINES = 100
+
+CART_TOKEN_HEADER = "X-Cart-Token"
+
+# Priced carts keyed by cart id; dropped whenever the cart changes
+priced_cache = TTLCache(ttl=CART_CACHE_TTL, maxsize=10000)
+
+def _invalidate_after_commit(db: Session, cart_id: int):
+    db.info.setdefault("stale_carts", set()).add(cart_id)
+
+@event.listens_for(Session, "after_commit")
+def _drop_stale_carts(db):
+    for cart_id in db.info.pop("stale_carts", ()):
+        priced_cache.invalidate(cart_id)
+
+def revalidate(db: Session, lines: Iterable[Tuple[int, int]]) -> dict:
+    """Price and stock-check (product id, quantity) lines with one product query.
+
+    Returns the loaded products, one priced item per line, the problems found
+    (in line order) and the subtotal. Quantities of repeated products are
+    added up for the stock check.
+    """
+    lines = list(lines)
+    requested: "OrderedDict[int, int]" = OrderedDict()
+    for product_id, quantity in lines:
+        requested[product_id] = requested.get(product_id, 0) + quantity
+
+    products = {
+        product.id: product
+        for product in db.query(Product).filter(Product.id.in_(list(requested)), Product.is_active == True)
+    } if requested else {}
+
+    items, issues, subtotal = [], [], 0
+    for product_id, quantity in requested.items():
+        product = products.get(product_id)
+        if product is None:
+            issues.append({"product_id": product_id, "name": None, "reason": "unavailable",
+                           "requested": quantity, "available": 0})
+            continue
+        available = product.stock_quantity or 0
+        if available < quantity:
+            issues.append({"product_id": product_id, "name": product.name, "reason": "insufficient_stock",
+                           "requested": quantity, "available": available})
+
+    for product_id, quantity in lines:
+        product = products.get(product_id)
+        if product is None:
+            continue
+        unit_price = pricing.effective_price(product)
+        subtotal += unit_price * quantity
+        items.append({
+            "product_id": product_id,
+            "name": product.name,
+            "image": (product.images or [None])[0],
+            "quantity": quantity,
+            "unit_price": unit_price,
+            "original_price": product.retail_price,
+            "total_price": round(unit_price * quantity, 2),
+            "available": product.stock_quantity or 0,
+        })
+
+    return {"products": products, "items": items, "issues": issues, "subtotal": subtotal}
+
+def _expiry() -> datetime:
+    return datetime.utcnow() + timedelta(days=CART_TTL_DAYS)
+
+def _touch(db: Session, cart: Cart):
+    cart.expires_at = _expiry()
+    if cart.id is not None:
+        _invalidate_after_commit(db, cart.id)
+
+def _guest_cart(db: Session, token: Optional[str]) -> Optional[Cart]:
+    if not token:
+        return None
+    return db.query(Cart).options(joinedload(Cart.lines)).filter(
+        Cart.token == token, Cart.user_id.is_(None), Cart.expires_at > datetime.utcnow()
+    ).first()
+
+def active_cart_exists(db: Session, token: str) -> bool:
+    """Whether `token` belongs to a cart that has not expired"""
+    return db.query(Cart.id).filter(Cart.token == token, Cart.expires_at > datetime.utcnow()).first() is not None
+
+def _user_cart(db: Session, user: User) -> Optional[Cart]:
+    return db.query(Cart).options(joinedload(Cart.lines)).filter(Cart.user_id == user.id).first()
+
+def merge_guest_cart(db: Session, token: Optional[str], user: User) -> Optional[Cart]:
+    """Fold a guest cart into the user's cart (or hand it over if they have none); caller commits"""
+    guest = _guest_cart(db, token)
+    cart = _user_cart(db, user)
+    if guest is None:
+        return cart
+
+    if cart is None:
+        guest.user_id = user.id
+        _touch(db, guest)
+        return guest
+
+    existing = {line.product_id: line for line in cart.lines}
+    for line in guest.lines:
+        if line.product_id in existing:
+            target = existing[line.product_id]
+            target.quantity = min(target.quantity + line.quantity, MAX_LINE_QUANTITY)
+        elif len(cart.lines) < MAX_CART_LINES:
+            cart.lines.append(CartLine(product_id=line.product_id, quantity=line.quantity))
+    db.delete(guest)
+    _touch(db, cart)
+    return cart
+
+def find_cart(db: Session, token: Optional[str], user: Optional[User], merge: bool = True) -> Optional[Cart]:
+    """The caller's cart; with `merge`, a signed-in user's request with a guest token merges the two"""
+    if user is not None:
+        return merge_guest_cart(db, token, user) if merge else _user_cart(db, user)
+    return _guest_cart(db, token)
+
+def get_or_create_cart(db: Session, token: Optional[str], user: Optional[User]) -> Cart:
+    cart = find_cart(db, token, user)
+    if cart is None:
+        cart = Cart(token=secrets.token_urlsafe(24), user_id=user.id if user else None, expires_at=_expiry())
+        db.add(cart)
+        db.flush()
+    return cart
+
+def change_cart(db: Session, token: Optional[str], user: Optional[User], change: Callable[[Cart], None]) -> Cart:
+    """Apply `change` to the caller's cart (created if needed) and commit.
+
+    Concurrent requests adding the same product, or creating a user's first
+    cart, collide on a unique key; the loser retries once against the rows
+    the winner committed, so its add lands as an increment.
+    """
+    for attempt in range(2):
+        cart = get_or_create_cart(db, token, user)
+        change(cart)
+        try:
+            db.commit()
+            return cart
+        except IntegrityError:
+            db.rollback()
+            if attempt:
+                raise
+
+def set_quantity(db: Session, cart: Cart, product_id: int, quantity: int, add: bool = False):
+    """Set (or with `add`, increase) a line's quantity; 0 removes the line. Caller commits."""
+    if add and quantity < 1:
+        raise HTTPException(status_code=400, detail="Quantity to add must be at least 1")
+
+    line = next((line for line in cart.lines if line.product_id == product_id), None)
+    increment = quantity if add and line is not None else None
+    if increment is not None:
+        quantity += line.quantity
+
+    if quantity < 0 or quantity > MAX_LINE_QUANTITY:
+        raise HTTPException(status_code=400, detail=f"Quantity must be between 0 and {MAX_LINE_QUANTITY}")
+
+    if quantity == 0:
+        if line is not None:
+            cart.lines.remove(line)
+    elif increment is not None:
+        # Added in SQL so concurrent adds of the same product all count
+        total = CartLine.quantity + increment
+        line.quantity = case((total > MAX_LINE_QUANTITY, MAX_LINE_QUANTITY), else_=total)
+    elif line is not None:
+        line.quantity = quantity
+    else:
+        if len(cart.lines) >= MAX_CART_LINES:
+            raise HTTPException(status_code=400, detail=f"A cart holds at most {MAX_CART_LINES} products")
+        exists = db.query(Product.id).filter(Product.id == product_id, Product.is_active == True).first()
+        if not exists:
+            raise HTTPException(status_code=404, detail="Product not found")
+        cart.lines.append(CartLine(product_id=product_id, quantity=quantity))
+    _touch(db, cart)
+
+def clear_cart(db: Session, cart: Cart):
+    cart.lines.clear()
+    _touch(db, cart)
+
+def discard_cart(db: Session, token: Optional[str], user: Optional[User]):
+    """Empty the caller's cart after checkout; caller commits"""
+    cart = find_cart(db, token, user)
+    if cart is not None:
+        clear_cart(db, cart)
+
+def priced_cart(db: Session, cart: Optional[Cart]) -> dict:
+    """The cart with current prices, stock and problems, cached for CART_CACHE_TTL seconds"""
+    if cart is None:
+        return {"token": None, "items": [], "issues": [], "subtotal": 0, "item_count": 0}
+
+    def load():
+        check = revalidate(db, [(line.product_id, line.quantity) for line in cart.lines])
+        return {
+            "token": cart.token,
+            "items": check["items"],
+            "issues": check["issues"],
+            "subtotal": round(check["subtotal"], 2),
+            "item_count": sum(item["quantity"] for item in check["items"]),
+        }
+
+    return priced_cache.get_or_set(cart.id, load)
+
+def cleanup_expired_carts(db: Optional[Session] = None) -> int:
+    """Delete carts untouched for CART_TTL_DAYS in batches; returns the number deleted"""
+    owns_session = db is None
+    db = db or SessionLocal()
+    try:
+        total = 0
+        now = datetime.utcnow()
+        while True:
+            ids: List[int] = [
+                cart_id for (cart_id,) in db.query(Cart.id).filter(Cart.expires_at < now).limit(CART_CLEANUP_BATCH_SIZE)
+            ]
+            if not ids:
+                break
+            db.query(CartLine).filter(CartLine.cart_id.in_(ids)).delete(synchronize_session=False)
+            db.query(Cart).filter(Cart.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+            for cart_id in ids:
+                priced_cache.invalidate(cart_id)
+            total += len(ids)
+
+        if total:
+            logger.info("Deleted %d abandoned carts", total)
+        return total
+    finally:
+        if owns_session:
+            db.close()
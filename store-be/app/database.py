@@ -1,23 +1,32 @@
 from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
+import logging
 from dotenv import load_dotenv
+from app import querycount
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Database URL - use PostgreSQL in production, SQLite for development
 import pathlib
 BASE_DIR = pathlib.Path(__file__).parent.parent
 # Convert to absolute path and normalize for Windows
 DB_PATH = (BASE_DIR / "saiyaara.db").resolve().as_posix()
 DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{DB_PATH}")
-print(f"Using database at: {DB_PATH}")  # Debug print
 
 engine = create_engine(
     DATABASE_URL,
     connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
 )
+logger.info("Using database: %s", engine.url.render_as_string(hide_password=True))
+
+# Per-request statement counting (see app/querycount.py, enabled with SQL_QUERY_DEBUG)
+querycount.install(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -29,3 +38,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def dialect_insert(db, table):
+    """INSERT for the session's database (SQLite or PostgreSQL), so callers can add ON CONFLICT clauses"""
+    insert = postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    return insert(table)
@@ -0,0 +1,93 @@
+import os
+from typing import Dict, List, Optional
+from sqlalchemy import event, func, literal, select, union_all
+from sqlalchemy.orm import Session
+from app.cache import TTLCache
+from app.models import HairAccessory
+from app.schemas import HairAccessory as HairAccessorySchema
+
+# Catalog configuration
+HAIR_FEATURED_CACHE_TTL = float(os.getenv("HAIR_FEATURED_CACHE_TTL", "300"))
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+MAX_FEATURED = 50
+
+# Attributes that can be filtered on and get facet counts, in index order
+FACETS = ("category", "material", "color")
+
+featured_cache = TTLCache(ttl=HAIR_FEATURED_CACHE_TTL, maxsize=MAX_FEATURED)
+
+@event.listens_for(Session, "after_flush")
+def _note_catalog_changes(db, flush_context):
+    if any(isinstance(instance, HairAccessory) for instance in (*db.new, *db.dirty, *db.deleted)):
+        db.info["hair_catalog_changed"] = True
+
+@event.listens_for(Session, "after_commit")
+def _drop_featured(db):
+    if db.info.pop("hair_catalog_changed", False):
+        featured_cache.clear()
+
+def _conditions(filters: Dict[str, Optional[str]], skip: Optional[str] = None) -> list:
+    """WHERE clauses for the attribute filters (all but `skip`), active items only"""
+    conditions = [HairAccessory.is_active == True]
+    for name in FACETS:
+        value = filters.get(name)
+        if value and name != skip:
+            conditions.append(getattr(HairAccessory, name) == value)
+    return conditions
+
+def list_page(
+    db: Session,
+    filters: Dict[str, Optional[str]],
+    cursor: Optional[int] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None
+) -> dict:
+    """One page of matching items, newest first, with the cursor for the next page.
+
+    The cursor is the last id returned, so pages stay stable while items are
+    added and no OFFSET scan is needed.
+    """
+    query = db.query(HairAccessory).filter(*_conditions(filters))
+    if min_price is not None:
+        query = query.filter(HairAccessory.price >= min_price)
+    if max_price is not None:
+        query = query.filter(HairAccessory.price <= max_price)
+    if cursor is not None:
+        query = query.filter(HairAccessory.id < cursor)
+
+    rows = query.order_by(HairAccessory.id.desc()).limit(limit + 1).all()
+    items = rows[:limit]
+    return {"items": items, "next_cursor": items[-1].id if len(rows) > limit else None}
+
+def facet_counts(db: Session, filters: Dict[str, Optional[str]]) -> Dict[str, Dict[str, int]]:
+    """Item counts per value of every attribute, in one UNION ALL query.
+
+    Each attribute is counted under the other attributes' filters, so a
+    selected category still lists its sibling categories.
+    """
+    branches = [
+        select(
+            literal(name).label("facet"),
+            getattr(HairAccessory, name).label("value"),
+            func.count().label("total")
+        ).where(
+            *_conditions(filters, skip=name), getattr(HairAccessory, name).isnot(None)
+        ).group_by(getattr(HairAccessory, name))
+        for name in FACETS
+    ]
+    counts: Dict[str, Dict[str, int]] = {name: {} for name in FACETS}
+    for facet, value, total in db.execute(union_all(*branches)):
+        counts[facet][value] = total
+    return counts
+
+def featured(db: Session, limit: int) -> List[dict]:
+    """Featured in-catalog items, newest first, cached for HAIR_FEATURED_CACHE_TTL seconds"""
+    def load():
+        rows = db.query(HairAccessory).filter(
+            HairAccessory.is_featured == True, HairAccessory.is_active == True
+        ).order_by(HairAccessory.id.desc()).limit(limit).all()
+        return [HairAccessorySchema.model_validate(row).model_dump() for row in rows]
+
+    return featured_cache.get_or_set(limit, load)
@@ -0,0 +1,230 @@
+import logging
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import bindparam, func, select, update, insert, exists
+from sqlalchemy.orm import Session
+from app.models import InventoryLevel, Product
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCATION = "Store"
+
+# Orders take stock from these locations first, in this order; other locations follow, fullest first
+INVENTORY_ALLOCATION_ORDER = [
+    location.strip() for location in os.getenv("INVENTORY_ALLOCATION_ORDER", "Store,Warehouse").split(",")
+    if location.strip()
+]
+TAKE_ATTEMPTS = 3
+
+# Legacy product columns that mirror the on-hand total across locations
+MIRRORED_FIELDS = ("stock", "stock_quantity", "available", "total_qty")
+
+_levels = InventoryLevel.__table__
+
+_take_statement = _levels.update().where(
+    _levels.c.product_id == bindparam("target_product_id"),
+    _levels.c.location == bindparam("level_location"),
+    _levels.c.quantity >= bindparam("amount")
+).values(quantity=_levels.c.quantity - bindparam("amount"), updated_at=func.now())
+
+_add_statement = _levels.update().where(
+    _levels.c.product_id == bindparam("target_product_id"),
+    _levels.c.location == bindparam("level_location")
+).values(quantity=_levels.c.quantity + bindparam("amount"), updated_at=func.now())
+
+def home_location(product: Product) -> str:
+    return product.location or DEFAULT_LOCATION
+
+def _ensure_level(db: Session, product_id: int, location: str) -> InventoryLevel:
+    level = db.query(InventoryLevel).filter(
+        InventoryLevel.product_id == product_id, InventoryLevel.location == location
+    ).first()
+    if level is None:
+        level = InventoryLevel(product_id=product_id, location=location, quantity=0)
+        db.add(level)
+        db.flush()
+    return level
+
+def sync_legacy_fields(db: Session, product_ids: Iterable[int]):
+    """Rewrite the mirrored product columns from the inventory levels in one UPDATE"""
+    ids = list(set(product_ids))
+    if not ids:
+        return
+
+    total = select(func.coalesce(func.sum(InventoryLevel.quantity), 0)).where(
+        InventoryLevel.product_id == Product.id
+    ).scalar_subquery()
+    db.execute(
+        update(Product).where(Product.id.in_(ids)).values({field: total for field in MIRRORED_FIELDS}),
+        execution_options={"synchronize_session": False}
+    )
+
+    # Products already loaded in this session would otherwise keep the old counts
+    for instance in list(db.identity_map.values()):
+        if isinstance(instance, Product) and instance.id in ids:
+            db.expire(instance, list(MIRRORED_FIELDS))
+
+def _category_ids(db: Session, product_ids: Iterable[int]) -> Set[Optional[int]]:
+    return {
+        category_id for (category_id,) in
+        db.query(Product.category_id).filter(Product.id.in_(list(product_ids))).distinct()
+    }
+
+def on_hand(db: Session, product_ids: Iterable[int]) -> Dict[int, int]:
+    """Total on-hand quantity per product across locations"""
+    ids = list(set(product_ids))
+    if not ids:
+        return {}
+    totals = dict(db.query(InventoryLevel.product_id, func.sum(InventoryLevel.quantity)).filter(
+        InventoryLevel.product_id.in_(ids)
+    ).group_by(InventoryLevel.product_id).all())
+    return {product_id: int(totals.get(product_id) or 0) for product_id in ids}
+
+def levels_by_product(db: Session, product_ids: Iterable[int]) -> Dict[int, Dict[str, int]]:
+    """Per-location quantities for many products in one query"""
+    ids = list(set(product_ids))
+    levels: Dict[int, Dict[str, int]] = {product_id: {} for product_id in ids}
+    if ids:
+        for product_id, location, quantity in db.query(
+            InventoryLevel.product_id, InventoryLevel.location, InventoryLevel.quantity
+        ).filter(InventoryLevel.product_id.in_(ids)).order_by(InventoryLevel.location):
+            levels[product_id][location] = quantity
+    return levels
+
+def availability(db: Session, product_ids: Iterable[int], with_locations: bool = False) -> Dict[int, dict]:
+    """Sellable quantity for many products, read from the mirrored totals in one query"""
+    ids = list(set(product_ids))
+    if not ids:
+        return {}
+    rows = db.query(Product.id, Product.stock_quantity, Product.is_active).filter(Product.id.in_(ids)).all()
+    result = {
+        product_id: {
+            "product_id": product_id,
+            "available": (quantity or 0) if is_active else 0,
+            "in_stock": bool(is_active and quantity and quantity > 0),
+        }
+        for product_id, quantity, is_active in rows
+    }
+    if with_locations:
+        for product_id, locations in levels_by_product(db, result).items():
+            result[product_id]["locations"] = locations
+    return result
+
+def allocation_order(levels: Dict[str, int]) -> List[str]:
+    """Locations to take stock from: INVENTORY_ALLOCATION_ORDER first, then the fullest"""
+    preferred = [location for location in INVENTORY_ALLOCATION_ORDER if location in levels]
+    others = sorted(
+        (location for location in levels if location not in INVENTORY_ALLOCATION_ORDER),
+        key=lambda location: -levels[location]
+    )
+    return preferred + others
+
+def set_level(db: Session, product: Product, quantity: int, location: Optional[str] = None):
+    """Set the absolute quantity at a location (the product's home location by default); caller commits"""
+    level = _ensure_level(db, product.id, location or home_location(product))
+    level.quantity = quantity
+    db.flush()
+    sync_legacy_fields(db, [product.id])
+
+def take(db: Session, product: Product, quantity: int) -> Optional[Dict[str, int]]:
+    """Remove `quantity` units across locations; returns {location: units taken} or None if short.
+
+    Each location is decremented with a conditional UPDATE, so concurrent
+    orders can never drive a level below zero. A partial allocation is left
+    in the session when None is returned, so the caller must roll back; on
+    success the caller commits.
+    """
+    db.flush()
+    allocation: Dict[str, int] = {}
+    remaining = quantity
+
+    for _ in range(TAKE_ATTEMPTS):
+        levels = dict(db.query(InventoryLevel.location, InventoryLevel.quantity).filter(
+            InventoryLevel.product_id == product.id
+        ).all())
+        if sum(max(value, 0) for value in levels.values()) < remaining:
+            return None
+
+        for location in allocation_order(levels):
+            amount = min(remaining, levels[location])
+            if amount <= 0:
+                continue
+            result = db.execute(_take_statement, {
+                "target_product_id": product.id, "level_location": location, "amount": amount
+            })
+            # Zero rows means another order got there first; re-read the levels and retry
+            if result.rowcount != 1:
+                break
+            allocation[location] = allocation.get(location, 0) + amount
+            remaining -= amount
+            if not remaining:
+                sync_legacy_fields(db, [product.id])
+                return allocation
+
+    return None
+
+def adjust(db: Session, deltas: Dict[Tuple[int, Optional[str]], int]) -> Set[Optional[int]]:
+    """Add (or with negative deltas, unconditionally remove) units per (product id, location).
+
+    A None location means the product's home location. Used for restocking
+    released reservations. Returns the touched category ids. Caller commits.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return set()
+
+    db.flush()
+    product_ids = {product_id for product_id, _ in deltas}
+    homes = dict(db.query(Product.id, func.coalesce(Product.location, DEFAULT_LOCATION)).filter(
+        Product.id.in_(list(product_ids))
+    ).all())
+
+    totals: Dict[Tuple[int, str], int] = {}
+    for (product_id, location), delta in deltas.items():
+        if product_id not in homes:
+            continue
+        key = (product_id, location or homes[product_id])
+        totals[key] = totals.get(key, 0) + delta
+
+    if not totals:
+        return set()
+    for product_id, location in totals:
+        _ensure_level(db, product_id, location)
+
+    db.execute(_add_statement, [
+        {"target_product_id": product_id, "level_location": location, "amount": delta}
+        for (product_id, location), delta in totals.items()
+    ])
+    sync_legacy_fields(db, homes)
+    return _category_ids(db, homes)
+
+def backfill_inventory(db: Session) -> int:
+    """Create a level for every product that has none, from its legacy stock columns.
+
+    Idempotent; returns the number of levels created. Also normalises the
+    mirrored stock and legacy price columns of the backfilled products.
+    """
+    missing = ~exists().where(InventoryLevel.product_id == Product.id)
+    product_ids = [product_id for (product_id,) in db.query(Product.id).filter(missing)]
+    if not product_ids:
+        return 0
+
+    db.execute(insert(InventoryLevel).from_select(
+        ["product_id", "location", "quantity"],
+        select(
+            Product.id,
+            func.coalesce(Product.location, DEFAULT_LOCATION),
+            func.coalesce(Product.stock_quantity, Product.stock, 0)
+        ).where(Product.id.in_(product_ids))
+    ))
+    sync_legacy_fields(db, product_ids)
+    db.execute(
+        update(Product).where(Product.id.in_(product_ids)).values(
+            price=func.coalesce(Product.offer_price, Product.retail_price, Product.price),
+            original_price=func.coalesce(Product.retail_price, Product.original_price)
+        ),
+        execution_options={"synchronize_session": False}
+    )
+    db.commit()
+    logger.info("Backfilled inventory levels for %d products", len(product_ids))
+    return len(product_ids)
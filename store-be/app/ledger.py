@@ -0,0 +1,113 @@
+import os
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload
+from app.cache import TTLCache
+from app.models import Order, Payment, PaymentStatusHistory
+from app import payment_events
+
+# Clients poll the status endpoint every couple of seconds during checkout
+PAYMENT_STATUS_CACHE_TTL = float(os.getenv("PAYMENT_STATUS_CACHE_TTL", "2"))
+
+status_cache = TTLCache(ttl=PAYMENT_STATUS_CACHE_TTL, maxsize=10000)
+
+# Statuses after which a checkout page stops waiting
+FINAL_STATUSES = {"success", "failed", "refunded"}
+
+def status_channel(transaction_id: str) -> str:
+    """Pub/sub channel carrying status updates for one transaction"""
+    return f"payment-status:{transaction_id}"
+
+def _invalidate_after_commit(db: Session, transaction_id: str):
+    # Dropping the entry before commit would let a concurrent poll re-cache the old status
+    db.info.setdefault("stale_payment_status", set()).add(transaction_id)
+
+@event.listens_for(Session, "after_commit")
+def _drop_stale_statuses(db):
+    for transaction_id in db.info.pop("stale_payment_status", ()):
+        status_cache.invalidate(transaction_id)
+
+def record_attempt(
+    db: Session,
+    order: Optional[Order],
+    gateway: str,
+    transaction_id: str,
+    amount: float
+) -> Payment:
+    """Add a pending ledger row for one payment attempt; caller commits"""
+    payment = Payment(
+        order_id=order.id if order else None,
+        payment_method=gateway,
+        payment_gateway=gateway,
+        transaction_id=transaction_id,
+        amount=amount,
+        status="pending"
+    )
+    payment.history.append(PaymentStatusHistory(from_status=None, to_status="pending", source="initiation"))
+    db.add(payment)
+    _invalidate_after_commit(db, transaction_id)
+    return payment
+
+def find_payment(db: Session, transaction_id: str) -> Optional[Payment]:
+    return db.query(Payment).options(joinedload(Payment.order)).filter(
+        Payment.transaction_id == transaction_id
+    ).first()
+
+def find_latest_payment_for_order(db: Session, order_number: str, gateway: str) -> Optional[Payment]:
+    return db.query(Payment).options(joinedload(Payment.order)).join(Order).filter(
+        Order.order_number == order_number,
+        Payment.payment_gateway == gateway
+    ).order_by(Payment.id.desc()).first()
+
+def transition_payment(db: Session, payment: Payment, new_status: str, source: str) -> bool:
+    """Move a ledger row (and its order) to a new status; returns whether the order's payment status changed.
+
+    The ledger row follows the same transition table as the order, and the
+    order is only touched when the ledger row actually moved. A late result
+    for a superseded attempt (a failure after another attempt paid) still
+    moves its row but not the order, and returns False so nobody is told
+    about it. Without an order, returns whether the row moved. Caller commits.
+    """
+    old_status = payment.status
+    if not payment_events.can_transition(old_status, new_status):
+        return False
+
+    payment.status = new_status
+    if new_status == "success":
+        payment.payment_date = datetime.utcnow()
+    payment.history.append(PaymentStatusHistory(from_status=old_status, to_status=new_status, source=source))
+    _invalidate_after_commit(db, payment.transaction_id)
+
+    if payment.order is None:
+        return True
+    return payment_events.transition_order_payment(db, payment.order, new_status)
+
+def _status_response(transaction_id: str, status: str, order: Optional[Order], amount: Optional[float]) -> dict:
+    return {
+        "transaction_id": transaction_id,
+        "status": status,
+        "message": f"Payment is {status}",
+        "order_number": order.order_number if order else None,
+        "amount": amount
+    }
+
+def get_payment_status(db: Session, transaction_id: str) -> dict:
+    """Status of one transaction from the ledger, cached for PAYMENT_STATUS_CACHE_TTL seconds"""
+    def load():
+        payment = find_payment(db, transaction_id)
+        if payment:
+            return _status_response(transaction_id, payment.status, payment.order, payment.amount)
+
+        # Transactions initiated before the ledger existed only live on the order
+        order = db.query(Order).filter(Order.transaction_id == transaction_id).first()
+        if order:
+            return _status_response(transaction_id, order.payment_status, order, order.total_amount)
+
+        return {
+            "transaction_id": transaction_id,
+            "status": "not_found",
+            "message": "Transaction not found"
+        }
+
+    return status_cache.get_or_set(transaction_id, load)
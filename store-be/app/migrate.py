@@ -0,0 +1,68 @@
+import logging
+import os
+from sqlalchemy import inspect, text
+from app.database import SessionLocal, engine
+from app.models import Base
+from app import inventory
+
+logger = logging.getLogger(__name__)
+
+# Migration configuration: schema changes are a deploy step (python -m app.migrate), not
+# something every worker checks on boot; set true to have workers create missing tables
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "false").lower() == "true"
+
+def add_missing_columns() -> int:
+    """Add nullable columns declared on tables that already existed (create_all never alters a table); returns the number added"""
+    added = 0
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        preparer = connection.dialect.identifier_preparer
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable or column.primary_key:
+                    logger.warning("Column %s.%s is missing and needs a migration", table.name, column.name)
+                    continue
+                connection.execute(text(
+                    f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN "
+                    f"{preparer.format_column(column)} {column.type.compile(dialect=connection.dialect)}"
+                ))
+                logger.info("Added column %s.%s", table.name, column.name)
+                added += 1
+    return added
+
+def create_missing_indexes() -> int:
+    """Create indexes declared on tables that already existed, which create_all skips; returns the number created"""
+    created = 0
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        existing = {
+            table_name: {index["name"] for index in inspector.get_indexes(table_name)}
+            for table_name in Base.metadata.tables
+        }
+        for table in Base.metadata.sorted_tables:
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if index.name not in existing[table.name]:
+                    index.create(bind=connection)
+                    logger.info("Created index %s on %s", index.name, table.name)
+                    created += 1
+    return created
+
+def migrate():
+    """Create missing tables, nullable columns and indexes, then run the idempotent data backfills"""
+    Base.metadata.create_all(bind=engine)
+    logger.info("Database tables created successfully")
+    add_missing_columns()
+    create_missing_indexes()
+
+    # Products created before inventory_levels existed get their stock moved over once
+    with SessionLocal() as db:
+        inventory.backfill_inventory(db)
+
+if __name__ == "__main__":
+    from app.logging_config import configure_logging
+
+    configure_logging()
+    migrate()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, JSON
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, JSON, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -56,7 +56,7 @@ class Product(Base):
     images = Column(JSON)  # List of image URLs
     available = Column(Integer, default=0)
     sold = Column(Integer, default=0)
-    category_id = Column(Integer, ForeignKey("categories.id"))
+    category_id = Column(Integer, ForeignKey("categories.id"), index=True)
     
     # Legacy fields for backward compatibility
     price = Column(Float)
@@ -72,6 +72,10 @@ class Product(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # Order history pages walk a user's orders newest first
+        Index("ix_orders_user_created", "user_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # Nullable for guest orders
@@ -84,7 +88,7 @@ class Order(Base):
     status = Column(String, default="pending")  # pending, processing, shipped, delivered, cancelled
     payment_method = Column(String)
     payment_status = Column(String, default="pending")
-    transaction_id = Column(String, nullable=True)
+    transaction_id = Column(String, nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -96,7 +100,7 @@ class OrderItem(Base):
     __tablename__ = "order_items"
     
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"))
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
     product_id = Column(Integer, ForeignKey("products.id"))
     quantity = Column(Integer)
     price = Column(Float)
@@ -128,6 +132,11 @@ class ProductOffer(Base):
 
 class HairAccessory(Base):
     __tablename__ = "hair_accessories"
+    __table_args__ = (
+        # Catalog browsing filters on these attributes left to right
+        Index("ix_hair_accessories_attributes", "category", "material", "color", "is_active"),
+        Index("ix_hair_accessories_featured", "is_featured", "is_active"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
@@ -152,13 +161,184 @@ class Payment(Base):
     id = Column(Integer, primary_key=True, index=True)
     order_id = Column(Integer, ForeignKey("orders.id"))
     payment_method = Column(String)  # cod, card, bank_transfer, etc.
-    payment_gateway = Column(String, nullable=True)  # stripe, paypal, etc.
-    transaction_id = Column(String, nullable=True)
+    payment_gateway = Column(String, nullable=True)  # jazzcash, easypaisa, etc.
+    transaction_id = Column(String, nullable=True, unique=True, index=True)
     amount = Column(Float)
     currency = Column(String, default="PKR")
-    status = Column(String, default="pending")  # pending, completed, failed, refunded
+    status = Column(String, default="pending")  # pending, success, failed, refunded (same as Order.payment_status)
     payment_date = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     order = relationship("Order", back_populates="payments")
+    history = relationship("PaymentStatusHistory", back_populates="payment", order_by="PaymentStatusHistory.id")
+
+class PaymentStatusHistory(Base):
+    __tablename__ = "payment_status_history"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    payment_id = Column(Integer, ForeignKey("payments.id"), index=True)
+    from_status = Column(String, nullable=True)
+    to_status = Column(String)
+    source = Column(String)  # initiation, callback, reconciliation, admin
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    payment = relationship("Payment", back_populates="history")
+
+class CategoryRollup(Base):
+    """Precomputed product statistics per category, refreshed on product and stock writes"""
+    __tablename__ = "category_rollups"
+    
+    category_id = Column(Integer, primary_key=True)  # 0 for products without a category
+    active_products = Column(Integer, default=0)
+    inactive_products = Column(Integer, default=0)
+    low_stock_products = Column(Integer, default=0)
+    out_of_stock_products = Column(Integer, default=0)
+    inventory_value = Column(Float, default=0.0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class SalesBucket(Base):
+    """Hourly sales per product; product_id 0 holds the order-level totals for the hour"""
+    __tablename__ = "sales_buckets"
+    __table_args__ = (
+        UniqueConstraint("bucket_start", "product_id", name="uq_sales_buckets_bucket_product"),
+        Index("ix_sales_buckets_product_bucket", "product_id", "bucket_start"),
+        Index("ix_sales_buckets_category_bucket", "category_id", "bucket_start"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    bucket_start = Column(DateTime, nullable=False)  # hour, UTC
+    product_id = Column(Integer, nullable=False)
+    category_id = Column(Integer, nullable=True)
+    orders = Column(Integer, default=0)
+    units = Column(Integer, default=0)
+    revenue = Column(Float, default=0.0)
+    paid_orders = Column(Integer, default=0)
+    paid_units = Column(Integer, default=0)
+    paid_revenue = Column(Float, default=0.0)
+
+class PaymentCallbackEvent(Base):
+    """Gateway callbacks already processed, keyed by gateway, reference and result code"""
+    __tablename__ = "payment_callback_events"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    event_key = Column(String, unique=True, index=True, nullable=False)
+    gateway = Column(String)
+    reference = Column(String, index=True)
+    response_code = Column(String, nullable=True)
+    payload = Column(JSON)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class SchedulerLock(Base):
+    """Lease held by the worker that runs background jobs"""
+    __tablename__ = "scheduler_locks"
+    
+    name = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)  # UTC
+
+class StockReservation(Base):
+    """Stock held for an order until its payment succeeds, fails or the hold expires"""
+    __tablename__ = "stock_reservations"
+    __table_args__ = (
+        Index("ix_stock_reservations_status_expires", "status", "expires_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
+    product_id = Column(Integer, ForeignKey("products.id"))
+    location = Column(String, nullable=True)  # inventory location the units came from; None = product's home
+    quantity = Column(Integer, nullable=False)
+    status = Column(String, default="active")  # active, converted, released
+    expires_at = Column(DateTime, nullable=True)  # UTC; only active holds expire
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+class InventoryLevel(Base):
+    """On-hand stock of one product at one location; the source of truth for stock.
+
+    Product.stock, stock_quantity, available and total_qty mirror the sum over
+    locations for older readers and are rewritten whenever a level changes.
+    """
+    __tablename__ = "inventory_levels"
+    __table_args__ = (
+        UniqueConstraint("product_id", "location", name="uq_inventory_levels_product_location"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
+    location = Column(String, nullable=False, default="Store")
+    quantity = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class Cart(Base):
+    """Server-side cart: guests are identified by `token`, signed-in customers by `user_id`"""
+    __tablename__ = "carts"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    token = Column(String, unique=True, index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, unique=True, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)  # UTC; pushed back on every change
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    lines = relationship("CartLine", back_populates="cart", order_by="CartLine.id", cascade="all, delete-orphan")
+
+class CartLine(Base):
+    __tablename__ = "cart_lines"
+    __table_args__ = (
+        UniqueConstraint("cart_id", "product_id", name="uq_cart_lines_cart_product"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    cart_id = Column(Integer, ForeignKey("carts.id"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    
+    cart = relationship("Cart", back_populates="lines")
+
+class ProductAttribute(Base):
+    """One value of a typed product spec (material=gold, stone=pearl, size=7).
+
+    Names and text values are stored lowercased; numeric values are also kept
+    in `value_number` so ranges can be filtered. A product may have several
+    values for one name.
+    """
+    __tablename__ = "product_attributes"
+    __table_args__ = (
+        UniqueConstraint("product_id", "name", "value", name="uq_product_attributes_product_name_value"),
+        # Catalog filters look up products by attribute value
+        Index("ix_product_attributes_name_value", "name", "value", "product_id"),
+        Index("ix_product_attributes_name_number", "name", "value_number", "product_id"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
+    name = Column(String, nullable=False)
+    value = Column(String, nullable=False)
+    value_number = Column(Float, nullable=True)
+
+class ProductNeighbor(Base):
+    """Precomputed "frequently bought together" list: one row per product and rank"""
+    __tablename__ = "product_neighbors"
+    __table_args__ = (
+        Index("ix_product_neighbors_product_rank", "product_id", "rank", unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    rank = Column(Integer, nullable=False)  # 1 = strongest
+    neighbor_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    score = Column(Float, nullable=False)  # cosine similarity of the two products' paid baskets
+    co_orders = Column(Integer, nullable=False)  # paid orders containing both
+    computed_at = Column(DateTime, nullable=False)  # database clock when the job started
+
+class ProductTrend(Base):
+    """Persisted trending score per product (forward-decayed paid units, see app.rankings)"""
+    __tablename__ = "product_trends"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, unique=True)
+    score = Column(Float, nullable=False, default=0.0)
+    epoch = Column(DateTime, nullable=True)  # UTC moment the score is weighted against; NULL for the legacy fixed epoch
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
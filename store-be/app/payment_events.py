@@ -0,0 +1,101 @@
+import hashlib
+import logging
+import math
+import os
+import threading
+from typing import Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import Order, PaymentCallbackEvent
+from app import reservations, sales
+
+logger = logging.getLogger(__name__)
+
+# Deduplication configuration
+CALLBACK_BLOOM_CAPACITY = int(os.getenv("CALLBACK_BLOOM_CAPACITY", "100000"))
+CALLBACK_BLOOM_ERROR_RATE = float(os.getenv("CALLBACK_BLOOM_ERROR_RATE", "0.001"))
+
+# Allowed payment status changes; anything else (including same-state) is a no-op
+PAYMENT_TRANSITIONS = {
+    "pending": {"success", "failed"},
+    "failed": {"success", "pending"},
+    "success": {"refunded"},
+    "refunded": set(),
+}
+
+class BloomFilter:
+    """Probabilistic set: `in` may give false positives but never false negatives"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self._lock = threading.Lock()
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        with self._lock:
+            for position in self._positions(key):
+                self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+seen_events = BloomFilter(CALLBACK_BLOOM_CAPACITY, CALLBACK_BLOOM_ERROR_RATE)
+
+def event_key(gateway: str, reference: str, response_code: Optional[str]) -> str:
+    return f"{gateway}:{reference}:{response_code or ''}"
+
+def register_callback(db: Session, gateway: str, reference: str, response_code: Optional[str], payload: dict) -> bool:
+    """Record a gateway callback; returns False if the same callback was already processed.
+
+    The bloom filter only skips the lookup for keys this process has never
+    seen; the unique index on event_key is what guarantees deduplication
+    across restarts and workers. Must be called before any other change in
+    the session, since a duplicate rolls the session back.
+    """
+    key = event_key(gateway, reference, response_code)
+
+    if key in seen_events and db.query(PaymentCallbackEvent.id).filter(
+        PaymentCallbackEvent.event_key == key
+    ).first():
+        return False
+
+    db.add(PaymentCallbackEvent(
+        event_key=key,
+        gateway=gateway,
+        reference=reference,
+        response_code=response_code,
+        payload=payload
+    ))
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        seen_events.add(key)
+        return False
+
+    seen_events.add(key)
+    return True
+
+def can_transition(old_status: Optional[str], new_status: str) -> bool:
+    return new_status in PAYMENT_TRANSITIONS.get(old_status or "pending", set())
+
+def transition_order_payment(db: Session, order: Order, new_status: str) -> bool:
+    """Move an order to a new payment status; returns False (and changes nothing) if not allowed"""
+    old_status = order.payment_status
+    if not can_transition(old_status, new_status):
+        logger.info(
+            "Ignoring payment status change %s -> %s for order %s", old_status, new_status, order.order_number
+        )
+        return False
+
+    sales.record_payment_transition(db, order, old_status, new_status)
+    reservations.on_payment_status(db, order, new_status)
+    order.payment_status = new_status
+    return True
@@ -0,0 +1,13 @@
+from sqlalchemy import func
+from app.models import Product
+
+# The price a customer pays: the offer when there is one, else the listed price
+effective_price_column = func.coalesce(Product.offer_price, Product.price, Product.retail_price)
+
+def effective_price(product: Product) -> float:
+    return product.offer_price or product.price or product.retail_price or 0
+
+def sync_legacy_prices(product: Product):
+    """Keep the legacy price/original_price columns in step with retail/offer prices"""
+    product.price = product.offer_price or product.retail_price or product.price
+    product.original_price = product.retail_price or product.original_price
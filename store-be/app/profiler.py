@@ -0,0 +1,147 @@
+import os
+import sys
+import threading
+import time
+import itertools
+from collections import Counter, deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Profiling configuration
+PROFILING_ENABLED = os.getenv("PROFILE_SLOW_REQUESTS", "false").lower() == "true"
+# Lets admins profile a single request with the X-Profile header
+PROFILE_ON_DEMAND = os.getenv("PROFILE_ON_DEMAND", "false").lower() == "true"
+PROFILE_THRESHOLD_MS = float(os.getenv("PROFILE_THRESHOLD_MS", "500"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "50"))
+PROFILE_HEADER = "X-Profile"
+
+# Stacks whose innermost frame is in one of these files are idle threads
+# (event loop select, threadpool workers waiting for work) and are not sampled.
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py", os.path.join("concurrent", "futures", "thread.py"))
+
+class ProfileSession:
+    """Samples collected while one request was in flight"""
+
+    def __init__(self):
+        self.stacks = Counter()
+        self.samples = 0
+
+class StackSampler:
+    """Background thread that samples the Python stacks of all busy threads.
+
+    The thread only runs while at least one session is active. Every tick the
+    collapsed stacks are added to each active session, so profiles of
+    overlapping requests include each other's samples.
+    """
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self._sessions = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> ProfileSession:
+        session = ProfileSession()
+        with self._lock:
+            self._sessions.add(session)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+        return session
+
+    def stop(self, session: ProfileSession) -> ProfileSession:
+        """Detach a session; the sampler never touches it once this returns"""
+        with self._lock:
+            self._sessions.discard(session)
+        return session
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            stacks = collapsed_stacks(sys._current_frames(), exclude={own_id})
+            # Sessions are updated under the lock, so a stopped one can be rendered safely
+            with self._lock:
+                if not self._sessions:
+                    self._thread = None
+                    return
+                for session in self._sessions:
+                    session.samples += 1
+                    session.stacks.update(stacks)
+
+            time.sleep(self.interval)
+
+def collapsed_stacks(frames: Dict[int, object], exclude=()) -> List[str]:
+    """Render thread frames as 'outer;...;inner' strings, skipping idle threads"""
+    stacks = []
+    for thread_id, frame in frames.items():
+        if thread_id in exclude or frame.f_code.co_filename.endswith(_IDLE_FILES):
+            continue
+
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            labels.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        stacks.append(";".join(reversed(labels)))
+    return stacks
+
+_ids = itertools.count(1)
+_profiles = deque(maxlen=PROFILE_BUFFER_SIZE)
+_profiles_lock = threading.Lock()
+
+sampler = StackSampler()
+
+def store_profile(method: str, path: str, duration_ms: float, session: ProfileSession) -> int:
+    """Keep a finished profile in the ring buffer and return its id"""
+    profile = {
+        "id": next(_ids),
+        "method": method,
+        "path": path,
+        "duration_ms": round(duration_ms, 2),
+        "samples": session.samples,
+        "created_at": datetime.utcnow().isoformat(),
+        "stacks": session.stacks,
+    }
+    with _profiles_lock:
+        _profiles.append(profile)
+    return profile["id"]
+
+def list_profiles() -> List[dict]:
+    with _profiles_lock:
+        profiles = list(_profiles)
+    return [
+        {key: value for key, value in profile.items() if key != "stacks"}
+        for profile in reversed(profiles)
+    ]
+
+def get_profile(profile_id: int) -> Optional[dict]:
+    with _profiles_lock:
+        for profile in _profiles:
+            if profile["id"] == profile_id:
+                return profile
+    return None
+
+def render_collapsed(profile: dict) -> str:
+    """Collapsed stack text, one 'frames count' line per stack (flamegraph.pl input)"""
+    return "\n".join(f"{stack} {count}" for stack, count in profile["stacks"].most_common()) + "\n"
+
+def is_admin_request(authorization: Optional[str]) -> bool:
+    """Check whether a bearer token belongs to an admin (used for the X-Profile header)"""
+    if not authorization or not authorization.startswith("Bearer "):
+        return False
+
+    from app.auth import verify_token
+    from app.database import SessionLocal
+    from app.models import User
+
+    email = verify_token(authorization.split(" ", 1)[1])
+    if not email:
+        return False
+
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == email).first()
+        return bool(user and user.is_admin and user.is_active)
+    finally:
+        db.close()
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# "local" keeps events inside one process; a redis:// URL shares them between workers
+PUBSUB_URL = os.getenv("PUBSUB_URL", "local")
+
+class Subscription:
+    """Messages for one subscriber; `get` returns None on timeout"""
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=100)
+
+    def _deliver(self, message: dict):
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.warning("Dropping pub/sub message for a slow subscriber")
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+class Broker:
+    """Interface shared by the pub/sub backends"""
+
+    async def publish(self, channel: str, message: dict):
+        raise NotImplementedError
+
+    def subscribe(self, channel: str) -> AsyncIterator[Subscription]:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class LocalBroker(Broker):
+    """In-process broker: events only reach subscribers of the same worker"""
+
+    def __init__(self):
+        self._channels: Dict[str, Set[Subscription]] = {}
+
+    async def publish(self, channel: str, message: dict):
+        for subscription in list(self._channels.get(channel, ())):
+            subscription._deliver(message)
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str):
+        subscription = Subscription()
+        self._channels.setdefault(channel, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            subscribers = self._channels.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[channel]
+
+class RedisBroker(Broker):
+    """Redis pub/sub broker for multi-worker deployments (requires the `redis` package)"""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+
+    async def publish(self, channel: str, message: dict):
+        await self._redis.publish(channel, json.dumps(message, default=str))
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str):
+        subscription = Subscription()
+        pubsub = self._redis.pubsub()
+        await pubsub.subscribe(channel)
+
+        async def pump():
+            async for raw in pubsub.listen():
+                if raw.get("type") == "message":
+                    subscription._deliver(json.loads(raw["data"]))
+
+        task = asyncio.create_task(pump())
+        try:
+            yield subscription
+        finally:
+            task.cancel()
+            await pubsub.unsubscribe(channel)
+            await pubsub.close()
+
+    async def close(self):
+        await self._redis.close()
+
+_broker: Optional[Broker] = None
+
+def get_broker() -> Broker:
+    global _broker
+    if _broker is None:
+        _broker = RedisBroker(PUBSUB_URL) if PUBSUB_URL.startswith("redis") else LocalBroker()
+    return _broker
+
+def set_broker(broker: Broker):
+    """Swap the backend (e.g. a LocalBroker or a fake in tests)"""
+    global _broker
+    _broker = broker
+
+async def close_broker():
+    global _broker
+    if _broker is not None:
+        await _broker.close()
+        _broker = None
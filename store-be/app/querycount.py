@@ -0,0 +1,113 @@
+import logging
+import os
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Query instrumentation configuration
+QUERY_DEBUG = os.getenv("SQL_QUERY_DEBUG", "false").lower() == "true"
+N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+QUERY_WARN_THRESHOLD = int(os.getenv("SQL_QUERY_WARN_THRESHOLD", "30"))
+APP_ENV = os.getenv("APP_ENV", "development")
+
+_current_stats: ContextVar[Optional["QueryStats"]] = ContextVar("query_stats", default=None)
+# Process-wide collectors, used by tests where the app runs on another thread (TestClient)
+_global_stats: List["QueryStats"] = []
+
+_WHITESPACE = re.compile(r"\s+")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+))*\s*\)")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+class QueryStats:
+    """Statements issued while a collector is active, grouped by shape"""
+
+    def __init__(self):
+        self.count = 0
+        self.shapes = Counter()
+
+    def record(self, statement: str):
+        self.count += 1
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> List[Tuple[str, int]]:
+        """Statement shapes issued at least `threshold` times (likely N+1 loops)"""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+def statement_shape(statement: str) -> str:
+    """Normalize a SQL statement so that repeated executions share one key"""
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    shape = _STRING_LITERAL.sub("?", shape)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    return _PLACEHOLDER_LIST.sub("(...)", shape)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement)
+    for global_stats in _global_stats:
+        global_stats.record(statement)
+
+def install(engine):
+    """Attach the statement counter to an engine (no-op unless a collector is active)"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+
+@contextmanager
+def collect_queries():
+    """Count statements executed in the current context, including threadpool work"""
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+@contextmanager
+def assert_query_budget(max_queries: int, allow_n_plus_one: bool = False):
+    """Fail if the block issues more than `max_queries` statements or an N+1 pattern"""
+    stats = QueryStats()
+    _global_stats.append(stats)
+    try:
+        yield stats
+    finally:
+        _global_stats.remove(stats)
+
+    if stats.count > max_queries:
+        raise AssertionError(
+            f"Query budget exceeded: {stats.count} statements (budget {max_queries})\n"
+            + "\n".join(f"  {n}x {shape}" for shape, n in stats.shapes.most_common(10))
+        )
+
+    repeated = stats.repeated()
+    if repeated and not allow_n_plus_one:
+        raise AssertionError(
+            "N+1 query pattern detected:\n"
+            + "\n".join(f"  {n}x {shape}" for shape, n in repeated)
+        )
+
+def report(stats: QueryStats, method: str, path: str, headers=None):
+    """Surface request statistics: response headers in development, logs in production"""
+    repeated = stats.repeated()
+
+    if APP_ENV != "production" and headers is not None:
+        headers["X-SQL-Query-Count"] = str(stats.count)
+        if repeated:
+            headers["X-SQL-N-Plus-One"] = "; ".join(
+                f"{n}x {shape[:120]}" for shape, n in repeated[:3]
+            )
+        return
+
+    if repeated:
+        logger.warning(
+            "N+1 query pattern on %s %s: %d statements, repeated shapes: %s",
+            method, path, stats.count,
+            "; ".join(f"{n}x {shape[:200]}" for shape, n in repeated[:3])
+        )
+    elif stats.count > QUERY_WARN_THRESHOLD:
+        logger.warning("High query count on %s %s: %d statements", method, path, stats.count)
@@ -0,0 +1,295 @@
+import bisect
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import bindparam, event, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
+from app.database import SessionLocal
+from app.models import Order, OrderItem, Product, ProductTrend
+from app.statuses import CANCELLED_STATUS, PAID_STATUS
+
+logger = logging.getLogger(__name__)
+
+# Ranking configuration
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "72"))
+RANKINGS_REFRESH_SECONDS = float(os.getenv("RANKINGS_REFRESH_SECONDS", "60"))
+MAX_RANKING_SIZE = 50
+
+if not 0 < TRENDING_HALF_LIFE_HOURS < math.inf:
+    raise ValueError("TRENDING_HALF_LIFE_HOURS must be a positive number of hours")
+
+# Forward decay: a unit sold at t adds exp(rate * (t - epoch)) to its product's
+# score, so stored scores are only ever added to, yet rank exactly like
+# exponentially decayed sales. Each product_trends row keeps its own epoch. A
+# write more than TRENDING_REBASE_HALF_LIVES half-lives after it moves the row
+# to a new epoch and rescales its score, so weights never leave float range
+# whatever the half-life.
+TRENDING_REBASE_HALF_LIVES = 32
+TREND_WRITE_ATTEMPTS = 5
+# Rows scored before epochs were stored per row
+LEGACY_TRENDING_EPOCH = datetime(2026, 1, 1)
+_DECAY_RATE = math.log(2) / (TRENDING_HALF_LIFE_HOURS * 3600)
+_REBASE_SECONDS = TRENDING_REBASE_HALF_LIVES * TRENDING_HALF_LIFE_HOURS * 3600
+
+_products_table = Product.__table__
+
+_add_sold = _products_table.update().where(_products_table.c.id == bindparam("target_product_id")).values(
+    sold=func.coalesce(_products_table.c.sold, 0) + bindparam("amount")
+)
+def _naive_utc(moment: Optional[datetime]) -> datetime:
+    if moment is None:
+        return datetime.utcnow()
+    if moment.tzinfo is not None:
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def decay_weight(moment: Optional[datetime], epoch: datetime) -> float:
+    """exp(rate * (moment - epoch)): at most 2^TRENDING_REBASE_HALF_LIVES for moments up to now"""
+    return math.exp(_DECAY_RATE * (_naive_utc(moment) - epoch).total_seconds())
+
+class Leaderboard:
+    """Products sorted by a score, overall and per category, for O(k) top-k reads.
+
+    Each list holds (-score, product id) tuples kept sorted with bisect, so
+    an update is a remove and an insort and a read is a slice.
+    """
+
+    ALL = "all"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._scores: Dict[int, Tuple[Optional[int], float]] = {}
+        self._sorted: Dict[object, List[Tuple[float, int]]] = defaultdict(list)
+
+    def load(self, rows: Iterable[Tuple[int, Optional[int], float]]):
+        """Replace everything with (product id, category id, score) rows"""
+        scores, ordered = {}, defaultdict(list)
+        for product_id, category_id, score in rows:
+            if not score:
+                continue
+            scores[product_id] = (category_id, score)
+            ordered[self.ALL].append((-score, product_id))
+            ordered[category_id].append((-score, product_id))
+        for entries in ordered.values():
+            entries.sort()
+        with self._lock:
+            self._scores, self._sorted = scores, ordered
+
+    def add(self, product_id: int, category_id: Optional[int], delta: float):
+        with self._lock:
+            previous_category, score = self._scores.get(product_id, (category_id, 0.0))
+            for key in (self.ALL, previous_category):
+                entries = self._sorted[key]
+                position = bisect.bisect_left(entries, (-score, product_id))
+                if position < len(entries) and entries[position] == (-score, product_id):
+                    del entries[position]
+            score += delta
+            if score <= 0:
+                self._scores.pop(product_id, None)
+                return
+            self._scores[product_id] = (category_id, score)
+            for key in (self.ALL, category_id):
+                bisect.insort(self._sorted[key], (-score, product_id))
+
+    def top(self, category_id: Optional[int], limit: int) -> List[Tuple[int, float]]:
+        with self._lock:
+            entries = self._sorted.get(self.ALL if category_id is None else category_id, [])[:limit]
+        return [(product_id, -negative_score) for negative_score, product_id in entries]
+
+bestsellers = Leaderboard()
+trending = Leaderboard()
+_loaded_at = 0.0
+# Trending scores in memory are all expressed against this epoch, reset on every reload
+_trending_epoch = datetime.utcnow()
+_refreshing = threading.Lock()
+
+def _ensure_trend_rows(db: Session, product_ids: Iterable[int]):
+    product_ids = list(product_ids)
+    existing = {
+        product_id for (product_id,) in
+        db.query(ProductTrend.product_id).filter(ProductTrend.product_id.in_(product_ids))
+    }
+    for product_id in product_ids:
+        if product_id in existing:
+            continue
+        try:
+            with db.begin_nested():
+                db.add(ProductTrend(product_id=product_id, score=0.0, epoch=datetime.utcnow()))
+        except IntegrityError:
+            pass  # another order created it first
+
+def _add_trend_score(db: Session, product_id: int, units: int, ordered_at: Optional[datetime]) -> Tuple[float, datetime]:
+    """Add weighted units to a product's trending score; returns the amount added and the epoch it is against.
+
+    Adds are atomic UPDATEs conditional on the row's epoch; moving a row to a
+    new epoch is a compare-and-set on the score. Either way a concurrent
+    rebase makes the UPDATE miss, and the row is read again.
+    """
+    now = datetime.utcnow()
+    for _ in range(TREND_WRITE_ATTEMPTS):
+        score, epoch = db.query(ProductTrend.score, ProductTrend.epoch).filter(
+            ProductTrend.product_id == product_id
+        ).one()
+        row = db.query(ProductTrend).filter(
+            ProductTrend.product_id == product_id,
+            ProductTrend.epoch.is_(None) if epoch is None else ProductTrend.epoch == epoch
+        )
+        if epoch is not None and (now - epoch).total_seconds() <= _REBASE_SECONDS:
+            amount = units * decay_weight(ordered_at, epoch)
+            updated = row.update({ProductTrend.score: ProductTrend.score + amount}, synchronize_session=False)
+        else:
+            epoch, rescale = now, decay_weight(epoch or LEGACY_TRENDING_EPOCH, now)
+            amount = units * decay_weight(ordered_at, epoch)
+            updated = row.filter(ProductTrend.score == score).update(
+                {ProductTrend.score: score * rescale + amount, ProductTrend.epoch: epoch}, synchronize_session=False
+            )
+        if updated:
+            return amount, epoch
+    raise RuntimeError(f"Trending score of product {product_id} kept changing; gave up after {TREND_WRITE_ATTEMPTS} attempts")
+
+def record_paid_units(db: Session, lines: Iterable[Tuple[int, Optional[int], int]], sign: int, ordered_at: Optional[datetime]):
+    """Add (or with sign -1, remove) paid units to `Product.sold` and the trending scores.
+
+    `lines` are (product id, category id, quantity). Both counters are
+    bumped with atomic UPDATEs; the in-process leaderboards follow after
+    commit and the other workers pick it up on their next refresh. Units
+    are weighted by when the order was placed, so a refund takes back
+    exactly what the payment added. Caller commits.
+    """
+    units: Dict[int, int] = defaultdict(int)
+    categories: Dict[int, Optional[int]] = {}
+    for product_id, category_id, quantity in lines:
+        if product_id is not None and quantity:
+            units[product_id] += sign * quantity
+            categories[product_id] = category_id
+    if not units:
+        return
+
+    db.flush()
+    db.execute(_add_sold, [
+        {"target_product_id": product_id, "amount": amount} for product_id, amount in units.items()
+    ])
+    _ensure_trend_rows(db, units)
+    pending = db.info.setdefault("ranking_deltas", [])
+    # Sorted so concurrent orders lock the trend rows in the same order
+    for product_id, amount in sorted(units.items()):
+        score, epoch = _add_trend_score(db, product_id, amount, ordered_at)
+        pending.append((product_id, categories[product_id], amount, score, epoch))
+
+    for instance in list(db.identity_map.values()):
+        if isinstance(instance, Product) and instance.id in units:
+            db.expire(instance, ["sold"])
+
+@event.listens_for(Session, "after_commit")
+def _apply_ranking_deltas(db):
+    global _loaded_at
+    for product_id, category_id, units, score, epoch in db.info.pop("ranking_deltas", ()):
+        bestsellers.add(product_id, category_id, units)
+        if (epoch - _trending_epoch).total_seconds() > _REBASE_SECONDS:
+            # Unread for longer than the rebase window: reload rather than overflow
+            _loaded_at = 0.0
+        else:
+            trending.add(product_id, category_id, score * decay_weight(epoch, _trending_epoch))
+
+@event.listens_for(Session, "after_rollback")
+def _drop_ranking_deltas(db):
+    db.info.pop("ranking_deltas", None)
+
+def reload(db: Optional[Session] = None):
+    """Load both leaderboards from products.sold and the persisted trending snapshot"""
+    global _loaded_at, _trending_epoch
+    owns_session = db is None
+    db = db or SessionLocal()
+    try:
+        bestsellers.load(db.query(Product.id, Product.category_id, Product.sold).filter(
+            Product.is_active == True, Product.sold > 0
+        ))
+        # Rows are on different epochs; bring them to one (scores of long-idle rows may round to 0)
+        epoch = datetime.utcnow()
+        trending.load(
+            (product_id, category_id, score * decay_weight(row_epoch or LEGACY_TRENDING_EPOCH, epoch))
+            for product_id, category_id, score, row_epoch in db.query(
+                ProductTrend.product_id, Product.category_id, ProductTrend.score, ProductTrend.epoch
+            ).join(Product, Product.id == ProductTrend.product_id).filter(
+                Product.is_active == True, ProductTrend.score > 0
+            )
+        )
+        _trending_epoch = epoch
+        _loaded_at = time.monotonic()
+    finally:
+        if owns_session:
+            db.close()
+
+def _reload_in_background():
+    try:
+        reload()
+    except Exception:
+        logger.exception("Ranking reload failed")
+    finally:
+        _refreshing.release()
+
+def _fresh():
+    """Load on first use; reload in the background once older than RANKINGS_REFRESH_SECONDS"""
+    if not _loaded_at:
+        with _refreshing:
+            if not _loaded_at:
+                reload()
+    elif time.monotonic() - _loaded_at > RANKINGS_REFRESH_SECONDS and _refreshing.acquire(blocking=False):
+        threading.Thread(target=_reload_in_background, name="rankings-reload", daemon=True).start()
+
+def _products(db: Session, ranked: List[Tuple[int, float]], limit: int) -> List[Product]:
+    """The ranked products that are still active, in rank order, from one query"""
+    ids = [product_id for product_id, _ in ranked]
+    products = {
+        product.id: product for product in db.query(Product).options(joinedload(Product.category)).filter(
+            Product.id.in_(ids), Product.is_active == True
+        )
+    } if ids else {}
+    return [products[product_id] for product_id in ids if product_id in products][:limit]
+
+# A few spare entries cover products deactivated since the last reload
+_SPARE = 5
+
+def top_bestsellers(db: Session, category_id: Optional[int], limit: int) -> List[Product]:
+    _fresh()
+    return _products(db, bestsellers.top(category_id, limit + _SPARE), limit)
+
+def top_trending(db: Session, category_id: Optional[int], limit: int) -> List[Product]:
+    _fresh()
+    return _products(db, trending.top(category_id, limit + _SPARE), limit)
+
+def rebuild(db: Session) -> int:
+    """Recompute products.sold and the trending snapshot from paid orders; returns products ranked"""
+    sold: Dict[int, int] = defaultdict(int)
+    scores: Dict[int, float] = defaultdict(float)
+    epoch = datetime.utcnow()
+    rows = db.query(Order.created_at, OrderItem.product_id, OrderItem.quantity).join(
+        OrderItem, OrderItem.order_id == Order.id
+    ).filter(
+        OrderItem.product_id.isnot(None),
+        Order.payment_status == PAID_STATUS,
+        func.coalesce(Order.status, "") != CANCELLED_STATUS
+    ).yield_per(1000)
+    for created_at, product_id, quantity in rows:
+        sold[product_id] += quantity or 0
+        scores[product_id] += (quantity or 0) * decay_weight(created_at, epoch)
+
+    db.query(Product).update({Product.sold: 0}, synchronize_session=False)
+    if sold:
+        db.execute(_add_sold, [
+            {"target_product_id": product_id, "amount": amount} for product_id, amount in sold.items()
+        ])
+    db.query(ProductTrend).delete(synchronize_session=False)
+    db.bulk_insert_mappings(ProductTrend, [
+        {"product_id": product_id, "score": score, "epoch": epoch}
+        for product_id, score in scores.items()
+    ])
+    db.commit()
+    reload(db)
+    return len(sold)
@@ -0,0 +1,252 @@
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Hashable, NamedTuple, Optional
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+# Rate limit configuration
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# "local" keeps buckets per process; a redis:// URL shares them between workers
+RATE_LIMIT_URL = os.getenv("RATE_LIMIT_URL", "local")
+# Reverse proxies in front of the app; the client is the address they appended to X-Forwarded-For
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "0"))
+RATE_LIMIT_DEFAULT_PER_MINUTE = float(os.getenv("RATE_LIMIT_DEFAULT_PER_MINUTE", "600"))
+RATE_LIMIT_LOGIN_PER_MINUTE = float(os.getenv("RATE_LIMIT_LOGIN_PER_MINUTE", "5"))
+RATE_LIMIT_SEARCH_PER_MINUTE = float(os.getenv("RATE_LIMIT_SEARCH_PER_MINUTE", "60"))
+ORDER_TRACKING_REQUESTS_PER_MINUTE = float(os.getenv("ORDER_TRACKING_REQUESTS_PER_MINUTE", "10"))
+ORDER_TRACKING_BURST = float(os.getenv("ORDER_TRACKING_BURST", "5"))
+
+class TokenBucketLimiter:
+    """Token buckets per key: bursts of up to `capacity`, refilled at `rate` tokens per second.
+
+    Buckets live in this process. Past `maxsize` keys the least recently
+    used bucket is dropped, which only ever resets it to full.
+    """
+
+    def __init__(self, capacity: float, rate: float, maxsize: int = 100000):
+        self.capacity = capacity
+        self.rate = rate
+        self.maxsize = maxsize
+        self._buckets: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _tokens(self, key: Hashable, now: float) -> float:
+        tokens, updated_at = self._buckets.get(key, (self.capacity, now))
+        return min(self.capacity, tokens + (now - updated_at) * self.rate)
+
+    def retry_after(self, key: Hashable, cost: float = 1.0) -> float:
+        """Seconds until `cost` tokens are available (0 if they are now), without taking any"""
+        with self._lock:
+            tokens = self._tokens(key, time.monotonic())
+        return 0.0 if tokens >= cost else (cost - tokens) / self.rate
+
+    def acquire(self, key: Hashable, cost: float = 1.0) -> float:
+        """Take `cost` tokens; returns 0 on success, otherwise the seconds to wait (nothing is taken)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens = self._tokens(key, now)
+            wait = 0.0 if tokens >= cost else (cost - tokens) / self.rate
+            if not wait:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def check(self, key: Hashable, detail: str = "Too many requests, try again later"):
+        """Take a token or raise 429 with Retry-After"""
+        too_many(self.acquire(key), detail)
+
+def _retry_after_header(wait: float) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(wait)))}
+
+def too_many(wait: float, detail: str = "Too many requests, try again later"):
+    if wait:
+        raise HTTPException(status_code=429, detail=detail, headers=_retry_after_header(wait))
+
+def client_address(request: Request) -> str:
+    if RATE_LIMIT_TRUSTED_PROXIES:
+        forwarded = [part.strip() for part in request.headers.get("X-Forwarded-For", "").split(",") if part.strip()]
+        if len(forwarded) >= RATE_LIMIT_TRUSTED_PROXIES:
+            return forwarded[-RATE_LIMIT_TRUSTED_PROXIES]
+    return request.client.host if request.client else "unknown"
+
+class Policy(NamedTuple):
+    """A bucket per client for requests matching `methods` (empty: all) and the `path` prefix.
+
+    `key` is "ip", "user" (JWT subject, else ip) or "token" (JWT subject,
+    else a live cart's token, else ip). With `query_param` set only requests carrying
+    that parameter match. A None `per_minute` leaves matches unlimited.
+    """
+    name: str
+    methods: FrozenSet[str]
+    path: str
+    capacity: float
+    per_minute: Optional[float]
+    key: str = "ip"
+    query_param: Optional[str] = None
+
+    def matches(self, request: Request) -> bool:
+        return (
+            (not self.methods or request.method in self.methods)
+            and request.url.path.startswith(self.path)
+            and (self.query_param is None or bool(request.query_params.get(self.query_param)))
+        )
+
+# First match wins, so specific routes come before the catch-all
+POLICIES = [
+    # Gateways post callbacks from a handful of addresses; never turn them away
+    Policy("payment-callbacks", frozenset({"POST"}), "/api/payments/jazzcash/callback", 0, None),
+    Policy("payment-callbacks", frozenset({"POST"}), "/api/payments/easypaisa/callback", 0, None),
+    Policy("login", frozenset({"POST"}), "/api/auth/login", 5, RATE_LIMIT_LOGIN_PER_MINUTE),
+    Policy("signup", frozenset({"POST"}), "/api/auth/signup", 3, 3),
+    Policy("order-tracking", frozenset({"POST"}), "/api/orders/track", ORDER_TRACKING_BURST, ORDER_TRACKING_REQUESTS_PER_MINUTE),
+    Policy("payments", frozenset({"POST"}), "/api/payments/", 5, 10, key="user"),
+    # Checkout pages poll the status every couple of seconds
+    Policy("payment-status", frozenset({"GET"}), "/api/payments/status/", 20, 60),
+    Policy("search", frozenset({"GET"}), "/api/products", 20, RATE_LIMIT_SEARCH_PER_MINUTE, query_param="search"),
+    Policy("cart", frozenset({"POST", "PUT", "DELETE"}), "/api/cart", 30, 120, key="token"),
+    Policy("api", frozenset(), "/api/", 100, RATE_LIMIT_DEFAULT_PER_MINUTE),
+]
+
+class Backend:
+    """Interface shared by the bucket stores"""
+
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        """Take one token; returns 0 on success, otherwise the seconds to wait"""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class MemoryBackend(Backend):
+    """Buckets in this process: limits are per worker"""
+
+    def __init__(self):
+        self._limiters: Dict[tuple, TokenBucketLimiter] = {}
+
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        limiter = self._limiters.get((capacity, rate))
+        if limiter is None:
+            limiter = self._limiters.setdefault((capacity, rate), TokenBucketLimiter(capacity, rate))
+        return limiter.acquire(key)
+
+# Refill and take in one round trip; Redis' clock keeps every worker on the same time
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return tostring(wait)
+"""
+
+class RedisBackend(Backend):
+    """Buckets shared by every worker (requires the `redis` package; tests can pass a fakeredis client)"""
+
+    def __init__(self, url: Optional[str] = None, client=None):
+        if client is None:
+            import redis.asyncio as redis
+
+            client = redis.from_url(url)
+        self._redis = client
+        self._take = client.register_script(_TAKE_SCRIPT)
+
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        return float(await self._take(keys=[f"ratelimit:{key}"], args=[capacity, rate]))
+
+    async def close(self):
+        await self._redis.aclose()
+
+_backend: Optional[Backend] = None
+
+def get_backend() -> Backend:
+    """The configured bucket store; main builds it at startup so a bad RATE_LIMIT_URL fails there"""
+    global _backend
+    if _backend is None:
+        _backend = RedisBackend(RATE_LIMIT_URL) if RATE_LIMIT_URL.startswith("redis") else MemoryBackend()
+    return _backend
+
+def set_backend(backend: Backend):
+    """Swap the bucket store (e.g. a RedisBackend over fakeredis in tests)"""
+    global _backend
+    _backend = backend
+
+async def close_backend():
+    global _backend
+    if _backend is not None:
+        await _backend.close()
+        _backend = None
+
+def _cart_exists(token: str) -> bool:
+    from app.carts import active_cart_exists
+    from app.database import SessionLocal
+
+    with SessionLocal() as db:
+        return active_cart_exists(db, token)
+
+async def _client_key(policy: Policy, request: Request) -> str:
+    """The verified identity the policy keys on; headers that don't check out count as the client's address"""
+    if policy.key in ("user", "token"):
+        authorization = request.headers.get("Authorization", "")
+        if authorization.startswith("Bearer "):
+            from app.auth import verify_token
+
+            email = verify_token(authorization[7:])
+            if email:
+                return f"user:{email}"
+        if policy.key == "token":
+            from app.carts import CART_TOKEN_HEADER
+
+            token = request.headers.get(CART_TOKEN_HEADER)
+            if token and await run_in_threadpool(_cart_exists, token):
+                return "cart:" + hashlib.sha256(token.encode()).hexdigest()[:32]
+    return f"ip:{client_address(request)}"
+
+async def check_request(request: Request) -> Optional[JSONResponse]:
+    """A 429 response when the request's policy bucket is empty, else None.
+
+    A backend that cannot be reached lets requests through rather than
+    taking the shop down with it.
+    """
+    if not RATE_LIMIT_ENABLED or request.method == "OPTIONS":
+        return None
+    policy = next((policy for policy in POLICIES if policy.matches(request)), None)
+    if policy is None or policy.per_minute is None:
+        return None
+
+    try:
+        wait = await get_backend().take(
+            f"{policy.name}:{await _client_key(policy, request)}", policy.capacity, policy.per_minute / 60
+        )
+    except Exception as e:
+        logger.warning("Rate limit backend unavailable, allowing request: %s", e)
+        return None
+    if not wait:
+        return None
+    logger.info("Rate limited %s %s under policy %s", request.method, request.url.path, policy.name)
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Too many requests, try again later"},
+        headers=_retry_after_header(wait)
+    )
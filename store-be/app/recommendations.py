@@ -0,0 +1,177 @@
+import argparse
+import logging
+import os
+from typing import TYPE_CHECKING, Iterable, List, Optional, Set
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session, joinedload
+from app.database import SessionLocal
+from app.models import Order, OrderItem, Product, ProductNeighbor
+from app.statuses import PAID_STATUS
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Recommendation configuration
+RECOMMENDATION_TOP_K = int(os.getenv("RECOMMENDATION_TOP_K", "12"))
+RECOMMENDATION_MIN_CO_ORDERS = int(os.getenv("RECOMMENDATION_MIN_CO_ORDERS", "1"))
+RECOMMENDATION_REFRESH_INTERVAL_SECONDS = float(os.getenv("RECOMMENDATION_REFRESH_INTERVAL_SECONDS", "900"))
+REFRESH_BATCH_SIZE = 1000
+
+def _paid_orders():
+    return select(Order.id).where(Order.payment_status == PAID_STATUS)
+
+def _changed_products(db: Session, since) -> Set[int]:
+    """Products in orders whose row changed at or after `since` (payment updates touch updated_at).
+
+    Any status: an order refunded or failed since the last run takes its
+    pairs out of its products' lists.
+    """
+    changed_orders = select(Order.id).where(func.coalesce(Order.updated_at, Order.created_at) >= since)
+    return {
+        product_id for (product_id,) in
+        db.query(OrderItem.product_id).filter(OrderItem.order_id.in_(changed_orders)).distinct()
+        if product_id is not None
+    }
+
+def _baskets(db: Session, product_ids: Set[int]):
+    """(order id, product id) pairs of the paid orders containing any of `product_ids`"""
+    orders = select(OrderItem.order_id).where(
+        OrderItem.order_id.in_(_paid_orders()), OrderItem.product_id.in_(product_ids)
+    )
+    # NumPy and SciPy only load in the worker that runs the job (they add ~150 ms to import time)
+    import numpy as np
+
+    rows = db.query(OrderItem.order_id, OrderItem.product_id).filter(
+        OrderItem.order_id.in_(orders), OrderItem.product_id.isnot(None)
+    ).distinct().all()
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    pairs = np.asarray(rows, dtype=np.int64)
+    return pairs[:, 0], pairs[:, 1]
+
+def _order_counts(db: Session, product_ids: Iterable[int]) -> dict:
+    """Number of paid orders containing each product"""
+    return dict(db.query(OrderItem.product_id, func.count(func.distinct(OrderItem.order_id))).filter(
+        OrderItem.order_id.in_(_paid_orders()), OrderItem.product_id.in_(list(product_ids))
+    ).group_by(OrderItem.product_id).all())
+
+def compute_neighbors(
+    order_ids: "np.ndarray",
+    product_ids: "np.ndarray",
+    targets: List[int],
+    order_counts: dict,
+    top_k: int = RECOMMENDATION_TOP_K,
+    min_co_orders: int = RECOMMENDATION_MIN_CO_ORDERS
+) -> dict:
+    """Top-k neighbours per target product from basket pairs.
+
+    Builds the binary order x product matrix X and takes X[:, targets]^T X,
+    so only the target rows of the co-occurrence matrix are ever formed.
+    Scores are cosine similarities: co_orders / sqrt(orders_i * orders_j).
+    Returns {product id: [(neighbour id, score, co_orders), ...]}.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    result = {product_id: [] for product_id in targets}
+    if not len(order_ids):
+        return result
+
+    order_index, order_rows = np.unique(order_ids, return_inverse=True)
+    product_index, product_columns = np.unique(product_ids, return_inverse=True)
+    baskets = sparse.csr_matrix(
+        (np.ones(len(order_rows), dtype=np.float32), (order_rows, product_columns)),
+        shape=(len(order_index), len(product_index))
+    )
+    counts = np.array([order_counts.get(int(product_id), 0) for product_id in product_index], dtype=np.float64)
+
+    column_of = {int(product_id): column for column, product_id in enumerate(product_index)}
+    present = [product_id for product_id in targets if product_id in column_of]
+    if not present:
+        return result
+    columns = np.array([column_of[product_id] for product_id in present])
+    co_occurrence = (baskets[:, columns].T @ baskets).tocsr()
+
+    for row, product_id in enumerate(present):
+        start, end = co_occurrence.indptr[row], co_occurrence.indptr[row + 1]
+        neighbours = co_occurrence.indices[start:end]
+        together = co_occurrence.data[start:end]
+        keep = (neighbours != columns[row]) & (together >= min_co_orders)
+        neighbours, together = neighbours[keep], together[keep]
+        scores = together / np.sqrt(np.maximum(counts[columns[row]] * counts[neighbours], 1.0))
+        # Highest score first; ties go to the lower product id so reruns are stable
+        best = np.lexsort((product_index[neighbours], -scores))[:top_k]
+        result[product_id] = [
+            (int(product_index[neighbours[i]]), round(float(scores[i]), 4), int(together[i])) for i in best
+        ]
+    return result
+
+def refresh_neighbors(db: Optional[Session] = None, full: bool = False) -> int:
+    """Recompute neighbour lists for products in paid orders changed since the last run (all when `full`).
+
+    Run by the scheduler or `python -m app.recommendations [--full]`; the
+    first run is always full. Returns the number of products recomputed.
+    """
+    owns_session = db is None
+    db = db or SessionLocal()
+    try:
+        started_at = db.scalar(select(func.now()))
+        since = None if full else db.scalar(select(func.max(ProductNeighbor.computed_at)))
+        if since is None:
+            targets = sorted({
+                product_id for (product_id,) in
+                db.query(OrderItem.product_id).filter(OrderItem.order_id.in_(_paid_orders())).distinct()
+                if product_id is not None
+            })
+            stale_rows = db.query(ProductNeighbor)
+        else:
+            targets = sorted(_changed_products(db, since))
+            stale_rows = None
+
+        total = 0
+        for offset in range(0, len(targets), REFRESH_BATCH_SIZE):
+            batch = targets[offset:offset + REFRESH_BATCH_SIZE]
+            order_ids, product_ids = _baskets(db, set(batch))
+            neighbours = compute_neighbors(
+                order_ids, product_ids, batch, _order_counts(db, set(product_ids.tolist()) | set(batch))
+            )
+            db.query(ProductNeighbor).filter(ProductNeighbor.product_id.in_(batch)).delete(synchronize_session=False)
+            rows = [
+                {"product_id": product_id, "rank": rank, "neighbor_id": neighbor_id,
+                 "score": score, "co_orders": co_orders, "computed_at": started_at}
+                for product_id, ranked in neighbours.items()
+                for rank, (neighbor_id, score, co_orders) in enumerate(ranked, start=1)
+            ]
+            if rows:
+                db.execute(insert(ProductNeighbor), rows)
+            db.commit()
+            total += len(batch)
+
+        if stale_rows is not None:
+            # A full run also drops products that no longer appear in any paid order
+            stale_rows.filter(ProductNeighbor.computed_at < started_at).delete(synchronize_session=False)
+            db.commit()
+
+        if total:
+            logger.info("Recomputed recommendations for %d products", total)
+        return total
+    finally:
+        if owns_session:
+            db.close()
+
+def related_products(db: Session, product_id: int, limit: int) -> List[Product]:
+    """Active neighbours of a product in rank order, from one indexed lookup"""
+    return db.query(Product).options(joinedload(Product.category)).join(
+        ProductNeighbor, ProductNeighbor.neighbor_id == Product.id
+    ).filter(
+        ProductNeighbor.product_id == product_id, Product.is_active == True
+    ).order_by(ProductNeighbor.rank).limit(limit).all()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute frequently-bought-together neighbours")
+    parser.add_argument("--full", action="store_true", help="recompute every product, not just changed ones")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(f"Recomputed {refresh_neighbors(full=args.full)} products")
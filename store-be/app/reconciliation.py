@@ -0,0 +1,270 @@
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import socket
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session, joinedload
+from starlette.concurrency import run_in_threadpool
+from app.database import SessionLocal
+from app.models import Order, Payment
+from app.notifications import send_payment_notification
+from app.scheduler import acquire_lock, release_lock
+from app import ledger, payment_events, pubsub, rollups
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+
+# Reconciliation configuration
+RECONCILE_INTERVAL_SECONDS = float(os.getenv("RECONCILE_INTERVAL_SECONDS", "300"))
+RECONCILE_MIN_AGE_MINUTES = float(os.getenv("RECONCILE_MIN_AGE_MINUTES", "10"))  # give callbacks a chance first
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "100"))
+RECONCILE_CONCURRENCY = int(os.getenv("RECONCILE_CONCURRENCY", "8"))
+RECONCILE_TIMEOUT_SECONDS = float(os.getenv("RECONCILE_TIMEOUT_SECONDS", "10"))
+PAYMENT_PENDING_EXPIRY_HOURS = float(os.getenv("PAYMENT_PENDING_EXPIRY_HOURS", "24"))
+# Longer than a run can take; a worker that dies mid-run holds the lock until it expires
+RECONCILE_LOCK_LEASE_SECONDS = float(os.getenv("RECONCILE_LOCK_LEASE_SECONDS", "900"))
+
+JAZZCASH_INQUIRY_URL = os.getenv(
+    "JAZZCASH_INQUIRY_URL", "https://sandbox.jazzcash.com.pk/ApplicationAPI/API/PaymentInquiry/Inquire"
+)
+EASYPAISA_INQUIRY_URL = os.getenv(
+    "EASYPAISA_INQUIRY_URL", "https://easypay.easypaisa.com.pk/easypay-service/rest/v4/inquire-transaction"
+)
+EASYPAISA_USERNAME = os.getenv("EASYPAISA_USERNAME", "")
+EASYPAISA_PASSWORD = os.getenv("EASYPAISA_PASSWORD", "")
+EASYPAISA_ACCOUNT_NUM = os.getenv("EASYPAISA_ACCOUNT_NUM", "")
+
+GATEWAYS = ("jazzcash", "easypaisa")
+RECONCILE_LOCK = "payment-reconciliation"
+
+# JazzCash "Completed" / EasyPaisa "PAID" mean the money arrived; the listed failures are final
+JAZZCASH_SUCCESS = {"Completed"}
+JAZZCASH_FAILED = {"Failed", "Reversed", "Cancelled", "Expired", "Dropped"}
+EASYPAISA_SUCCESS = {"PAID"}
+EASYPAISA_FAILED = {"FAILED", "REVERSED", "EXPIRED", "DROPPED"}
+
+_http: Optional["requests.Session"] = None
+
+def http_session() -> "requests.Session":
+    """Shared keep-alive session sized for RECONCILE_CONCURRENCY parallel inquiries"""
+    global _http
+    if _http is None:
+        # Imported on the first run rather than at worker startup
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(GATEWAYS), pool_maxsize=RECONCILE_CONCURRENCY)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _http = session
+    return _http
+
+class Candidate:
+    """A pending transaction to check, backed by a ledger row or (legacy) only by its order"""
+
+    def __init__(self, gateway: str, transaction_id: str, order: Optional[Order], payment: Optional[Payment] = None):
+        self.gateway = gateway
+        self.transaction_id = transaction_id
+        self.order = order
+        self.payment = payment
+        self.created_at = payment.created_at if payment else (order.created_at if order else None)
+
+def _jazzcash_inquiry(session: "requests.Session", candidate: Candidate) -> Optional[str]:
+    from app.routers.payments import JAZZCASH_CONFIG
+
+    params = {
+        "pp_TxnRefNo": candidate.transaction_id,
+        "pp_MerchantID": JAZZCASH_CONFIG["merchant_id"],
+        "pp_Password": JAZZCASH_CONFIG["password"],
+    }
+    hash_string = "&".join([JAZZCASH_CONFIG["integrity_salt"]] + [params[key] for key in sorted(params)])
+    params["pp_SecureHash"] = hmac.new(
+        JAZZCASH_CONFIG["integrity_salt"].encode("utf-8"), hash_string.encode("utf-8"), hashlib.sha256
+    ).hexdigest()
+
+    response = session.post(JAZZCASH_INQUIRY_URL, json=params, timeout=RECONCILE_TIMEOUT_SECONDS)
+    response.raise_for_status()
+    result = response.json()
+    if result.get("pp_ResponseCode") != "000":
+        return None
+
+    status = result.get("pp_Status")
+    if status in JAZZCASH_SUCCESS:
+        return "success"
+    if status in JAZZCASH_FAILED:
+        return "failed"
+    return None
+
+def _easypaisa_inquiry(session: "requests.Session", candidate: Candidate) -> Optional[str]:
+    from app.routers.payments import EASYPAISA_CONFIG
+
+    if not (EASYPAISA_USERNAME and EASYPAISA_PASSWORD and EASYPAISA_ACCOUNT_NUM) or candidate.order is None:
+        return None
+
+    credentials = base64.b64encode(f"{EASYPAISA_USERNAME}:{EASYPAISA_PASSWORD}".encode("utf-8")).decode("ascii")
+    response = session.post(
+        EASYPAISA_INQUIRY_URL,
+        json={
+            "orderId": candidate.order.order_number,
+            "storeId": EASYPAISA_CONFIG["store_id"],
+            "accountNum": EASYPAISA_ACCOUNT_NUM,
+        },
+        headers={"Credentials": credentials},
+        timeout=RECONCILE_TIMEOUT_SECONDS
+    )
+    response.raise_for_status()
+    status = response.json().get("transactionStatus")
+    if status in EASYPAISA_SUCCESS:
+        return "success"
+    if status in EASYPAISA_FAILED:
+        return "failed"
+    return None
+
+_INQUIRIES = {
+    "jazzcash": _jazzcash_inquiry,
+    "easypaisa": _easypaisa_inquiry,
+}
+
+def inquire(candidate: Candidate) -> Optional[str]:
+    """Gateway status for one transaction: "success", "failed" or None when unknown/still pending"""
+    try:
+        return _INQUIRIES[candidate.gateway](http_session(), candidate)
+    except Exception as e:
+        logger.warning("Status inquiry for %s %s failed: %s", candidate.gateway, candidate.transaction_id, e)
+        return None
+
+def _pending_candidates(db: Session, cutoff: datetime, after_id: int) -> Tuple[List[Candidate], int]:
+    payments = db.query(Payment).options(joinedload(Payment.order)).filter(
+        Payment.status == "pending",
+        Payment.payment_gateway.in_(GATEWAYS),
+        Payment.created_at <= cutoff,
+        Payment.id > after_id
+    ).order_by(Payment.id).limit(RECONCILE_BATCH_SIZE).all()
+
+    candidates = [
+        Candidate(payment.payment_gateway, payment.transaction_id, payment.order, payment)
+        for payment in payments
+    ]
+    return candidates, payments[-1].id if payments else after_id
+
+def _legacy_candidates(db: Session, cutoff: datetime) -> List[Candidate]:
+    # Transactions initiated before the ledger existed only live on the order
+    ledger_ids = db.query(Payment.transaction_id).filter(Payment.transaction_id.isnot(None))
+    orders = db.query(Order).filter(
+        Order.payment_status == "pending",
+        Order.payment_method.in_(GATEWAYS),
+        Order.transaction_id.isnot(None),
+        Order.created_at <= cutoff,
+        Order.transaction_id.notin_(ledger_ids)
+    ).order_by(Order.id).limit(RECONCILE_BATCH_SIZE).all()
+
+    return [Candidate(order.payment_method, order.transaction_id, order) for order in orders]
+
+def _is_expired(candidate: Candidate, expiry_cutoff: datetime) -> bool:
+    created_at = candidate.created_at
+    if created_at is None:
+        return False
+    if created_at.tzinfo is not None:
+        created_at = created_at.replace(tzinfo=None)
+    return created_at <= expiry_cutoff
+
+def _apply(db: Session, candidates: List[Candidate], results: List[Optional[str]], expiry_cutoff: datetime) -> List[Candidate]:
+    """Apply one batch of inquiry results in a single commit; returns the candidates that changed"""
+    changed = []
+    for candidate, status in zip(candidates, results):
+        if status is None and _is_expired(candidate, expiry_cutoff):
+            status = "failed"
+        if status is None:
+            continue
+
+        if candidate.payment is not None:
+            moved = ledger.transition_payment(db, candidate.payment, status, "reconciliation")
+        else:
+            moved = payment_events.transition_order_payment(db, candidate.order, status)
+        if moved:
+            changed.append(candidate)
+
+    db.commit()
+    rollups.refresh_stale_rollups(db)
+    return changed
+
+def reconcile_pending_payments(db: Optional[Session] = None) -> List[dict]:
+    """Check every stale pending transaction with its gateway and apply the results.
+
+    Inquiries for a batch run in parallel (at most RECONCILE_CONCURRENCY at once)
+    over pooled connections; transactions the gateway cannot resolve within
+    PAYMENT_PENDING_EXPIRY_HOURS are marked failed. Returns one entry per
+    transaction whose status changed.
+    """
+    owns_session = db is None
+    db = db or SessionLocal()
+    try:
+        now = datetime.utcnow()
+        cutoff = now - timedelta(minutes=RECONCILE_MIN_AGE_MINUTES)
+        expiry_cutoff = now - timedelta(hours=PAYMENT_PENDING_EXPIRY_HOURS)
+        changes = []
+
+        with ThreadPoolExecutor(max_workers=RECONCILE_CONCURRENCY) as executor:
+            def run_batch(candidates: List[Candidate]):
+                results = list(executor.map(inquire, candidates))
+                for candidate in _apply(db, candidates, results, expiry_cutoff):
+                    order = candidate.order
+                    changes.append({
+                        "transaction_id": candidate.transaction_id,
+                        "status": ledger.get_payment_status(db, candidate.transaction_id),
+                        "customer_email": order.customer_email if order else None,
+                        "order_number": order.order_number if order else None,
+                        "amount": order.total_amount if order else None,
+                    })
+
+            after_id = 0
+            while True:
+                candidates, after_id = _pending_candidates(db, cutoff, after_id)
+                if not candidates:
+                    break
+                run_batch(candidates)
+
+            legacy = _legacy_candidates(db, cutoff)
+            if legacy:
+                run_batch(legacy)
+
+        if changes:
+            logger.info("Reconciled %d pending payments", len(changes))
+        return changes
+    finally:
+        if owns_session:
+            db.close()
+
+async def run_reconciliation() -> Optional[List[dict]]:
+    """Scheduler job: reconcile, then push status events and notify customers.
+
+    Runs under the RECONCILE_LOCK lease so the job and admin-triggered runs
+    never inquire about the same payments twice; returns None when another
+    run holds it.
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    if not await run_in_threadpool(acquire_lock, RECONCILE_LOCK, owner, RECONCILE_LOCK_LEASE_SECONDS):
+        logger.info("Payment reconciliation already running elsewhere, skipping")
+        return None
+    try:
+        changes = await run_in_threadpool(reconcile_pending_payments)
+    finally:
+        await run_in_threadpool(release_lock, RECONCILE_LOCK, owner)
+
+    broker = pubsub.get_broker()
+    for change in changes:
+        status = change["status"]
+        await broker.publish(ledger.status_channel(change["transaction_id"]), status)
+        if change["customer_email"]:
+            await send_payment_notification(
+                change["customer_email"], change["order_number"], change["amount"], status["status"]
+            )
+    return changes
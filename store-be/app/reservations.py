@@ -0,0 +1,161 @@
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import Order, OrderItem, StockReservation
+from app import inventory, rollups
+
+logger = logging.getLogger(__name__)
+
+# Reservation configuration
+RESERVATION_TTL_MINUTES = float(os.getenv("RESERVATION_TTL_MINUTES", "30"))
+RESERVATION_SWEEP_INTERVAL_SECONDS = float(os.getenv("RESERVATION_SWEEP_INTERVAL_SECONDS", "60"))
+RESERVATION_SWEEP_BATCH_SIZE = int(os.getenv("RESERVATION_SWEEP_BATCH_SIZE", "500"))
+
+ACTIVE = "active"
+CONVERTED = "converted"
+RELEASED = "released"
+
+# Orders paid on delivery commit their stock at placement
+IMMEDIATE_PAYMENT_METHODS = {"cod"}
+# Stock that already left the store is not put back when an order is deleted
+FULFILLED_STATUSES = {"shipped", "delivered"}
+
+def reserve_order(db: Session, order: Order, lines: Iterable[Tuple[int, int, Optional[str]]]):
+    """Record the stock an order just took as (product id, quantity, location) lines.
+
+    Gateway payments hold it for RESERVATION_TTL_MINUTES. Caller takes the
+    stock and commits.
+    """
+    if order.payment_method in IMMEDIATE_PAYMENT_METHODS:
+        status, expires_at = CONVERTED, None
+    else:
+        status, expires_at = ACTIVE, datetime.utcnow() + timedelta(minutes=RESERVATION_TTL_MINUTES)
+
+    db.add_all(
+        StockReservation(
+            order_id=order.id, product_id=product_id, location=location,
+            quantity=quantity, status=status, expires_at=expires_at
+        )
+        for product_id, quantity, location in lines
+    )
+
+def _order_reservations(db: Session, order: Order) -> List[StockReservation]:
+    reservations = db.query(StockReservation).filter(StockReservation.order_id == order.id).all()
+    if not reservations:
+        # Orders placed before reservations existed took their stock without a record
+        reservations = [
+            StockReservation(order_id=order.id, product_id=product_id, quantity=quantity, status=CONVERTED)
+            for product_id, quantity in db.query(OrderItem.product_id, OrderItem.quantity).filter(
+                OrderItem.order_id == order.id
+            )
+        ]
+        db.add_all(reservations)
+    return reservations
+
+def _transition(db: Session, order: Order, statuses: Iterable[str], new_status: str) -> List[Tuple[int, Optional[str], int]]:
+    """Move an order's holds in `statuses` to `new_status`; returns the (product id, location, quantity) moved.
+
+    A conditional UPDATE ... RETURNING, like the sweeper's, so a hold is
+    only ever moved by whichever of them gets to it first.
+    """
+    _order_reservations(db, order)
+    return db.execute(
+        update(StockReservation).where(
+            StockReservation.order_id == order.id,
+            StockReservation.status.in_(list(statuses))
+        ).values(status=new_status, expires_at=None).returning(
+            StockReservation.product_id, StockReservation.location, StockReservation.quantity
+        ),
+        execution_options={"synchronize_session": "fetch"}
+    ).all()
+
+def convert_order(db: Session, order: Order):
+    """Turn an order's holds into sales, taking stock back for holds that already expired"""
+    _transition(db, order, [ACTIVE], CONVERTED)
+    # Holds the sweeper released first gave their stock back; take it again
+    retake: Dict[Tuple[int, Optional[str]], int] = defaultdict(int)
+    for product_id, location, quantity in _transition(db, order, [RELEASED], CONVERTED):
+        retake[(product_id, location)] -= quantity
+
+    rollups.mark_stale(db, inventory.adjust(db, retake))
+
+def release_order(db: Session, order: Order, include_converted: bool = False) -> int:
+    """Give an order's held stock back; converted sales too when `include_converted`.
+
+    Returns the number of reservations released. Caller commits and then
+    calls `rollups.refresh_stale_rollups`.
+    """
+    statuses = [ACTIVE, CONVERTED] if include_converted else [ACTIVE]
+    restore: Dict[Tuple[int, Optional[str]], int] = defaultdict(int)
+    rows = _transition(db, order, statuses, RELEASED)
+    for product_id, location, quantity in rows:
+        restore[(product_id, location)] += quantity
+
+    rollups.mark_stale(db, inventory.adjust(db, restore))
+    return len(rows)
+
+def on_payment_status(db: Session, order: Order, new_status: str):
+    """Follow an order's payment: success keeps the stock, failure frees it"""
+    if new_status == "success":
+        convert_order(db, order)
+    elif new_status == "failed":
+        release_order(db, order)
+
+def remove_order(db: Session, order: Order):
+    """Restock (unless fulfilled) and drop the reservations of an order being deleted"""
+    if order.status not in FULFILLED_STATUSES:
+        release_order(db, order, include_converted=True)
+
+    db.flush()
+    db.query(StockReservation).filter(StockReservation.order_id == order.id).delete(synchronize_session=False)
+
+def sweep_expired_reservations(db: Optional[Session] = None) -> int:
+    """Release every expired hold in batches; returns the number released.
+
+    Rows are flipped with a conditional UPDATE ... RETURNING, so a hold
+    converted by a payment callback in the meantime is never restocked.
+    """
+    owns_session = db is None
+    db = db or SessionLocal()
+    try:
+        now = datetime.utcnow()
+        total = 0
+        while True:
+            ids = [
+                reservation_id for (reservation_id,) in db.query(StockReservation.id).filter(
+                    StockReservation.status == ACTIVE,
+                    StockReservation.expires_at < now
+                ).order_by(StockReservation.expires_at).limit(RESERVATION_SWEEP_BATCH_SIZE)
+            ]
+            if not ids:
+                break
+
+            rows = db.execute(
+                update(StockReservation).where(
+                    StockReservation.id.in_(ids),
+                    StockReservation.status == ACTIVE
+                ).values(status=RELEASED, expires_at=None).returning(
+                    StockReservation.product_id, StockReservation.location, StockReservation.quantity
+                ),
+                execution_options={"synchronize_session": False}
+            ).all()
+
+            restore: Dict[Tuple[int, Optional[str]], int] = defaultdict(int)
+            for product_id, location, quantity in rows:
+                restore[(product_id, location)] += quantity
+            category_ids = inventory.adjust(db, restore)
+            db.commit()
+            rollups.refresh_category_rollups(db, category_ids)
+            total += len(rows)
+
+        if total:
+            logger.info("Released %d expired stock reservations", total)
+        return total
+    finally:
+        if owns_session:
+            db.close()
@@ -0,0 +1,199 @@
+import logging
+import os
+import threading
+from typing import Dict, Iterable, Optional, Set
+from sqlalchemy import func, case, or_, select
+from sqlalchemy.orm import Session
+from app.cache import TTLCache
+from app.database import SessionLocal, dialect_insert
+from app.models import Product, Order, User, Category, CategoryRollup
+
+logger = logging.getLogger(__name__)
+
+# Rollup configuration
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "10"))
+# Checkout refreshes are batched: categories touched within this window are refreshed together
+ROLLUP_REFRESH_DELAY_SECONDS = float(os.getenv("ROLLUP_REFRESH_DELAY_SECONDS", "2"))
+# Full recomputes bound any drift, e.g. from a worker that died with refreshes still queued
+ROLLUP_FULL_REFRESH_INTERVAL_SECONDS = float(os.getenv("ROLLUP_FULL_REFRESH_INTERVAL_SECONDS", "3600"))
+LOW_STOCK_THRESHOLD = 5
+
+dashboard_cache = TTLCache(ttl=DASHBOARD_CACHE_TTL, maxsize=16)
+
+_queued: Set[Optional[int]] = set()
+_queue_lock = threading.Lock()
+_flush_timer: Optional[threading.Timer] = None
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+def product_stats_query(db: Session, category_ids: Optional[Iterable[int]] = None):
+    """One conditional-aggregate scan of products, grouped by category (0 = uncategorized)"""
+    active = Product.is_active == True
+    category_key = func.coalesce(Product.category_id, 0)
+
+    query = db.query(
+        category_key.label("category_id"),
+        _count_if(active).label("active_products"),
+        _count_if(Product.is_active == False).label("inactive_products"),
+        _count_if(active & (Product.stock_quantity <= LOW_STOCK_THRESHOLD)).label("low_stock_products"),
+        _count_if(active & (Product.stock_quantity == 0)).label("out_of_stock_products"),
+        func.coalesce(
+            func.sum(case((active, Product.retail_price * Product.stock_quantity), else_=None)), 0
+        ).label("inventory_value"),
+    )
+
+    if category_ids is not None:
+        ids = set(category_ids)
+        conditions = [Product.category_id.in_(ids - {0})]
+        if 0 in ids:
+            conditions.append(Product.category_id.is_(None))
+        query = query.filter(or_(*conditions))
+
+    return query.group_by(category_key)
+
+def refresh_category_rollups(db: Session, category_ids: Optional[Iterable[Optional[int]]] = None):
+    """Recompute rollup rows for the given categories (all categories when None) and commit"""
+    ids = None if category_ids is None else {category_id or 0 for category_id in category_ids}
+    if ids is not None and not ids:
+        return
+
+    rows = sorted((row._asdict() for row in product_stats_query(db, ids)), key=lambda row: row["category_id"])
+
+    # Upserted rather than deleted and re-inserted, so workers refreshing the same category never collide
+    if rows:
+        table = CategoryRollup.__table__
+        statement = dialect_insert(db, table)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.category_id],
+            set_={
+                **{column: getattr(statement.excluded, column) for column in rows[0] if column != "category_id"},
+                "updated_at": func.now()
+            }
+        ), rows)
+
+    # Categories left without products
+    emptied = db.query(CategoryRollup).filter(CategoryRollup.category_id.notin_([row["category_id"] for row in rows]))
+    if ids is not None:
+        emptied = emptied.filter(CategoryRollup.category_id.in_(ids))
+    emptied.delete(synchronize_session=False)
+
+    db.commit()
+    dashboard_cache.clear()
+
+def queue_refresh(category_ids: Iterable[Optional[int]]):
+    """Refresh these categories shortly, in the background, with everything else queued meanwhile.
+
+    For checkout: a burst of orders costs one aggregate per category instead
+    of a second write transaction per order. Call after the caller's commit.
+    """
+    global _flush_timer
+    with _queue_lock:
+        _queued.update(category_ids)
+        if _queued and _flush_timer is None:
+            _flush_timer = threading.Timer(ROLLUP_REFRESH_DELAY_SECONDS, flush_queued)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+
+def flush_queued():
+    """Refresh the queued categories now (the timer calls this; shutdown calls it to finish early)"""
+    global _flush_timer
+    with _queue_lock:
+        if _flush_timer is not None:
+            _flush_timer.cancel()
+            _flush_timer = None
+        category_ids = set(_queued)
+        _queued.clear()
+    if not category_ids:
+        return
+    db = SessionLocal()
+    try:
+        refresh_category_rollups(db, category_ids)
+    except Exception:
+        logger.exception("Category rollup refresh failed, retrying")
+        db.rollback()
+        queue_refresh(category_ids)
+    finally:
+        db.close()
+
+def refresh_all_rollups():
+    """Recompute every category's rollup (background job)"""
+    db = SessionLocal()
+    try:
+        refresh_category_rollups(db)
+    finally:
+        db.close()
+
+def mark_stale(db: Session, category_ids: Iterable[Optional[int]]):
+    """Queue categories for `refresh_stale_rollups` from code that must not commit itself"""
+    db.info.setdefault("stale_rollup_categories", set()).update(category_ids)
+
+def refresh_stale_rollups(db: Session):
+    """Refresh the categories queued with `mark_stale`; call after the caller's commit"""
+    category_ids = db.info.pop("stale_rollup_categories", None)
+    if category_ids:
+        refresh_category_rollups(db, category_ids)
+
+def _ensure_rollups(db: Session):
+    if db.query(CategoryRollup.category_id).first() is None:
+        refresh_category_rollups(db)
+
+def active_product_counts(db: Session) -> Dict[int, int]:
+    """Active product count per category id, served from the rollup table"""
+    def load():
+        _ensure_rollups(db)
+        return dict(db.query(CategoryRollup.category_id, CategoryRollup.active_products).all())
+
+    return dashboard_cache.get_or_set("active_product_counts", load)
+
+def _order_summary(order: Order) -> dict:
+    return {column.name: getattr(order, column.name) for column in Order.__table__.columns}
+
+def get_dashboard_stats(db: Session) -> dict:
+    def load():
+        _ensure_rollups(db)
+        total_products, low_stock_products, total_orders, total_users = db.query(
+            func.coalesce(func.sum(CategoryRollup.active_products), 0),
+            func.coalesce(func.sum(CategoryRollup.low_stock_products), 0),
+            select(func.count(Order.id)).scalar_subquery(),
+            select(func.count(User.id)).where(User.is_admin == False).scalar_subquery(),
+        ).one()
+
+        recent_orders = db.query(Order).order_by(Order.created_at.desc()).limit(5).all()
+
+        return {
+            "total_products": total_products,
+            "total_orders": total_orders,
+            "total_users": total_users,
+            "low_stock_products": low_stock_products,
+            "recent_orders": [_order_summary(order) for order in recent_orders]
+        }
+
+    return dashboard_cache.get_or_set("dashboard", load)
+
+def get_product_analytics(db: Session) -> dict:
+    def load():
+        _ensure_rollups(db)
+        rollups = db.query(CategoryRollup).all()
+        categories = db.query(Category.id, Category.name).all()
+
+        by_category = {rollup.category_id: rollup for rollup in rollups}
+        active_products = sum(rollup.active_products for rollup in rollups)
+
+        category_stats = []
+        for category_id, name in categories:
+            rollup = by_category.get(category_id)
+            count = rollup.active_products + rollup.inactive_products if rollup else 0
+            category_stats.append({"category": name or "Uncategorized", "count": count})
+
+        return {
+            "total_products": active_products,
+            "active_products": active_products,
+            "inactive_products": sum(rollup.inactive_products for rollup in rollups),
+            "low_stock_products": sum(rollup.low_stock_products for rollup in rollups),
+            "out_of_stock_products": sum(rollup.out_of_stock_products for rollup in rollups),
+            "total_inventory_value": round(sum(rollup.inventory_value for rollup in rollups), 2),
+            "category_stats": category_stats
+        }
+
+    return dashboard_cache.get_or_set("product_analytics", load)
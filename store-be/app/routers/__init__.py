@@ -6,6 +6,9 @@ from .collections import router as collections_router
 from .offers import router as offers_router
 from .orders import router as orders_router
 from .payments import router as payments_router
+from .inventory import router as inventory_router
+from .cart import router as cart_router
+from .hair_accessories import router as hair_accessories_router
 
 __all__ = [
     'auth_router',
@@ -14,5 +17,8 @@ __all__ = [
     'collections_router',
     'offers_router',
     'orders_router',
-    'payments_router'
+    'payments_router',
+    'inventory_router',
+    'cart_router',
+    'hair_accessories_router'
 ]
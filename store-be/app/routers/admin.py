@@ -1,13 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Header
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Header, Query
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func
 from typing import List, Optional
+from datetime import datetime
 import os
 import uuid
 from app.database import get_db
-from app.models import Product, Order, User, OrderItem, Category
-from app.schemas import ProductCreate, ProductUpdate, Product as ProductSchema, Order as OrderSchema, OrderUpdate, User as UserSchema, Category as CategorySchema, CategoryCreate, CategoryUpdate
+from app.models import Product, Order, User, OrderItem, Category, Payment
+from app.schemas import ProductCreate, ProductUpdate, Product as ProductSchema, Order as OrderSchema, OrderUpdate, User as UserSchema, Category as CategorySchema, CategoryCreate, CategoryUpdate, ProductAttributesBulk
 from app.auth import get_current_admin_user
+from app import attributes, inventory, pricing, profiler, rankings, reconciliation, recommendations, reservations, rollups, sales
+from app.statuses import CANCELLED_STATUS
 
 router = APIRouter()
 
@@ -41,14 +45,14 @@ def create_product(
     db: Session = Depends(get_db)
 ):
     product_data = product.dict()
-    # Ensure stock and stock_quantity are synchronized
-    if 'stock_quantity' in product_data:
-        product_data['stock'] = product_data['stock_quantity']
-    elif 'stock' in product_data:
-        product_data['stock_quantity'] = product_data['stock']
+    # Stock lives in inventory_levels; the product's stock columns only mirror it
+    quantity = product_data.get('stock_quantity') or product_data.get('stock') or 0
     
     db_product = Product(**product_data)
+    pricing.sync_legacy_prices(db_product)
     db.add(db_product)
+    db.flush()
+    inventory.set_level(db, db_product, quantity)
     db.commit()
     db.refresh(db_product)
     
@@ -62,6 +66,7 @@ def create_product(
             ).count()
             db.commit()
     
+    rollups.refresh_category_rollups(db, {db_product.category_id})
     return db_product
 
 @router.put("/products/{product_id}", response_model=ProductSchema)
@@ -79,15 +84,17 @@ def update_product(
     old_category_id = db_product.category_id
     
     update_data = product_update.dict(exclude_unset=True)
-    # Ensure stock and stock_quantity are synchronized
-    if 'stock_quantity' in update_data:
-        update_data['stock'] = update_data['stock_quantity']
-    elif 'stock' in update_data:
-        update_data['stock_quantity'] = update_data['stock']
+    # Stock lives in inventory_levels; the product's stock columns only mirror it
+    quantity = update_data.get('stock_quantity', update_data.get('stock'))
+    for field in inventory.MIRRORED_FIELDS:
+        update_data.pop(field, None)
     
     for field, value in update_data.items():
         setattr(db_product, field, value)
+    pricing.sync_legacy_prices(db_product)
     
+    if quantity is not None:
+        inventory.set_level(db, db_product, quantity)
     db.commit()
     db.refresh(db_product)
     
@@ -113,6 +120,7 @@ def update_product(
         
         db.commit()
     
+    rollups.refresh_category_rollups(db, {old_category_id, db_product.category_id})
     return db_product
 
 @router.delete("/products/{product_id}")
@@ -127,6 +135,7 @@ def delete_product(
     
     db_product.is_active = False
     db.commit()
+    rollups.refresh_category_rollups(db, {db_product.category_id})
     return {"message": "Product deactivated successfully"}
 
 # Temporary debug endpoint without authentication
@@ -236,10 +245,26 @@ def update_order_status(
         raise HTTPException(status_code=404, detail="Order not found")
     
     update_data = order_update.dict(exclude_unset=True)
+    
+    # Keep the sales buckets and held stock in step with cancellations and payment changes
+    was_cancelled = order.status == CANCELLED_STATUS
+    if 'payment_status' in update_data and update_data['payment_status'] != order.payment_status:
+        sales.record_payment_transition(db, order, order.payment_status, update_data['payment_status'])
+        reservations.on_payment_status(db, order, update_data['payment_status'])
+    
     for field, value in update_data.items():
         setattr(order, field, value)
     
+    is_cancelled = order.status == CANCELLED_STATUS
+    if is_cancelled and not was_cancelled:
+        sales.record_order_removed(db, order)
+        reservations.release_order(db, order, include_converted=True)
+    elif was_cancelled and not is_cancelled:
+        sales.record_order_placed(db, order)
+        reservations.convert_order(db, order)
+    
     db.commit()
+    rollups.refresh_stale_rollups(db)
     db.refresh(order)
     return order
 
@@ -253,22 +278,74 @@ def delete_order(
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
+    if order.status != CANCELLED_STATUS:
+        sales.record_order_removed(db, order)
+    
+    # Put unsold stock back and drop the order's reservations
+    reservations.remove_order(db, order)
+    
     # Delete associated order items first
     db.query(OrderItem).filter(OrderItem.order_id == order_id).delete()
     
     # Delete the order
     db.delete(order)
     db.commit()
+    rollups.refresh_stale_rollups(db)
     
     return {"message": "Order deleted successfully"}
 
+# Payment Ledger
+@router.post("/payments/reconcile")
+async def reconcile_payments(current_user: User = Depends(get_current_admin_user)):
+    """Check stale pending payments with their gateways now instead of waiting for the job"""
+    changes = await reconciliation.run_reconciliation()
+    if changes is None:
+        raise HTTPException(status_code=409, detail="Payment reconciliation is already running")
+    return {
+        "reconciled": len(changes),
+        "transactions": [
+            {"transaction_id": change["transaction_id"], "status": change["status"]["status"]}
+            for change in changes
+        ]
+    }
+
+@router.get("/payments/{transaction_id}")
+def get_payment_ledger_entry(
+    transaction_id: str,
+    current_user: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """A payment attempt with its full status history"""
+    payment = db.query(Payment).filter(Payment.transaction_id == transaction_id).first()
+    if not payment:
+        raise HTTPException(status_code=404, detail="Payment not found")
+    
+    return {
+        "id": payment.id,
+        "order_id": payment.order_id,
+        "gateway": payment.payment_gateway,
+        "transaction_id": payment.transaction_id,
+        "amount": payment.amount,
+        "currency": payment.currency,
+        "status": payment.status,
+        "payment_date": payment.payment_date,
+        "created_at": payment.created_at,
+        "history": [{
+            "from_status": entry.from_status,
+            "to_status": entry.to_status,
+            "source": entry.source,
+            "created_at": entry.created_at
+        } for entry in payment.history]
+    }
+
 # Inventory Management
 @router.get("/inventory")
 def get_inventory_status(
     current_user: User = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
-    products = db.query(Product).all()
+    products = db.query(Product).options(joinedload(Product.category)).all()
+    levels = inventory.levels_by_product(db, [product.id for product in products])
     inventory_data = []
     
     for product in products:
@@ -283,6 +360,7 @@ def get_inventory_status(
             "name": product.name,
             "category": product.category,
             "stock_quantity": product.stock_quantity,
+            "locations": levels.get(product.id, {}),
             "status": status
         })
     
@@ -292,6 +370,7 @@ def get_inventory_status(
 def update_stock(
     product_id: int,
     stock_quantity: int,
+    location: Optional[str] = None,
     current_user: User = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
@@ -299,10 +378,65 @@ def update_stock(
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    product.stock_quantity = stock_quantity
+    # Without a location the product's home location is set, as before multi-location stock
+    inventory.set_level(db, product, stock_quantity, location)
     db.commit()
+    rollups.refresh_category_rollups(db, {product.category_id})
     return {"message": "Stock updated successfully"}
 
+@router.get("/inventory/{product_id}/locations")
+def get_stock_locations(
+    product_id: int,
+    current_user: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    product = db.query(Product).filter(Product.id == product_id).first()
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    locations = inventory.levels_by_product(db, [product_id])[product_id]
+    return {
+        "product_id": product_id,
+        "home_location": inventory.home_location(product),
+        "locations": locations,
+        "total": sum(locations.values())
+    }
+
+# Product Attributes
+MAX_ATTRIBUTE_BATCH = 500
+
+@router.put("/attributes")
+def set_product_attributes(
+    payload: ProductAttributesBulk,
+    current_user: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    if len(payload.items) > MAX_ATTRIBUTE_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_ATTRIBUTE_BATCH} products per request")
+    
+    updates = {}
+    for item in payload.items:
+        updates.setdefault(item.product_id, {}).update(item.attributes)
+    
+    found = {product_id for (product_id,) in db.query(Product.id).filter(Product.id.in_(list(updates)))}
+    missing = [product_id for product_id in updates if product_id not in found]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Products not found: {missing}")
+    
+    written = attributes.set_attributes(db, updates, replace=payload.replace)
+    db.commit()
+    return {"products": len(updates), "values": written}
+
+@router.get("/products/{product_id}/attributes")
+def get_product_attributes(
+    product_id: int,
+    current_user: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    if not db.query(Product.id).filter(Product.id == product_id).first():
+        raise HTTPException(status_code=404, detail="Product not found")
+    return {"product_id": product_id, "attributes": attributes.attributes_for(db, [product_id])[product_id]}
+
 # User Management
 @router.get("/users", response_model=List[UserSchema])
 def get_all_users(
@@ -332,48 +466,7 @@ def get_product_analytics(
     db: Session = Depends(get_db)
 ):
     try:
-        # Total products
-        total_products = db.query(Product).filter(Product.is_active == True).count()
-        
-        # Active vs Inactive products
-        active_products = db.query(Product).filter(Product.is_active == True).count()
-        inactive_products = db.query(Product).filter(Product.is_active == False).count()
-        
-        # Low stock products (stock <= 5)
-        low_stock_products = db.query(Product).filter(
-            Product.stock_quantity <= 5,
-            Product.is_active == True
-        ).count()
-        
-        # Out of stock products
-        out_of_stock_products = db.query(Product).filter(
-            Product.stock_quantity == 0,
-            Product.is_active == True
-        ).count()
-        
-        # Products by category
-        category_stats = db.query(
-            Category.name,
-            func.count(Product.id).label('product_count')
-        ).join(Product, Category.id == Product.category_id, isouter=True).group_by(Category.id, Category.name).all()
-        
-        # Total inventory value
-        total_inventory_value = db.query(
-            func.sum(Product.retail_price * Product.stock_quantity)
-        ).filter(Product.is_active == True).scalar() or 0
-        
-        return {
-            "total_products": total_products,
-            "active_products": active_products,
-            "inactive_products": inactive_products,
-            "low_stock_products": low_stock_products,
-            "out_of_stock_products": out_of_stock_products,
-            "total_inventory_value": round(total_inventory_value, 2),
-            "category_stats": [{
-                "category": stat[0] or "Uncategorized",
-                "count": stat[1]
-            } for stat in category_stats]
-        }
+        return rollups.get_product_analytics(db)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analytics error: {str(e)}")
 
@@ -383,26 +476,79 @@ def get_dashboard_stats(
     current_user: User = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
-    total_products = db.query(Product).filter(Product.is_active == True).count()
-    total_orders = db.query(Order).count()
-    total_users = db.query(User).filter(User.is_admin == False).count()
-    
-    # Low stock products
-    low_stock_products = db.query(Product).filter(
-        Product.stock_quantity <= 5,
-        Product.is_active == True
-    ).count()
-    
-    # Recent orders
-    recent_orders = db.query(Order).order_by(Order.created_at.desc()).limit(5).all()
-    
-    return {
-        "total_products": total_products,
-        "total_orders": total_orders,
-        "total_users": total_users,
-        "low_stock_products": low_stock_products,
-        "recent_orders": recent_orders
-    }
+    # Served from the category rollups and cached for DASHBOARD_CACHE_TTL seconds
+    return rollups.get_dashboard_stats(db)
+
+# Sales Analytics
+@router.get("/analytics/sales")
+def get_sales_series(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: str = Query("day", pattern="^(hour|day)$"),
+    product_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    current_user: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Revenue, units and order counts per hour or day (defaults to the last 30 days)"""
+    return sales.sales_series(db, start, end, granularity, product_id, category_id)
+
+@router.get("/analytics/top-products")
+def get_top_products(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(10, ge=1, le=100),
+    metric: str = Query("revenue", pattern="^(paid_)?(revenue|units|orders)$"),
+    category_id: Optional[int] = None,
+    current_user: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Top-N products by a sales metric over a date range"""
+    return sales.top_products(db, start, end, limit, metric, category_id)
+
+@router.post("/analytics/sales/rebuild")
+def rebuild_sales_analytics(
+    current_user: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Recompute all sales buckets from the orders table (backfill or repair)"""
+    buckets = sales.rebuild_sales_buckets(db)
+    return {"message": "Sales analytics rebuilt", "buckets": buckets}
+
+@router.post("/rankings/rebuild")
+def rebuild_rankings(
+    current_user: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Recompute products.sold and trending scores from paid orders (backfill or repair)"""
+    products = rankings.rebuild(db)
+    return {"message": "Rankings rebuilt", "products": products}
+
+@router.post("/recommendations/rebuild")
+def rebuild_recommendations(
+    current_user: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Recompute every product's frequently-bought-together list from paid orders"""
+    products = recommendations.refresh_neighbors(db, full=True)
+    return {"message": "Recommendations rebuilt", "products": products}
+
+# Request Profiles
+@router.get("/profiles")
+def get_request_profiles(current_user: User = Depends(get_current_admin_user)):
+    """List profiles of slow (or explicitly profiled) requests, newest first"""
+    return profiler.list_profiles()
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+def get_request_profile(
+    profile_id: int,
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Collapsed stacks for one profile, ready for flamegraph.pl or speedscope"""
+    profile = profiler.get_profile(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profiler.render_collapsed(profile)
 
 # Categories/Collection Management
 @router.get("/categories", response_model=List[CategorySchema])
@@ -414,12 +560,9 @@ def get_all_categories(
     categories = db.query(Category).all()
     
     # Update total_products count for each category
+    product_counts = rollups.active_product_counts(db)
     for category in categories:
-        product_count = db.query(func.count(Product.id)).filter(
-            Product.category_id == category.id,
-            Product.is_active == True
-        ).scalar()
-        category.total_products = product_count
+        category.total_products = product_counts.get(category.id, 0)
     
     return categories
 
@@ -432,12 +575,9 @@ def get_all_collections(
     collections = db.query(Category).all()
     
     # Update total_products count for each collection
+    product_counts = rollups.active_product_counts(db)
     for collection in collections:
-        product_count = db.query(func.count(Product.id)).filter(
-            Product.category_id == collection.id,
-            Product.is_active == True
-        ).scalar()
-        collection.total_products = product_count
+        collection.total_products = product_counts.get(collection.id, 0)
     
     return collections
 
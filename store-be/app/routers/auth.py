@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, Header, status, Request
 from fastapi.responses import Response, RedirectResponse
 from sqlalchemy.orm import Session
 from datetime import timedelta
+from typing import Optional
+import logging
 from app.database import get_db
 from app.models import User
 from app.schemas import UserCreate, UserLogin, UserUpdate, User as UserSchema, Token, UserRoleResponse
 from app.auth import get_password_hash, verify_password, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, get_current_user
+from app import carts
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -17,7 +22,7 @@ async def login_options():
         headers={
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Methods": "POST, OPTIONS",
-            "Access-Control-Allow-Headers": "Content-Type, Authorization",
+            "Access-Control-Allow-Headers": "Content-Type, Authorization, X-Cart-Token",
         }
     )
 
@@ -61,21 +66,22 @@ def signup(user: UserCreate, db: Session = Depends(get_db)):
 async def login(
     user_credentials: UserLogin, 
     response: Response,
+    x_cart_token: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
     try:
-        print(f"[AUTH] Login attempt for email: {user_credentials.email}")
+        logger.debug("Login attempt for email: %s", user_credentials.email)
         
         # Add CORS headers to the response
         response.headers["Access-Control-Allow-Origin"] = "http://localhost:3000"
         response.headers["Access-Control-Allow-Credentials"] = "true"
         response.headers["Access-Control-Allow-Methods"] = "POST, OPTIONS"
-        response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
+        response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, X-Cart-Token"
         
         user = db.query(User).filter(User.email == user_credentials.email).first()
         
         if not user:
-            print(f"[AUTH] User not found for email: {user_credentials.email}")
+            logger.info("Login failed, unknown email: %s", user_credentials.email)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect email or password",
@@ -86,12 +92,10 @@ async def login(
                 },
             )
         
-        print(f"[AUTH] User found: {user.email}, checking password...")
         password_valid = verify_password(user_credentials.password, user.hashed_password)
-        print(f"[AUTH] Password valid: {password_valid}")
         
         if not password_valid:
-            print("[AUTH] Password verification failed")
+            logger.info("Login failed, wrong password for: %s", user.email)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect email or password",
@@ -102,7 +106,11 @@ async def login(
                 },
             )
         
-        print("[AUTH] Login successful, creating token...")
+        logger.debug("Login successful for: %s", user.email)
+        # A guest cart built before signing in follows the user
+        if x_cart_token:
+            carts.merge_guest_cart(db, x_cart_token, user)
+            db.commit()
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
             data={"sub": user.email}, 
@@ -126,7 +134,7 @@ async def login(
         }
         
     except Exception as e:
-        print(f"[AUTH] Error during login: {str(e)}")
+        logger.debug("Error during login: %s", e)
         response.headers["Access-Control-Allow-Origin"] = "http://localhost:3000"
         response.headers["Access-Control-Allow-Credentials"] = "true"
         raise
@@ -0,0 +1,86 @@
+from fastapi import APIRouter, Depends, Header, Response
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.database import get_db
+from app.models import User
+from app.schemas import CartItem, CartQuantity
+from app.auth import get_optional_user
+from app import carts
+
+router = APIRouter()
+
+def _respond(db: Session, cart, response: Response) -> dict:
+    priced = carts.priced_cart(db, cart)
+    if priced["token"]:
+        response.headers[carts.CART_TOKEN_HEADER] = priced["token"]
+    return priced
+
+@router.get("", include_in_schema=False)
+@router.get("/")
+def get_cart(
+    response: Response,
+    x_cart_token: Optional[str] = Header(None),
+    current_user: Optional[User] = Depends(get_optional_user),
+    db: Session = Depends(get_db)
+):
+    """The caller's cart, priced and stock-checked (guests pass X-Cart-Token)"""
+    # Read-only: a guest cart is merged at login or by the next cart write
+    cart = carts.find_cart(db, x_cart_token, current_user, merge=False)
+    return _respond(db, cart, response)
+
+@router.post("/items")
+def add_cart_item(
+    item: CartItem,
+    response: Response,
+    x_cart_token: Optional[str] = Header(None),
+    current_user: Optional[User] = Depends(get_optional_user),
+    db: Session = Depends(get_db)
+):
+    cart = carts.change_cart(
+        db, x_cart_token, current_user,
+        lambda cart: carts.set_quantity(db, cart, item.product_id, item.quantity, add=True)
+    )
+    return _respond(db, cart, response)
+
+@router.put("/items/{product_id}")
+def update_cart_item(
+    product_id: int,
+    update: CartQuantity,
+    response: Response,
+    x_cart_token: Optional[str] = Header(None),
+    current_user: Optional[User] = Depends(get_optional_user),
+    db: Session = Depends(get_db)
+):
+    cart = carts.change_cart(
+        db, x_cart_token, current_user,
+        lambda cart: carts.set_quantity(db, cart, product_id, update.quantity)
+    )
+    return _respond(db, cart, response)
+
+@router.delete("/items/{product_id}")
+def remove_cart_item(
+    product_id: int,
+    response: Response,
+    x_cart_token: Optional[str] = Header(None),
+    current_user: Optional[User] = Depends(get_optional_user),
+    db: Session = Depends(get_db)
+):
+    cart = carts.find_cart(db, x_cart_token, current_user)
+    if cart is not None:
+        carts.set_quantity(db, cart, product_id, 0)
+    db.commit()
+    return _respond(db, cart, response)
+
+@router.delete("", include_in_schema=False)
+@router.delete("/")
+def clear_cart(
+    response: Response,
+    x_cart_token: Optional[str] = Header(None),
+    current_user: Optional[User] = Depends(get_optional_user),
+    db: Session = Depends(get_db)
+):
+    cart = carts.find_cart(db, x_cart_token, current_user)
+    if cart is not None:
+        carts.clear_cart(db, cart)
+    db.commit()
+    return _respond(db, cart, response)
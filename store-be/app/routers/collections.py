@@ -8,21 +8,20 @@ from app.database import get_db
 from app.models import Category, Product
 from app.schemas import Category as CategorySchema, CategoryCreate, CategoryUpdate
 from app.auth import get_current_admin_user
+from app import rollups
 
 router = APIRouter()
 
 @router.get("/", response_model=List[CategorySchema])
 def get_collections(db: Session = Depends(get_db)):
     """Get all collections/categories with product counts"""
+    # Counts first: filling an empty rollup table commits, which would expire the loaded categories
+    product_counts = rollups.active_product_counts(db)
     collections = db.query(Category).filter(Category.is_active == True).all()
     
     # Update total_products count for each collection
     for collection in collections:
-        product_count = db.query(func.count(Product.id)).filter(
-            Product.category_id == collection.id,
-            Product.is_active == True
-        ).scalar()
-        collection.total_products = product_count
+        collection.total_products = product_counts.get(collection.id, 0)
     
     return collections
 
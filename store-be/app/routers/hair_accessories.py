@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional
+from app.database import get_db
+from app.models import HairAccessory
+from app.schemas import HairAccessory as HairAccessorySchema, HairAccessoryPage
+from app import hair_accessories
+
+router = APIRouter()
+
+@router.get("", response_model=HairAccessoryPage, include_in_schema=False)
+@router.get("/", response_model=HairAccessoryPage)
+def list_hair_accessories(
+    category: Optional[str] = Query(None, description="e.g. hair_clips, headbands"),
+    material: Optional[str] = Query(None),
+    color: Optional[str] = Query(None),
+    min_price: Optional[float] = Query(None),
+    max_price: Optional[float] = Query(None),
+    cursor: Optional[int] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(hair_accessories.DEFAULT_PAGE_SIZE, ge=1, le=hair_accessories.MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    filters = {"category": category, "material": material, "color": color}
+    return hair_accessories.list_page(db, filters, cursor, limit, min_price, max_price)
+
+@router.get("/facets")
+def get_facets(
+    category: Optional[str] = Query(None),
+    material: Optional[str] = Query(None),
+    color: Optional[str] = Query(None),
+    db: Session = Depends(get_db)
+) -> Dict[str, Dict[str, int]]:
+    """Counts per category, material and color for the current filters"""
+    filters = {"category": category, "material": material, "color": color}
+    return hair_accessories.facet_counts(db, filters)
+
+@router.get("/featured", response_model=List[HairAccessorySchema])
+def get_featured(
+    limit: int = Query(12, ge=1, le=hair_accessories.MAX_FEATURED),
+    db: Session = Depends(get_db)
+):
+    return hair_accessories.featured(db, limit)
+
+@router.get("/{item_id}", response_model=HairAccessorySchema)
+def get_hair_accessory(item_id: int, db: Session = Depends(get_db)):
+    item = db.query(HairAccessory).filter(HairAccessory.id == item_id, HairAccessory.is_active == True).first()
+    if not item:
+        raise HTTPException(status_code=404, detail="Hair accessory not found")
+    return item
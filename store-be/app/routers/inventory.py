@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.utils import parse_id_list
+from app import inventory
+
+router = APIRouter()
+
+MAX_AVAILABILITY_IDS = 200
+
+@router.get("/availability")
+def get_availability(
+    ids: str = Query(..., description="Comma-separated product ids"),
+    locations: bool = Query(False, description="Include per-location quantities"),
+    db: Session = Depends(get_db)
+):
+    """Stock for a whole cart in one request, in the order the ids were given"""
+    product_ids = parse_id_list(ids, MAX_AVAILABILITY_IDS)
+    found = inventory.availability(db, product_ids, with_locations=locations)
+    return {
+        "items": [found[product_id] for product_id in product_ids if product_id in found],
+        "missing": [product_id for product_id in product_ids if product_id not in found]
+    }
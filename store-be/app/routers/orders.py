@@ -1,131 +1,172 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session, aliased, selectinload
+from typing import List, Optional, Set, Tuple
 import uuid
 from datetime import datetime
 from app.database import get_db
 from app.models import Order, OrderItem, Product, User
-from app.schemas import OrderCreate, Order as OrderSchema, OrderUpdate
+from app.schemas import (
+    OrderCreate, Order as OrderSchema, OrderUpdate, OrderDetail, OrderDetailPage, OrderSummaryPage,
+    OrderTracking, OrderTrackingRequest
+)
 from app.auth import get_current_user
+from app import carts, inventory, pricing, reservations, rollups, sales, tracking
 
 router = APIRouter()
 
+HISTORY_PAGE_SIZE = 20
+MAX_HISTORY_PAGE_SIZE = 100
+
 def generate_order_number():
     return f"SAI-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
 
-@router.post("/guest", response_model=OrderSchema)
-def create_guest_order(order: OrderCreate, db: Session = Depends(get_db)):
-    # Validate products and calculate total
-    total_amount = 0
-    for item in order.items:
-        product = db.query(Product).filter(Product.id == item.product_id, Product.is_active == True).first()
-        if not product:
-            raise HTTPException(status_code=404, detail=f"Product {item.product_id} not found")
-        
-        # Check stock using available fields
-        stock_qty = product.stock_quantity or product.stock or 0
-        if stock_qty < item.quantity:
-            raise HTTPException(status_code=400, detail=f"Insufficient stock for product {product.name}")
-        
-        # Use the best available price
-        product_price = product.offer_price or product.price or product.retail_price
-        total_amount += product_price * item.quantity
+def place_order(db: Session, order: OrderCreate, user_id: Optional[int] = None) -> Tuple[Order, Set[Optional[int]]]:
+    """Validate, price and stock every line in one pass, then create the order and take the stock.
+
+    Returns the order and the categories whose rollups need refreshing; caller commits.
+    """
+    if not order.items or any(item.quantity < 1 for item in order.items):
+        raise HTTPException(status_code=400, detail="Order needs at least one item with a positive quantity")
+    
+    # One product query for all lines (shared with the server-side cart)
+    check = carts.revalidate(db, [(item.product_id, item.quantity) for item in order.items])
+    for issue in check["issues"]:
+        if issue["reason"] == "unavailable":
+            raise HTTPException(status_code=404, detail=f"Product {issue['product_id']} not found")
+        raise HTTPException(status_code=400, detail=f"Insufficient stock for product {issue['name']}")
+    products = check["products"]
     
-    # Create order
     db_order = Order(
+        user_id=user_id,
         order_number=generate_order_number(),
         customer_name=order.customer_name,
         customer_email=order.customer_email,
         customer_phone=order.customer_phone,
         shipping_address=order.shipping_address,
-        total_amount=total_amount,
+        total_amount=check["subtotal"],
         payment_method=order.payment_method
     )
     db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
+    db.flush()
     
-    # Create order items and update stock
+    # Create order items and take the stock
+    category_ids = set()
+    reserved_lines = []
     for item in order.items:
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        product_price = product.offer_price or product.price or product.retail_price
-        order_item = OrderItem(
+        product = products[item.product_id]
+        db.add(OrderItem(
             order_id=db_order.id,
             product_id=item.product_id,
             quantity=item.quantity,
-            price=product_price
-        )
-        db.add(order_item)
+            price=pricing.effective_price(product)
+        ))
         
-        # Update stock using available fields
-        if product.stock_quantity is not None:
-            product.stock_quantity -= item.quantity
-        elif product.stock is not None:
-            product.stock -= item.quantity
+        # Nothing is committed until every line got its stock
+        allocation = inventory.take(db, product, item.quantity)
+        if allocation is None:
+            detail = f"Insufficient stock for product {product.name}"
+            db.rollback()
+            raise HTTPException(status_code=400, detail=detail)
+        reserved_lines.extend((item.product_id, quantity, location) for location, quantity in allocation.items())
+        category_ids.add(product.category_id)
     
+    reservations.reserve_order(db, db_order, reserved_lines)
+    sales.record_order_placed(db, db_order)
+    return db_order, category_ids
+
+@router.post("/guest", response_model=OrderSchema)
+def create_guest_order(
+    order: OrderCreate,
+    x_cart_token: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    db_order, category_ids = place_order(db, order)
+    carts.discard_cart(db, x_cart_token, None)
     db.commit()
+    rollups.queue_refresh(category_ids)
     return db_order
 
+@router.post("/track", response_model=OrderTracking)
+def track_order(lookup: OrderTrackingRequest, db: Session = Depends(get_db)):
+    """Guest order tracking by order number plus the email or phone on the order (rate limited per client IP)"""
+    return tracking.track(db, lookup.order_number, lookup.email, lookup.phone)
+
 @router.post("/", response_model=OrderSchema)
-def create_user_order(order: OrderCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    # Similar to guest order but with user_id
-    total_amount = 0
-    for item in order.items:
-        product = db.query(Product).filter(Product.id == item.product_id, Product.is_active == True).first()
-        if not product:
-            raise HTTPException(status_code=404, detail=f"Product {item.product_id} not found")
-        
-        # Check stock using available fields
-        stock_qty = product.stock_quantity or product.stock or 0
-        if stock_qty < item.quantity:
-            raise HTTPException(status_code=400, detail=f"Insufficient stock for product {product.name}")
-        
-        # Use the best available price
-        product_price = product.offer_price or product.price or product.retail_price
-        total_amount += product_price * item.quantity
-    
-    db_order = Order(
-        user_id=current_user.id,
-        order_number=generate_order_number(),
-        customer_name=order.customer_name,
-        customer_email=order.customer_email,
-        customer_phone=order.customer_phone,
-        shipping_address=order.shipping_address,
-        total_amount=total_amount,
-        payment_method=order.payment_method
-    )
-    db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
-    
-    for item in order.items:
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        product_price = product.offer_price or product.price or product.retail_price
-        order_item = OrderItem(
-            order_id=db_order.id,
-            product_id=item.product_id,
-            quantity=item.quantity,
-            price=product_price
-        )
-        db.add(order_item)
-        
-        # Update stock using available fields
-        if product.stock_quantity is not None:
-            product.stock_quantity -= item.quantity
-        elif product.stock is not None:
-            product.stock -= item.quantity
-    
+def create_user_order(
+    order: OrderCreate,
+    x_cart_token: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    db_order, category_ids = place_order(db, order, current_user.id)
+    carts.discard_cart(db, x_cart_token, current_user)
     db.commit()
+    rollups.queue_refresh(category_ids)
     return db_order
 
-@router.get("/my-orders", response_model=List[OrderSchema])
+def _with_items():
+    """Items and a product summary for many orders in two extra queries"""
+    return selectinload(Order.items).selectinload(OrderItem.product).load_only(
+        Product.id, Product.name, Product.images
+    )
+
+def _history_page(query, user_id: int, cursor: Optional[int], limit: int):
+    """Newest first, keyed on (created_at, id) after the order `cursor`; uses ix_orders_user_created"""
+    query = query.filter(Order.user_id == user_id)
+    if cursor is not None:
+        anchor = aliased(Order)
+        anchor_created = select(anchor.created_at).where(
+            anchor.id == cursor, anchor.user_id == user_id
+        ).scalar_subquery()
+        query = query.filter(or_(
+            Order.created_at < anchor_created,
+            and_(Order.created_at == anchor_created, Order.id < cursor)
+        ))
+    rows = query.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit + 1).all()
+    items = rows[:limit]
+    return {"items": items, "next_cursor": items[-1].id if len(rows) > limit else None}
+
+@router.get("/my-orders", response_model=List[OrderDetail])
 def get_user_orders(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    orders = db.query(Order).filter(Order.user_id == current_user.id).order_by(Order.created_at.desc()).all()
-    return orders
+    """Every order with its items; prefer the paginated /history endpoints"""
+    return db.query(Order).options(_with_items()).filter(
+        Order.user_id == current_user.id
+    ).order_by(Order.created_at.desc(), Order.id.desc()).all()
+
+@router.get("/history", response_model=OrderSummaryPage)
+def get_order_history(
+    cursor: Optional[int] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=MAX_HISTORY_PAGE_SIZE),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """One page of order summaries (no items) for list views, in one query"""
+    item_count = select(func.coalesce(func.sum(OrderItem.quantity), 0)).where(
+        OrderItem.order_id == Order.id
+    ).correlate(Order).scalar_subquery()
+    query = db.query(
+        Order.id, Order.order_number, Order.total_amount, Order.status, Order.payment_status,
+        Order.payment_method, Order.created_at, item_count.label("item_count")
+    )
+    page = _history_page(query, current_user.id, cursor, limit)
+    return {"items": [row._asdict() for row in page["items"]], "next_cursor": page["next_cursor"]}
+
+@router.get("/history/detailed", response_model=OrderDetailPage)
+def get_order_history_detailed(
+    cursor: Optional[int] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(10, ge=1, le=MAX_HISTORY_PAGE_SIZE),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """One page of orders with items and product summaries (three queries)"""
+    return _history_page(db.query(Order).options(_with_items()), current_user.id, cursor, limit)
 
-@router.get("/{order_id}", response_model=OrderSchema)
+@router.get("/{order_id}", response_model=OrderDetail)
 def get_order(order_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id, Order.user_id == current_user.id).first()
+    order = db.query(Order).options(_with_items()).filter(
+        Order.id == order_id, Order.user_id == current_user.id
+    ).first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     return order
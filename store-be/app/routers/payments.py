@@ -1,4 +1,6 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional
 import uuid
@@ -7,16 +9,20 @@ import hashlib
 import hmac
 import json
 import os
-import requests
 from datetime import datetime, timedelta
 import asyncio
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import get_db, SessionLocal
 from app.models import Order
 from app.notifications import send_payment_notification, send_whatsapp_notification
+from app import payment_events, ledger, pubsub, rollups
 
 router = APIRouter()
 
+# Server-sent events configuration
+PAYMENT_STREAM_HEARTBEAT = float(os.getenv("PAYMENT_STREAM_HEARTBEAT", "15"))
+PAYMENT_STREAM_MAX_SECONDS = float(os.getenv("PAYMENT_STREAM_MAX_SECONDS", "900"))
+
 class MobileWalletPayment(BaseModel):
     amount: float
     mobile_number: str
@@ -117,6 +123,8 @@ async def process_jazzcash_payment(payment: MobileWalletPayment, db: Session = D
         params["pp_SecureHash"] = generate_jazzcash_hash(hash_string, JAZZCASH_CONFIG["integrity_salt"])
         
         # Make API call to JazzCash
+        import requests
+
         response = requests.post(JAZZCASH_CONFIG["base_url"], data=params)
         
         if response.status_code == 200:
@@ -126,7 +134,8 @@ async def process_jazzcash_payment(payment: MobileWalletPayment, db: Session = D
             if order:
                 order.transaction_id = transaction_ref
                 order.payment_status = "pending"
-                db.commit()
+            ledger.record_attempt(db, order, "jazzcash", transaction_ref, payment.amount)
+            db.commit()
             
             return PaymentResponse(
                 success=True,
@@ -162,7 +171,8 @@ async def process_easypaisa_payment(payment: MobileWalletPayment, db: Session =
         if order:
             order.transaction_id = transaction_id
             order.payment_status = "pending"
-            db.commit()
+        ledger.record_attempt(db, order, "easypaisa", transaction_id, payment.amount)
+        db.commit()
         
         return PaymentResponse(
             success=True,
@@ -177,22 +187,7 @@ async def process_easypaisa_payment(payment: MobileWalletPayment, db: Session =
 @router.get("/status/{transaction_id}")
 async def get_payment_status(transaction_id: str, db: Session = Depends(get_db)):
     try:
-        order = db.query(Order).filter(Order.transaction_id == transaction_id).first()
-        
-        if not order:
-            return {
-                "transaction_id": transaction_id,
-                "status": "not_found",
-                "message": "Transaction not found"
-            }
-        
-        return {
-            "transaction_id": transaction_id,
-            "status": order.payment_status,
-            "message": f"Payment is {order.payment_status}",
-            "order_number": order.order_number,
-            "amount": order.total_amount
-        }
+        return ledger.get_payment_status(db, transaction_id)
         
     except Exception as e:
         return {
@@ -201,6 +196,52 @@ async def get_payment_status(transaction_id: str, db: Session = Depends(get_db))
             "message": str(e)
         }
 
+def _read_payment_status(transaction_id: str) -> dict:
+    # Streams outlive the request-scoped session, so use a short-lived one per read
+    db = SessionLocal()
+    try:
+        return ledger.get_payment_status(db, transaction_id)
+    finally:
+        db.close()
+
+async def _publish_payment_status(transaction_id: str):
+    status = await run_in_threadpool(_read_payment_status, transaction_id)
+    await pubsub.get_broker().publish(ledger.status_channel(transaction_id), status)
+
+def _sse(data: dict) -> str:
+    return f"data: {json.dumps(data, default=str)}\n\n"
+
+@router.get("/status/{transaction_id}/stream")
+async def stream_payment_status(transaction_id: str, request: Request):
+    """Server-sent events with the transaction status; ends once the status is final"""
+    # Unknown transactions get a 404 rather than a stream that waits for updates that never come
+    if (await run_in_threadpool(_read_payment_status, transaction_id)).get("status") == "not_found":
+        raise HTTPException(status_code=404, detail="Transaction not found")
+
+    async def events():
+        async with pubsub.get_broker().subscribe(ledger.status_channel(transaction_id)) as subscription:
+            # Read the current status only after subscribing so no update is missed in between
+            status = await run_in_threadpool(_read_payment_status, transaction_id)
+            yield _sse(status)
+            
+            deadline = time.monotonic() + PAYMENT_STREAM_MAX_SECONDS
+            while status.get("status") not in ledger.FINAL_STATUSES and time.monotonic() < deadline:
+                message = await subscription.get(timeout=PAYMENT_STREAM_HEARTBEAT)
+                # Checked after every wait, so a gone client costs at most one heartbeat of subscription
+                if await request.is_disconnected():
+                    return
+                if message is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                status = message
+                yield _sse(status)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/jazzcash/callback")
 async def jazzcash_callback(request_data: dict, db: Session = Depends(get_db)):
     try:
@@ -212,11 +253,24 @@ async def jazzcash_callback(request_data: dict, db: Session = Depends(get_db)):
         status = "success" if pp_ResponseCode == "000" else "failed"
         
         if pp_TxnRefNo:
-            order = db.query(Order).filter(Order.transaction_id == pp_TxnRefNo).first()
-            if order:
-                order.payment_status = status
-                db.commit()
-                
+            # Gateway retries of an already processed callback are acknowledged without side effects
+            if not payment_events.register_callback(db, "jazzcash", pp_TxnRefNo, pp_ResponseCode, request_data):
+                return {"status": status, "transaction_id": pp_TxnRefNo, "message": pp_ResponseMessage, "duplicate": True}
+            
+            payment = ledger.find_payment(db, pp_TxnRefNo)
+            if payment:
+                order = payment.order
+                changed = ledger.transition_payment(db, payment, status, "callback")
+            else:
+                # Transactions initiated before the ledger existed only live on the order
+                order = db.query(Order).filter(Order.transaction_id == pp_TxnRefNo).first()
+                changed = bool(order) and payment_events.transition_order_payment(db, order, status)
+            db.commit()
+            rollups.refresh_stale_rollups(db)
+            
+            if changed:
+                await _publish_payment_status(pp_TxnRefNo)
+            if changed and order is not None:
                 await send_payment_notification(
                     order.customer_email,
                     order.order_number,
@@ -239,11 +293,24 @@ async def easypaisa_callback(request_data: dict, db: Session = Depends(get_db)):
         status = "success" if status_code == "0000" else "failed"
         
         if order_ref:
-            order = db.query(Order).filter(Order.order_number == order_ref).first()
-            if order:
-                order.payment_status = status
-                db.commit()
-                
+            # Gateway retries of an already processed callback are acknowledged without side effects
+            if not payment_events.register_callback(db, "easypaisa", order_ref, status_code, request_data):
+                return {"status": status, "order_ref": order_ref, "duplicate": True}
+            
+            payment = ledger.find_latest_payment_for_order(db, order_ref, "easypaisa")
+            if payment:
+                order = payment.order
+                changed = ledger.transition_payment(db, payment, status, "callback")
+            else:
+                order = db.query(Order).filter(Order.order_number == order_ref).first()
+                changed = bool(order) and payment_events.transition_order_payment(db, order, status)
+            db.commit()
+            rollups.refresh_stale_rollups(db)
+            
+            transaction_id = payment.transaction_id if payment else (order.transaction_id if order else None)
+            if changed and transaction_id:
+                await _publish_payment_status(transaction_id)
+            if changed and order is not None:
                 await send_payment_notification(
                     order.customer_email,
                     order.order_number,
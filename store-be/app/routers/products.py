@@ -5,20 +5,24 @@ from typing import List, Optional
 import logging
 from app.database import get_db
 from app.models import Product, Category
-from app.schemas import Product as ProductSchema, Category as CategorySchema
+from app.schemas import Product as ProductSchema, Category as CategorySchema, ProductBatch
+from app.utils import parse_id_list
+from app import attributes, pricing, rankings, recommendations, typeahead
 
 logger = logging.getLogger(__name__)
 
-# Create router with tags and prefix
+# Mounted at /api/products by main.py
 router = APIRouter(
-    prefix="/api/products",  # Set the prefix here
     tags=["products"],
     responses={404: {"description": "Not found"}}
 )
 
+MAX_BATCH_IDS = 100
+
 # Single route for getting products with optional query parameters
+@router.get("", include_in_schema=False)
 @router.get(
-    "", 
+    "/", 
     response_model=List[ProductSchema],
     status_code=status.HTTP_200_OK,
     summary="Get all products",
@@ -31,17 +35,21 @@ async def get_products(
     min_price: Optional[float] = Query(None, description="Minimum price"),
     max_price: Optional[float] = Query(None, description="Maximum price"),
     search: Optional[str] = Query(None, description="Search in name and description"),
+    attr: Optional[List[str]] = Query(
+        None, description="Attribute filter, repeatable: material:gold|silver, stone:pearl, weight_grams<=5"
+    ),
     limit: Optional[int] = Query(None, description="Limit number of results"),
     db: Session = Depends(get_db)
 ):
-    logger.info("GET /api/products endpoint called")
-    logger.info(f"Query parameters - category: {category}, subcategory: {subcategory}, "
-               f"min_price: {min_price}, max_price: {max_price}, search: {search}, limit: {limit}")
+    logger.debug(
+        "Product query - category: %s, subcategory: %s, min_price: %s, max_price: %s, search: %s, attr: %s, limit: %s",
+        category, subcategory, min_price, max_price, search, attr, limit
+    )
+    attribute_filters = attributes.parse_filters(attr)
     
     try:
         # Start building the query
         query = db.query(Product).options(joinedload(Product.category)).filter(Product.is_active == True)
-        logger.debug(f"Initial query: {query.statement}")
         
         # Apply filters if provided
         if category:
@@ -60,16 +68,10 @@ async def get_products(
             query = query.filter(Product.subcategory == subcategory)
         
         if min_price is not None:
-            query = query.filter(
-                (Product.offer_price >= min_price) | 
-                ((Product.offer_price == None) & (Product.retail_price >= min_price))
-            )
+            query = query.filter(pricing.effective_price_column >= min_price)
         
         if max_price is not None:
-            query = query.filter(
-                (Product.offer_price <= max_price) | 
-                ((Product.offer_price == None) & (Product.retail_price <= max_price))
-            )
+            query = query.filter(pricing.effective_price_column <= max_price)
         
         if search:
             search_term = f"%{search}%"
@@ -79,26 +81,21 @@ async def get_products(
                 (Product.full_name.ilike(search_term))
             )
         
+        if attribute_filters:
+            query = query.filter(*attributes.filter_conditions(attribute_filters))
+        
         if limit:
             query = query.limit(limit)
         
         # Execute the query
         products = query.all()
-        logger.info(f"Found {len(products)} products")
-        
-        # Set legacy fields for backward compatibility
-        for product in products:
-            if not hasattr(product, 'price') or product.price is None:
-                product.price = getattr(product, 'offer_price', None) or getattr(product, 'retail_price', 0)
-            if not hasattr(product, 'original_price') or product.original_price is None:
-                product.original_price = getattr(product, 'retail_price', 0)
-            if not hasattr(product, 'stock_quantity') or product.stock_quantity is None:
-                product.stock_quantity = getattr(product, 'stock', 0)
+        logger.debug("Found %d products", len(products))
         
+        # Legacy price and stock fields are kept in step on write (app.pricing, app.inventory)
         return products
         
     except Exception as e:
-        logger.error(f"Error in get_products: {str(e)}", exc_info=True)
+        logger.error("Error in get_products: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error retrieving products: {str(e)}"
@@ -121,6 +118,60 @@ def get_subcategories(
     subcategories = query.all()
     return [subcat[0] for subcat in subcategories]
 
+@router.get("/suggest")
+def suggest_products(
+    q: str = Query(..., description="What the customer has typed so far"),
+    limit: int = Query(8, ge=1, le=typeahead.MAX_SUGGESTIONS),
+):
+    """Typeahead suggestions (categories, subcategories, products) from the in-memory prefix index"""
+    return typeahead.suggest(q, limit)
+
+@router.get("/bestsellers", response_model=List[ProductSchema])
+def get_bestsellers(
+    category_id: Optional[int] = Query(None, description="Limit to one category"),
+    limit: int = Query(12, ge=1, le=rankings.MAX_RANKING_SIZE),
+    db: Session = Depends(get_db)
+):
+    """Most units sold in paid orders, all time"""
+    return rankings.top_bestsellers(db, category_id, limit)
+
+@router.get("/trending", response_model=List[ProductSchema])
+def get_trending(
+    category_id: Optional[int] = Query(None, description="Limit to one category"),
+    limit: int = Query(12, ge=1, le=rankings.MAX_RANKING_SIZE),
+    db: Session = Depends(get_db)
+):
+    """Most paid units with recent orders weighted up (TRENDING_HALF_LIFE_HOURS decay)"""
+    return rankings.top_trending(db, category_id, limit)
+
+@router.get("/attributes")
+def get_attribute_values(
+    names: Optional[str] = Query(None, description="Comma-separated attribute names (all by default)"),
+    db: Session = Depends(get_db)
+):
+    """Active product counts per attribute value, for filter menus"""
+    wanted = [name for name in names.split(",") if name.strip()] if names else None
+    return attributes.value_counts(db, wanted)
+
+@router.get("/batch", response_model=ProductBatch)
+def get_products_batch(
+    ids: str = Query(..., description=f"Comma-separated product ids (at most {MAX_BATCH_IDS})"),
+    db: Session = Depends(get_db)
+):
+    """Several products with their categories in one query, in the order requested"""
+    product_ids = parse_id_list(ids, MAX_BATCH_IDS)
+    products = {
+        product.id: product
+        for product in db.query(Product).options(joinedload(Product.category)).filter(
+            Product.id.in_(product_ids), Product.is_active == True
+        )
+    } if product_ids else {}
+    
+    return {
+        "items": [products[product_id] for product_id in product_ids if product_id in products],
+        "missing": [product_id for product_id in product_ids if product_id not in products]
+    }
+
 @router.get("/{product_id}", response_model=ProductSchema)
 def get_product(product_id: int, db: Session = Depends(get_db)):
     product = db.query(Product).options(joinedload(Product.category)).filter(
@@ -129,16 +180,17 @@ def get_product(product_id: int, db: Session = Depends(get_db)):
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    # Set legacy fields for backward compatibility
-    if not product.price:
-        product.price = product.offer_price or product.retail_price
-    if not product.original_price:
-        product.original_price = product.retail_price
-    if not product.stock_quantity:
-        product.stock_quantity = product.stock
-    
     return product
 
+@router.get("/{product_id}/related", response_model=List[ProductSchema])
+def get_related_products(
+    product_id: int,
+    limit: int = Query(8, ge=1, le=recommendations.RECOMMENDATION_TOP_K),
+    db: Session = Depends(get_db)
+):
+    """Products most often bought together with this one (precomputed from paid orders)"""
+    return recommendations.related_products(db, product_id, limit)
+
 @router.get("/category/{category}")
 def get_products_by_category(
     category: str,
@@ -162,15 +214,4 @@ def get_products_by_category(
     if subcategory:
         query = query.filter(Product.subcategory == subcategory)
     
-    products = query.all()
-    
-    # Set legacy fields for backward compatibility
-    for product in products:
-        if not product.price:
-            product.price = product.offer_price or product.retail_price
-        if not product.original_price:
-            product.original_price = product.retail_price
-        if not product.stock_quantity:
-            product.stock_quantity = product.stock
-    
-    return products
+    return query.all()
@@ -0,0 +1,241 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.database import dialect_insert
+from app.models import Order, OrderItem, Product, SalesBucket
+from app.statuses import CANCELLED_STATUS, PAID_STATUS
+from app import rankings
+
+TOTAL_PRODUCT_ID = 0  # bucket row holding order-level totals
+
+_METRICS = ("orders", "units", "revenue", "paid_orders", "paid_units", "paid_revenue")
+
+def bucket_start(moment: Optional[datetime]) -> datetime:
+    """Truncate to the hour, as naive UTC"""
+    if moment is None:
+        moment = datetime.utcnow()
+    elif moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+def _order_lines(db: Session, order: Order) -> List[Tuple[int, Optional[int], int, float]]:
+    db.flush()
+    return db.query(
+        OrderItem.product_id, Product.category_id, OrderItem.quantity, OrderItem.price
+    ).outerjoin(Product, Product.id == OrderItem.product_id).filter(
+        OrderItem.order_id == order.id
+    ).all()
+
+def _bucket_upsert(db: Session):
+    """INSERT ... ON CONFLICT DO UPDATE adding each metric to the stored value (SQLite and PostgreSQL)
+
+    The database does the addition, so concurrent orders in the same hour,
+    including the shared totals row, never overwrite each other's counts
+    and the first orders of an hour cannot collide on the unique key.
+    """
+    table = SalesBucket.__table__
+    statement = dialect_insert(db, table)
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.bucket_start, table.c.product_id],
+        set_={
+            metric: func.coalesce(table.c[metric], 0) + getattr(statement.excluded, metric)
+            for metric in _METRICS
+        }
+    )
+
+def _apply(db: Session, order: Order, sign: int, gross: bool, paid: bool):
+    if not (gross or paid):
+        return
+
+    lines = _order_lines(db, order)
+    if not lines:
+        return
+
+    deltas: Dict[int, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    categories: Dict[int, Optional[int]] = {TOTAL_PRODUCT_ID: None}
+    for product_id, category_id, quantity, price in lines:
+        quantity = quantity or 0
+        amount = (price or 0) * quantity
+        categories[product_id] = category_id
+        for product_key in (product_id, TOTAL_PRODUCT_ID):
+            if gross:
+                deltas[product_key]["units"] += sign * quantity
+                deltas[product_key]["revenue"] += sign * amount
+            if paid:
+                deltas[product_key]["paid_units"] += sign * quantity
+                deltas[product_key]["paid_revenue"] += sign * amount
+
+    # Paid units also feed products.sold and the trending scores
+    if paid:
+        rankings.record_paid_units(
+            db, [(product_id, category_id, quantity or 0) for product_id, category_id, quantity, _ in lines],
+            sign, order.created_at
+        )
+
+    # Each order counts once per product it contains, and once in the totals row
+    for product_key in deltas:
+        if gross:
+            deltas[product_key]["orders"] += sign
+        if paid:
+            deltas[product_key]["paid_orders"] += sign
+
+    hour = bucket_start(order.created_at)
+    # Sorted so concurrent orders take the bucket rows' locks in the same order
+    db.execute(_bucket_upsert(db), [
+        {
+            "bucket_start": hour,
+            "product_id": product_key,
+            "category_id": categories.get(product_key),
+            **{metric: values.get(metric, 0) for metric in _METRICS}
+        }
+        for product_key, values in sorted(deltas.items())
+    ])
+
+def record_order_placed(db: Session, order: Order):
+    """Add a new (or un-cancelled) order to its hour bucket; caller commits"""
+    _apply(db, order, 1, gross=True, paid=order.payment_status == PAID_STATUS)
+
+def record_order_removed(db: Session, order: Order):
+    """Remove a cancelled or deleted order from its hour bucket; caller commits"""
+    _apply(db, order, -1, gross=True, paid=order.payment_status == PAID_STATUS)
+
+def record_payment_transition(db: Session, order: Order, old_status: Optional[str], new_status: Optional[str]):
+    """Move an order in or out of the paid figures when its payment status changes"""
+    if order.status == CANCELLED_STATUS or (old_status == PAID_STATUS) == (new_status == PAID_STATUS):
+        return
+    _apply(db, order, 1 if new_status == PAID_STATUS else -1, gross=False, paid=True)
+
+def rebuild_sales_buckets(db: Session) -> int:
+    """Recompute every bucket from the orders table; returns the number of buckets written"""
+    totals: Dict[Tuple[datetime, int], Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    categories: Dict[int, Optional[int]] = {TOTAL_PRODUCT_ID: None}
+    seen_orders = set()
+
+    rows = db.query(
+        Order.id, Order.created_at, Order.payment_status,
+        OrderItem.product_id, Product.category_id, OrderItem.quantity, OrderItem.price
+    ).join(OrderItem, OrderItem.order_id == Order.id).outerjoin(
+        Product, Product.id == OrderItem.product_id
+    ).filter(
+        func.coalesce(Order.status, "") != CANCELLED_STATUS
+    ).yield_per(1000)
+
+    for order_id, created_at, payment_status, product_id, category_id, quantity, price in rows:
+        hour = bucket_start(created_at)
+        paid = payment_status == PAID_STATUS
+        quantity = quantity or 0
+        amount = (price or 0) * quantity
+        categories[product_id] = category_id
+
+        for product_key in (product_id, TOTAL_PRODUCT_ID):
+            values = totals[(hour, product_key)]
+            # Each order counts once per product it contains, and once in the totals row
+            if (order_id, product_key) not in seen_orders:
+                seen_orders.add((order_id, product_key))
+                values["orders"] += 1
+                if paid:
+                    values["paid_orders"] += 1
+            values["units"] += quantity
+            values["revenue"] += amount
+            if paid:
+                values["paid_units"] += quantity
+                values["paid_revenue"] += amount
+
+    db.query(SalesBucket).delete(synchronize_session=False)
+    db.bulk_insert_mappings(SalesBucket, [
+        {
+            "bucket_start": hour,
+            "product_id": product_id,
+            "category_id": categories.get(product_id),
+            **{metric: values.get(metric, 0) for metric in _METRICS}
+        }
+        for (hour, product_id), values in totals.items()
+    ])
+    db.commit()
+    return len(totals)
+
+def _default_range(start: Optional[datetime], end: Optional[datetime]):
+    end = bucket_start(end) if end else bucket_start(None) + timedelta(hours=1)
+    start = bucket_start(start) if start else end - timedelta(days=30)
+    return start, end
+
+def sales_series(
+    db: Session,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: str = "day",
+    product_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+) -> List[dict]:
+    """Sales per hour or day in [start, end), for everything, one product or one category"""
+    start, end = _default_range(start, end)
+
+    query = db.query(
+        SalesBucket.bucket_start,
+        *[func.sum(getattr(SalesBucket, metric)).label(metric) for metric in _METRICS]
+    ).filter(SalesBucket.bucket_start >= start, SalesBucket.bucket_start < end)
+
+    if product_id is not None:
+        query = query.filter(SalesBucket.product_id == product_id)
+    elif category_id is not None:
+        query = query.filter(SalesBucket.category_id == category_id)
+    else:
+        query = query.filter(SalesBucket.product_id == TOTAL_PRODUCT_ID)
+
+    series: Dict[datetime, Dict[str, float]] = {}
+    for row in query.group_by(SalesBucket.bucket_start).order_by(SalesBucket.bucket_start):
+        key = row.bucket_start if granularity == "hour" else row.bucket_start.replace(hour=0)
+        point = series.setdefault(key, {metric: 0 for metric in _METRICS})
+        for metric in _METRICS:
+            point[metric] += getattr(row, metric) or 0
+
+    return [
+        {"bucket": key.isoformat(), **{
+            metric: round(value, 2) if "revenue" in metric else int(value)
+            for metric, value in point.items()
+        }}
+        for key, point in series.items()
+    ]
+
+def top_products(
+    db: Session,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 10,
+    metric: str = "revenue",
+    category_id: Optional[int] = None,
+) -> List[dict]:
+    """Best selling products in [start, end) ranked by a bucket metric"""
+    start, end = _default_range(start, end)
+    ranked = func.sum(getattr(SalesBucket, metric)).label("value")
+
+    query = db.query(
+        SalesBucket.product_id,
+        ranked,
+        func.sum(SalesBucket.units).label("units"),
+        func.sum(SalesBucket.revenue).label("revenue"),
+    ).filter(
+        SalesBucket.bucket_start >= start,
+        SalesBucket.bucket_start < end,
+        SalesBucket.product_id != TOTAL_PRODUCT_ID
+    )
+    if category_id is not None:
+        query = query.filter(SalesBucket.category_id == category_id)
+
+    rows = query.group_by(SalesBucket.product_id).order_by(ranked.desc()).limit(limit).all()
+    names = dict(
+        db.query(Product.id, Product.name).filter(Product.id.in_([row.product_id for row in rows])).all()
+    ) if rows else {}
+
+    return [
+        {
+            "product_id": row.product_id,
+            "name": names.get(row.product_id),
+            metric: round(row.value or 0, 2),
+            "units": int(row.units or 0),
+            "revenue": round(row.revenue or 0, 2),
+        }
+        for row in rows
+    ]
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Union
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+from app.database import SessionLocal
+from app.models import SchedulerLock
+
+logger = logging.getLogger(__name__)
+
+# Scheduler configuration
+BACKGROUND_JOBS_ENABLED = os.getenv("BACKGROUND_JOBS_ENABLED", "false").lower() == "true"
+SCHEDULER_TICK_SECONDS = float(os.getenv("SCHEDULER_TICK_SECONDS", "5"))
+SCHEDULER_LEASE_SECONDS = float(os.getenv("SCHEDULER_LEASE_SECONDS", "30"))
+# Running jobs get this long to finish on shutdown before they are cancelled
+SCHEDULER_STOP_TIMEOUT_SECONDS = float(os.getenv("SCHEDULER_STOP_TIMEOUT_SECONDS", "10"))
+
+LEADER_LOCK = "background-jobs"
+
+JobFunc = Callable[[], Union[None, Awaitable[None]]]
+
+def acquire_lock(name: str, owner: str, lease_seconds: float) -> bool:
+    """Take or renew the named lease; True when `owner` holds it afterwards.
+
+    A single conditional UPDATE renews our own lease or steals an expired one,
+    so two workers can never both believe they are the leader.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=lease_seconds)
+        updated = db.query(SchedulerLock).filter(
+            SchedulerLock.name == name,
+            or_(SchedulerLock.owner == owner, SchedulerLock.expires_at < now)
+        ).update({"owner": owner, "expires_at": expires_at}, synchronize_session=False)
+
+        if not updated:
+            if db.query(SchedulerLock.name).filter(SchedulerLock.name == name).first() is not None:
+                db.rollback()
+                return False
+            db.add(SchedulerLock(name=name, owner=owner, expires_at=expires_at))
+
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another worker created the lock row first
+            db.rollback()
+            return False
+        return True
+    finally:
+        db.close()
+
+def release_lock(name: str, owner: str):
+    db = SessionLocal()
+    try:
+        db.query(SchedulerLock).filter(
+            SchedulerLock.name == name, SchedulerLock.owner == owner
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+class Job:
+    def __init__(self, name: str, interval: float, func: JobFunc):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.next_run = time.monotonic()
+
+class Scheduler:
+    """In-process interval scheduler; only the worker holding the DB lease runs jobs"""
+
+    def __init__(self, lock_name: str = LEADER_LOCK, lease_seconds: float = SCHEDULER_LEASE_SECONDS):
+        self.lock_name = lock_name
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.jobs: Dict[str, Job] = {}
+        self.is_leader = False
+        self._task: Optional[asyncio.Task] = None
+        self._running: Dict[str, asyncio.Task] = {}
+
+    def add_job(self, name: str, interval: float, func: JobFunc):
+        """Run `func` every `interval` seconds; sync functions run in the threadpool"""
+        self.jobs[name] = Job(name, interval, func)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+            logger.info("Background scheduler started as %s with jobs %s", self.owner, list(self.jobs))
+
+    async def stop(self, timeout: float = SCHEDULER_STOP_TIMEOUT_SECONDS):
+        """Stop scheduling, let running jobs finish for up to `timeout` seconds, then cancel the rest"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        if self._running:
+            await asyncio.wait(list(self._running.values()), timeout=timeout)
+        for task in list(self._running.values()):
+            task.cancel()
+        await asyncio.gather(*self._running.values(), return_exceptions=True)
+        self._running.clear()
+
+        if self.is_leader:
+            await run_in_threadpool(release_lock, self.lock_name, self.owner)
+            self.is_leader = False
+
+    async def run_job(self, job: Job):
+        started = time.perf_counter()
+        try:
+            if asyncio.iscoroutinefunction(job.func):
+                await job.func()
+            else:
+                await run_in_threadpool(job.func)
+            logger.info("Job %s finished in %.1fms", job.name, (time.perf_counter() - started) * 1000)
+        except Exception:
+            logger.exception("Job %s failed", job.name)
+        finally:
+            job.next_run = time.monotonic() + job.interval
+            self._running.pop(job.name, None)
+
+    async def _elect(self):
+        try:
+            leader = await run_in_threadpool(acquire_lock, self.lock_name, self.owner, self.lease_seconds)
+        except Exception:
+            logger.exception("Could not reach the scheduler lock")
+            leader = False
+
+        if leader != self.is_leader:
+            logger.info("Scheduler %s %s leadership", self.owner, "acquired" if leader else "lost")
+        self.is_leader = leader
+
+    async def _loop(self):
+        # Jobs run as separate tasks so the lease keeps being renewed while they work
+        while True:
+            await self._elect()
+            if self.is_leader:
+                now = time.monotonic()
+                for job in list(self.jobs.values()):
+                    if job.next_run <= now and job.name not in self._running:
+                        self._running[job.name] = asyncio.create_task(self.run_job(job))
+            await asyncio.sleep(SCHEDULER_TICK_SECONDS)
+
+scheduler = Scheduler()
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, EmailStr, Field
+from typing import Dict, List, Optional
 from datetime import datetime
+from app.carts import MAX_LINE_QUANTITY
 
 # User schemas
 class UserBase(BaseModel):
@@ -137,6 +138,18 @@ class Product(ProductBase):
     class Config:
         from_attributes = True
 
+class ProductBatch(BaseModel):
+    items: List[Product]
+    missing: List[int]
+
+class ProductAttributes(BaseModel):
+    product_id: int
+    attributes: Dict[str, List[str]]  # e.g. {"material": ["gold"], "stone": ["pearl", "ruby"]}
+
+class ProductAttributesBulk(BaseModel):
+    items: List[ProductAttributes]
+    replace: bool = False  # drop attributes not listed for these products
+
 # Order schemas
 class OrderItemBase(BaseModel):
     product_id: int
@@ -181,6 +194,58 @@ class Order(OrderBase):
     class Config:
         from_attributes = True
 
+class OrderSummary(BaseModel):
+    """Order list row without items"""
+    id: int
+    order_number: str
+    total_amount: float
+    status: str
+    payment_status: str
+    payment_method: str
+    created_at: datetime
+    item_count: int = 0
+
+class OrderSummaryPage(BaseModel):
+    items: List[OrderSummary]
+    next_cursor: Optional[int] = None
+
+class ProductSummary(BaseModel):
+    id: int
+    name: str
+    images: Optional[List[str]] = []
+    
+    class Config:
+        from_attributes = True
+
+class OrderItemDetail(OrderItem):
+    product: Optional[ProductSummary] = None
+
+class OrderDetail(Order):
+    items: List[OrderItemDetail] = []
+
+class OrderDetailPage(BaseModel):
+    items: List[OrderDetail]
+    next_cursor: Optional[int] = None
+
+class OrderTrackingRequest(BaseModel):
+    order_number: str
+    email: Optional[str] = None
+    phone: Optional[str] = None
+
+class OrderTracking(BaseModel):
+    """What a guest sees about an order: no address or contact details"""
+    order_number: str
+    status: str
+    payment_status: str
+    payment_method: str
+    total_amount: float
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    items: List[OrderItemDetail] = []
+    
+    class Config:
+        from_attributes = True
+
 # Offer schemas
 class OfferBase(BaseModel):
     name: str
@@ -212,10 +277,37 @@ class Offer(OfferBase):
     class Config:
         from_attributes = True
 
+# Hair accessory schemas
+class HairAccessory(BaseModel):
+    id: int
+    name: str
+    description: Optional[str] = None
+    price: Optional[float] = None
+    original_price: Optional[float] = None
+    currency: Optional[str] = "PKR"
+    stock: Optional[int] = 0
+    status: Optional[str] = None
+    images: Optional[List[str]] = []
+    category: Optional[str] = None
+    material: Optional[str] = None
+    color: Optional[str] = None
+    is_featured: bool = False
+    created_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+class HairAccessoryPage(BaseModel):
+    items: List[HairAccessory]
+    next_cursor: Optional[int] = None
+
 # Cart schemas
 class CartItem(BaseModel):
     product_id: int
-    quantity: int
+    quantity: int = Field(ge=1, le=MAX_LINE_QUANTITY)
+
+class CartQuantity(BaseModel):
+    quantity: int = Field(ge=0, le=MAX_LINE_QUANTITY)  # 0 removes the line
 
 class CartItemResponse(CartItem):
     product: Product
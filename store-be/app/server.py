@@ -0,0 +1,89 @@
+import argparse
+import logging
+import os
+
+# Server configuration
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+# In-flight requests get this long to finish after SIGTERM before workers are stopped
+GRACEFUL_TIMEOUT_SECONDS = int(os.getenv("GRACEFUL_TIMEOUT_SECONDS", "30"))
+KEEPALIVE_SECONDS = int(os.getenv("KEEPALIVE_SECONDS", "5"))
+# Proxy addresses whose X-Forwarded-* headers are trusted
+FORWARDED_ALLOW_IPS = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+logger = logging.getLogger(__name__)
+
+def _run_uvicorn(args):
+    import uvicorn
+
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        timeout_keep_alive=KEEPALIVE_SECONDS,
+        proxy_headers=True,
+        forwarded_allow_ips=FORWARDED_ALLOW_IPS,
+        # Requests are already logged (with request ids) by main.log_requests
+        access_log=False,
+        log_config=None,
+    )
+
+def _run_gunicorn(args):
+    """Gunicorn master with uvicorn workers: crashed workers are replaced and SIGHUP reloads gracefully"""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit("--gunicorn needs the gunicorn package (pip install gunicorn)")
+
+    options = {
+        "bind": f"{args.host}:{args.port}",
+        "workers": args.workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "graceful_timeout": args.graceful_timeout,
+        "keepalive": KEEPALIVE_SECONDS,
+        "forwarded_allow_ips": FORWARDED_ALLOW_IPS,
+    }
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from main import app
+
+            return app
+
+    Application().run()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API with several worker processes")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    parser.add_argument("--graceful-timeout", type=int, default=GRACEFUL_TIMEOUT_SECONDS)
+    parser.add_argument("--gunicorn", action="store_true", help="use a gunicorn master instead of uvicorn's")
+    parser.add_argument("--skip-migrate", action="store_true", help="the schema is managed elsewhere")
+    args = parser.parse_args()
+
+    # Workers inherit this, so the schema is checked once here rather than once per worker
+    os.environ["DB_AUTO_MIGRATE"] = "false"
+
+    from app.logging_config import configure_logging
+
+    configure_logging()
+    if not args.skip_migrate:
+        from app.database import engine
+        from app.migrate import migrate
+
+        migrate()
+        # Workers open their own pools; a forked copy of this one would share sockets
+        engine.dispose()
+    logger.info("Starting %d workers on %s:%d", args.workers, args.host, args.port)
+    (_run_gunicorn if args.gunicorn else _run_uvicorn)(args)
+
+if __name__ == "__main__":
+    main()
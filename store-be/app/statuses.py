@@ -0,0 +1,3 @@
+# Order status values that decide what counts as a sale
+PAID_STATUS = "success"
+CANCELLED_STATUS = "cancelled"
@@ -0,0 +1,85 @@
+import hmac
+import os
+import re
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload
+from app.cache import TTLCache
+from app.models import Order, OrderItem, Product
+from app.ratelimit import TokenBucketLimiter, too_many
+from app.schemas import OrderTracking
+
+# Order tracking configuration
+ORDER_TRACKING_CACHE_TTL = float(os.getenv("ORDER_TRACKING_CACHE_TTL", "30"))
+# Wrong email/phone guesses allowed per order number per hour
+ORDER_TRACKING_FAILURES_PER_HOUR = float(os.getenv("ORDER_TRACKING_FAILURES_PER_HOUR", "10"))
+MIN_PHONE_DIGITS = 7
+# Subscriber number without the country or trunk prefix
+PHONE_MATCH_DIGITS = 10
+
+tracking_cache = TTLCache(ttl=ORDER_TRACKING_CACHE_TTL, maxsize=5000)
+failure_limiter = TokenBucketLimiter(ORDER_TRACKING_FAILURES_PER_HOUR, ORDER_TRACKING_FAILURES_PER_HOUR / 3600)
+
+@event.listens_for(Session, "after_flush")
+def _note_order_changes(db, flush_context):
+    changed = {
+        instance.order_number for instance in (*db.dirty, *db.deleted)
+        if isinstance(instance, Order) and instance.order_number
+    }
+    if changed:
+        db.info.setdefault("stale_tracked_orders", set()).update(changed)
+
+@event.listens_for(Session, "after_commit")
+def _drop_stale_orders(db):
+    for order_number in db.info.pop("stale_tracked_orders", ()):
+        tracking_cache.invalidate(order_number)
+
+def _digits(phone: Optional[str]) -> str:
+    return re.sub(r"\D", "", phone or "")
+
+def _load(db: Session, order_number: str) -> Optional[dict]:
+    """The order with its items and product summaries from one query on the unique order_number index"""
+    order = db.query(Order).options(
+        joinedload(Order.items).joinedload(OrderItem.product).load_only(Product.id, Product.name, Product.images)
+    ).filter(Order.order_number == order_number).first()
+    if order is None:
+        return None
+    return {
+        "email": (order.customer_email or "").strip().lower(),
+        "phone": _digits(order.customer_phone),
+        "order": OrderTracking.model_validate(order).model_dump(),
+    }
+
+def _verified(entry: dict, email: Optional[str], phone: Optional[str]) -> bool:
+    if email and entry["email"]:
+        return hmac.compare_digest(email.strip().lower(), entry["email"])
+    # Compare the trailing digits so +92 300... and 0300... both match, but never
+    # fewer than the stored number has (up to PHONE_MATCH_DIGITS): no short suffixes
+    length = min(len(entry["phone"]), PHONE_MATCH_DIGITS)
+    digits = _digits(phone)
+    if length >= MIN_PHONE_DIGITS and len(digits) >= length:
+        return hmac.compare_digest(digits[-length:], entry["phone"][-length:])
+    return False
+
+def track(db: Session, order_number: str, email: Optional[str], phone: Optional[str]) -> dict:
+    """A guest's view of an order once the email or phone on it matches.
+
+    Unknown numbers and wrong contact details get the same 404. After
+    ORDER_TRACKING_FAILURES_PER_HOUR wrong guesses an order number answers
+    429 to everyone until the bucket refills, so guesses cannot be confirmed.
+    """
+    if not email and not phone:
+        raise HTTPException(status_code=400, detail="Provide the email or phone number used for the order")
+    order_number = order_number.strip().upper()
+    too_many(failure_limiter.retry_after(order_number), "Too many failed attempts for this order, try again later")
+
+    entry = tracking_cache.get(order_number)
+    if entry is None:
+        entry = _load(db, order_number)
+        if entry is not None:
+            tracking_cache.set(order_number, entry)
+    if entry is None or not _verified(entry, email, phone):
+        failure_limiter.acquire(order_number)
+        raise HTTPException(status_code=404, detail="Order not found")
+    return entry["order"]
@@ -0,0 +1,266 @@
+import bisect
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import Category, Product
+
+logger = logging.getLogger(__name__)
+
+# Typeahead configuration
+TYPEAHEAD_REBUILD_INTERVAL_SECONDS = float(os.getenv("TYPEAHEAD_REBUILD_INTERVAL_SECONDS", "600"))
+MAX_SUGGESTIONS = 20
+# Extra ranked entries per prefix cover categories that share a name with a subcategory
+RANKED_PER_PREFIX = MAX_SUGGESTIONS * 2
+RANKED_PREFIX_CACHE_SIZE = 20000
+MIN_QUERY_LENGTH = 1
+
+_WORD_BREAK = re.compile(r"[^\w]+")
+
+def normalise(text: Optional[str]) -> str:
+    return " ".join(_WORD_BREAK.sub(" ", (text or "").lower()).split())
+
+def _keys(label: str) -> List[str]:
+    """The label from each word onwards, so 'pearl' and 'pearl ear' both find 'Classic Pearl Earring'"""
+    words = normalise(label).split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+class _Entry(NamedTuple):
+    kind: str  # product, category, subcategory
+    ref: object  # product/category id, or the subcategory name
+    label: str
+    sold: int
+
+class PrefixIndex:
+    """Sorted (key, kind, ref) tuples searched with bisect; top-k by units sold.
+
+    Ranked matches are memoised per prefix. A write drops only the memoised
+    prefixes of the keys it changed, and the one- and two-letter prefixes
+    (the largest ranges) are ranked up front on every load. Units sold change
+    on every order without an ORM flush, so ranks are refreshed by a full
+    reload every TYPEAHEAD_REBUILD_INTERVAL_SECONDS. Each worker process keeps
+    its own index.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys: List[Tuple[str, str, object]] = []
+        self._entries: Dict[Tuple[str, object], _Entry] = {}
+        self._subcategory_members: Dict[str, Set[int]] = {}
+        self._product_subcategory: Dict[int, str] = {}
+        self._ranked: "OrderedDict[str, List[_Entry]]" = OrderedDict()
+        self.ready = False
+        self.built_at = 0.0
+
+    def _add(self, entry: _Entry, keep_sorted: bool = True) -> List[str]:
+        self._entries[(entry.kind, entry.ref)] = entry
+        keys = _keys(entry.label)
+        for key in keys:
+            if keep_sorted:
+                bisect.insort(self._keys, (key, entry.kind, entry.ref))
+            else:
+                self._keys.append((key, entry.kind, entry.ref))
+        return keys
+
+    def _remove(self, kind: str, ref) -> Tuple[Optional[_Entry], List[str]]:
+        entry = self._entries.pop((kind, ref), None)
+        if entry is None:
+            return None, []
+        keys = _keys(entry.label)
+        for key in keys:
+            position = bisect.bisect_left(self._keys, (key, kind, ref))
+            if position < len(self._keys) and self._keys[position] == (key, kind, ref):
+                del self._keys[position]
+        return entry, keys
+
+    def _set_subcategory(self, product_id: int, subcategory: Optional[str], keep_sorted: bool = True) -> List[str]:
+        """Move a product between subcategories; returns the subcategory keys whose ranking changed"""
+        changed = []
+        previous = self._product_subcategory.pop(product_id, None)
+        if previous is not None:
+            members = self._subcategory_members[previous]
+            members.discard(product_id)
+            changed += _keys(previous)
+            if not members:
+                del self._subcategory_members[previous]
+                self._remove("subcategory", previous)
+        if subcategory:
+            self._product_subcategory[product_id] = subcategory
+            if subcategory not in self._subcategory_members:
+                self._subcategory_members[subcategory] = set()
+                self._add(_Entry("subcategory", subcategory, subcategory, 0), keep_sorted)
+            self._subcategory_members[subcategory].add(product_id)
+            changed += _keys(subcategory)
+        return changed
+
+    def _rank(self, entry: _Entry) -> tuple:
+        if entry.kind == "subcategory":
+            sold = sum(
+                self._entries[("product", product_id)].sold
+                for product_id in self._subcategory_members.get(entry.ref, ())
+            )
+        else:
+            sold = entry.sold
+        return (entry.kind == "category", sold, -len(entry.label))
+
+    def _rank_prefix(self, prefix: str) -> List[_Entry]:
+        """The best RANKED_PER_PREFIX distinct entries whose keys start with `prefix`"""
+        start = bisect.bisect_left(self._keys, (prefix,))
+        end = bisect.bisect_left(self._keys, (prefix + "\U0010ffff",), start)
+        entries = [self._entries[match] for match in {(kind, ref) for _, kind, ref in self._keys[start:end]}]
+        return heapq.nlargest(RANKED_PER_PREFIX, entries, key=self._rank)
+
+    def _forget(self, keys: List[str]):
+        """Drop (or for short prefixes, redo) memoised rankings for every prefix of the changed keys"""
+        if not keys:
+            return
+        for prefix in [prefix for prefix in self._ranked if any(key.startswith(prefix) for key in keys)]:
+            if len(prefix) <= 2:
+                # The widest ranges are re-ranked here so no search pays for them
+                self._ranked[prefix] = self._rank_prefix(prefix)
+            else:
+                del self._ranked[prefix]
+
+    def load(self, products: List[tuple], categories: List[tuple]):
+        """Replace everything with (id, name, subcategory, sold) products and (id, name, sold) categories"""
+        with self._lock:
+            self._keys, self._entries, self._ranked = [], {}, OrderedDict()
+            self._subcategory_members, self._product_subcategory = {}, {}
+            for product_id, name, subcategory, sold in products:
+                if name:
+                    self._add(_Entry("product", product_id, name, sold or 0), keep_sorted=False)
+                    self._set_subcategory(product_id, subcategory, keep_sorted=False)
+            for category_id, name, sold in categories:
+                if name:
+                    self._add(_Entry("category", category_id, name, sold or 0), keep_sorted=False)
+            self._keys.sort()
+            for prefix in sorted({key[:length] for key, _, _ in self._keys for length in (1, 2)}):
+                self._ranked[prefix] = self._rank_prefix(prefix)
+            self.ready = True
+            self.built_at = time.monotonic()
+
+    def upsert_product(self, product_id: int, name: Optional[str], subcategory: Optional[str], sold: int, active: bool):
+        with self._lock:
+            _, changed = self._remove("product", product_id)
+            changed += self._set_subcategory(product_id, None)
+            if active and name:
+                changed += self._add(_Entry("product", product_id, name, sold or 0))
+                changed += self._set_subcategory(product_id, subcategory)
+            self._forget(changed)
+
+    def upsert_category(self, category_id: int, name: Optional[str], active: bool):
+        with self._lock:
+            previous, changed = self._remove("category", category_id)
+            if active and name:
+                changed += self._add(_Entry("category", category_id, name, previous.sold if previous else 0))
+            self._forget(changed)
+
+    def suggest(self, query: str, limit: int) -> List[dict]:
+        prefix = normalise(query)
+        if len(prefix) < MIN_QUERY_LENGTH:
+            return []
+
+        with self._lock:
+            ranked = self._ranked.get(prefix)
+            if ranked is None:
+                ranked = self._ranked[prefix] = self._rank_prefix(prefix)
+                while len(self._ranked) > RANKED_PREFIX_CACHE_SIZE:
+                    self._ranked.popitem(last=False)
+
+        # A category and the subcategory of the same name are one suggestion
+        suggestions, seen = [], set()
+        for entry in ranked:
+            label_key = normalise(entry.label)
+            if label_key in seen:
+                continue
+            seen.add(label_key)
+            suggestions.append({
+                "type": entry.kind,
+                "id": entry.ref if entry.kind != "subcategory" else None,
+                "label": entry.label,
+            })
+            if len(suggestions) == limit:
+                break
+        return suggestions
+
+index = PrefixIndex()
+
+def rebuild(db: Optional[Session] = None) -> int:
+    """Reload the index from the database (two queries); returns the number of products indexed"""
+    owns_session = db is None
+    db = db or SessionLocal()
+    try:
+        products, sold_by_category = [], {}
+        for product_id, name, subcategory, sold, category_id in db.query(
+            Product.id, Product.name, Product.subcategory, Product.sold, Product.category_id
+        ).filter(Product.is_active == True):
+            products.append((product_id, name, subcategory, sold))
+            sold_by_category[category_id] = sold_by_category.get(category_id, 0) + (sold or 0)
+        categories = [
+            (category_id, name, sold_by_category.get(category_id, 0))
+            for category_id, name in db.query(Category.id, Category.name).filter(Category.is_active == True)
+        ]
+        index.load(products, categories)
+        logger.debug("Typeahead index rebuilt with %d products", len(products))
+        return len(products)
+    finally:
+        if owns_session:
+            db.close()
+
+_rebuilding = threading.Lock()
+
+def _rebuild_in_background():
+    try:
+        rebuild()
+    except Exception:
+        logger.exception("Typeahead index rebuild failed")
+    finally:
+        _rebuilding.release()
+
+def suggest(query: str, limit: int) -> List[dict]:
+    """Top suggestions for a prefix; the first call builds the index, stale ones reload it in the background"""
+    if not index.ready:
+        with _rebuilding:
+            if not index.ready:
+                rebuild()
+    elif time.monotonic() - index.built_at > TYPEAHEAD_REBUILD_INTERVAL_SECONDS and _rebuilding.acquire(blocking=False):
+        threading.Thread(target=_rebuild_in_background, name="typeahead-rebuild", daemon=True).start()
+    return index.suggest(query, limit)
+
+# Edits made through the ORM (admin product and collection endpoints) are applied after commit
+@event.listens_for(Session, "after_flush")
+def _note_catalog_edits(db, flush_context):
+    if not index.ready:
+        return
+    pending = db.info.setdefault("typeahead_pending", {})
+    for instance in (*db.new, *db.dirty):
+        if isinstance(instance, Product):
+            pending[("product", instance.id)] = (
+                instance.name, instance.subcategory, instance.sold or 0, bool(instance.is_active)
+            )
+        elif isinstance(instance, Category):
+            pending[("category", instance.id)] = (instance.name, bool(instance.is_active))
+    for instance in db.deleted:
+        if isinstance(instance, Product):
+            pending[("product", instance.id)] = (None, None, 0, False)
+        elif isinstance(instance, Category):
+            pending[("category", instance.id)] = (None, False)
+
+@event.listens_for(Session, "after_commit")
+def _apply_catalog_edits(db):
+    for (kind, ref), values in db.info.pop("typeahead_pending", {}).items():
+        if kind == "product":
+            index.upsert_product(ref, *values)
+        else:
+            index.upsert_category(ref, *values)
+
+@event.listens_for(Session, "after_rollback")
+def _drop_catalog_edits(db):
+    db.info.pop("typeahead_pending", None)
@@ -0,0 +1,12 @@
+from typing import List
+from fastapi import HTTPException
+
+def parse_id_list(ids: str, max_ids: int) -> List[int]:
+    """Comma-separated ids, de-duplicated in request order"""
+    try:
+        parsed = list(dict.fromkeys(int(value) for value in ids.split(",") if value.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    if len(parsed) > max_ids:
+        raise HTTPException(status_code=400, detail=f"At most {max_ids} ids per request")
+    return parsed
@@ -0,0 +1 @@
+# API benchmark suite: synthetic data generator and in-process load tests
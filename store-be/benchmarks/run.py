@@ -0,0 +1,242 @@
+"""Load-test the API in-process and compare against a stored baseline.
+
+Usage (from store-be/):
+    python -m benchmarks.run                      # run and compare with baseline.json
+    python -m benchmarks.run --save-baseline      # record a new baseline
+    python -m benchmarks.run --scenarios products_list,collections --requests 500
+
+Each run seeds a fresh SQLite database in a temporary directory with the
+synthetic generator in benchmarks/seed.py and drives the real FastAPI app
+through an ASGI transport, so no server or network is involved.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def build_scenarios(data, admin_token):
+    """Request factories per scenario: rng -> (method, url, kwargs)"""
+    product_ids = data["in_stock_product_ids"]
+    category_ids = data["category_ids"]
+    searches = ["gold", "pearl", "bridal", "ring", "silver", "kundan"]
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+    order_counter = iter(range(10 ** 9))
+
+    def products_list(rng):
+        variant = rng.randrange(4)
+        if variant == 0:
+            params = {"limit": 50}
+        elif variant == 1:
+            params = {"category": str(rng.choice(category_ids)), "limit": 50}
+        elif variant == 2:
+            params = {"search": rng.choice(searches), "limit": 50}
+        else:
+            low = rng.choice([200, 500, 1000, 2000])
+            params = {"min_price": low, "max_price": low * 5, "limit": 50}
+        return "GET", "/api/products", {"params": params}
+
+    def collections(rng):
+        return "GET", "/api/collections/", {}
+
+    def guest_order(rng):
+        n = next(order_counter)
+        items = [
+            {"product_id": product_id, "quantity": 1, "price": 0}
+            for product_id in rng.sample(product_ids, min(len(product_ids), rng.randint(1, 3)))
+        ]
+        return "POST", "/api/orders/guest", {"json": {
+            "customer_name": f"Bench Guest {n}",
+            "customer_email": f"guest{n}@example.com",
+            "customer_phone": "03001234567",
+            "shipping_address": "Street 1, Lahore",
+            "payment_method": "cod",
+            "items": items,
+        }}
+
+    def login(rng):
+        from benchmarks.seed import CUSTOMER_EMAIL, PASSWORD
+        return "POST", "/api/auth/login", {"json": {"email": CUSTOMER_EMAIL, "password": PASSWORD}}
+
+    def admin_dashboard(rng):
+        return "GET", "/api/admin/dashboard", {"headers": admin_headers}
+
+    return {
+        "products_list": products_list,
+        "collections": collections,
+        "guest_order": guest_order,
+        "login": login,
+        "admin_dashboard": admin_dashboard,
+    }
+
+# bcrypt makes login two orders of magnitude slower than other endpoints
+DEFAULT_REQUESTS = {"login": 20}
+
+async def run_scenario(client, factory, requests, concurrency, warmup, rng):
+    for _ in range(warmup):
+        method, url, kwargs = factory(rng)
+        await client.request(method, url, **kwargs)
+
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            method, url, kwargs = factory(rng)
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+async def run(args):
+    import httpx
+
+    tmpdir = tempfile.mkdtemp(prefix="saiyaara-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{Path(tmpdir, 'bench.db').as_posix()}"
+    # Every simulated request comes from one client; measure the handlers, not the limiter
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+    # Import after DATABASE_URL points at the scratch database
+    from main import app
+    from app.database import SessionLocal
+    from app.migrate import migrate
+    from benchmarks import seed
+
+    logging.getLogger().setLevel(getattr(logging, args.log_level))
+
+    # The ASGI transport does not run the app's lifespan, so create the schema here
+    migrate()
+
+    db = SessionLocal()
+    try:
+        data = seed.generate(
+            db,
+            products=args.products,
+            categories=args.categories,
+            users=args.users,
+            orders=args.orders,
+            seed=args.seed,
+        )
+    finally:
+        db.close()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.post(
+            "/api/auth/login", json={"email": seed.ADMIN_EMAIL, "password": seed.PASSWORD}
+        )
+        response.raise_for_status()
+        scenarios = build_scenarios(data, response.json()["access_token"])
+
+        selected = args.scenarios.split(",") if args.scenarios else list(scenarios)
+        unknown = [name for name in selected if name not in scenarios]
+        if unknown:
+            raise SystemExit(f"Unknown scenarios: {', '.join(unknown)}")
+
+        results = {}
+        for name in selected:
+            requests = args.requests or DEFAULT_REQUESTS.get(name, 200)
+            rng = random.Random(f"{args.seed}:{name}")
+            results[name] = await run_scenario(
+                client, scenarios[name], requests, args.concurrency, args.warmup, rng
+            )
+
+    return results
+
+def config_of(args):
+    return {
+        "products": args.products,
+        "categories": args.categories,
+        "users": args.users,
+        "orders": args.orders,
+        "seed": args.seed,
+        "concurrency": args.concurrency,
+    }
+
+def print_report(results, baseline, tolerance):
+    """Print results and return the names of scenarios that regressed"""
+    regressions = []
+    header = f"{'scenario':<18}{'reqs':>6}{'errs':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  vs baseline p95"
+    print(header)
+    print("-" * len(header))
+    for name, result in results.items():
+        line = (
+            f"{name:<18}{result['requests']:>6}{result['errors']:>6}{result['throughput_rps']:>10}"
+            f"{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}"
+        )
+        previous = baseline.get(name)
+        if previous and previous.get("p95_ms"):
+            change = (result["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"]
+            flag = "  REGRESSION" if change > tolerance else ""
+            line += f"  {change:+.1%}{flag}"
+            if flag:
+                regressions.append(name)
+        print(line)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Saiyaara API benchmark suite")
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--categories", type=int, default=12)
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scenarios", help="Comma-separated scenario names (default: all)")
+    parser.add_argument("--requests", type=int, help="Requests per scenario (default: 200, login 20)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 regression ratio")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args))
+
+    stored = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    baseline = stored.get("results", {})
+    if stored and stored.get("config") != config_of(args):
+        print("warning: baseline was recorded with a different configuration", file=sys.stderr)
+
+    regressions = print_report(results, {} if args.save_baseline else baseline, args.tolerance)
+
+    if args.save_baseline:
+        BASELINE_PATH.write_text(json.dumps({"config": config_of(args), "results": results}, indent=2) + "\n")
+        print(f"Baseline written to {BASELINE_PATH}")
+    elif regressions and args.fail_on_regression:
+        raise SystemExit(f"p95 regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+
+if __name__ == "__main__":
+    main()
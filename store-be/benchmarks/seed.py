@@ -0,0 +1,178 @@
+"""Seeded synthetic data generator for benchmarks.
+
+The same seed and sizes always produce the same catalog, users, offers and
+orders, so runs against different commits are comparable.
+"""
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.models import Category, Product, User, Order, OrderItem, Offer, ProductOffer
+from app import inventory
+
+ADMIN_EMAIL = "bench-admin@example.com"
+CUSTOMER_EMAIL = "bench-customer@example.com"
+PASSWORD = "bench-password"
+
+CATEGORY_NAMES = [
+    "Earrings", "Necklaces", "Rings", "Bracelets", "Bangles", "Anklets",
+    "Pendants", "Hair Accessories", "Jewelry Sets", "Nose Pins", "Brooches", "Watches",
+]
+MATERIALS = ["gold", "silver", "pearl", "kundan", "rhinestone", "oxidized", "rose gold", "crystal"]
+STYLES = ["classic", "bridal", "minimal", "vintage", "statement", "everyday", "party", "boho"]
+
+def generate(
+    db: Session,
+    products: int = 1000,
+    categories: int = 10,
+    users: int = 200,
+    orders: int = 500,
+    offers: int = 6,
+    seed: int = 42,
+):
+    """Populate an empty database and return a summary of what was created"""
+    from app.auth import get_password_hash
+
+    rng = random.Random(seed)
+    now = datetime(2026, 1, 1)
+
+    # Categories
+    category_rows = []
+    for i in range(categories):
+        base = CATEGORY_NAMES[i % len(CATEGORY_NAMES)]
+        name = base if i < len(CATEGORY_NAMES) else f"{base} {i // len(CATEGORY_NAMES) + 1}"
+        category_rows.append({
+            "id": i + 1,
+            "name": name,
+            "description": f"{name} collection",
+            "icon": "gem",
+            "total_products": 0,
+            "is_active": True,
+        })
+    db.execute(insert(Category), category_rows)
+
+    # Products
+    product_rows = []
+    for i in range(products):
+        category = category_rows[rng.randrange(categories)]
+        material = rng.choice(MATERIALS)
+        style = rng.choice(STYLES)
+        retail_price = round(rng.uniform(150, 25000), 0)
+        offer_price = round(retail_price * rng.uniform(0.6, 0.95), 0) if rng.random() < 0.4 else None
+        stock = rng.randint(0, 5) if rng.random() < 0.1 else rng.randint(200, 1000)
+        product_rows.append({
+            "id": i + 1,
+            "name": f"{style.title()} {material.title()} {category['name'].rstrip('s')} {i + 1}",
+            "full_name": f"{style.title()} {material} {category['name'].lower()} #{i + 1}",
+            "type": material,
+            "retail_price": retail_price,
+            "offer_price": offer_price,
+            "price": offer_price or retail_price,
+            "original_price": retail_price,
+            "currency": "PKR",
+            "description": f"A {style} piece in {material}. Handpicked for the {category['name'].lower()} collection.",
+            "delivery_charges": 200.0,
+            "stock": stock,
+            "stock_quantity": stock,
+            "total_qty": stock,
+            "available": stock,
+            "sold": rng.randint(0, 300),
+            "location": "Store",
+            "status": "available",
+            "images": [f"uploads/products/bench_{i + 1}.jpg"],
+            "category_id": category["id"],
+            "subcategory": category["name"],
+            "is_active": rng.random() > 0.05,
+        })
+    db.execute(insert(Product), product_rows)
+    inventory.backfill_inventory(db)
+
+    # Users (bcrypt is slow, so every synthetic account shares one hash)
+    hashed_password = get_password_hash(PASSWORD)
+    user_rows = [
+        {"id": 1, "email": ADMIN_EMAIL, "username": "bench-admin", "hashed_password": hashed_password,
+         "full_name": "Bench Admin", "phone": "03000000000", "is_admin": True, "is_active": True},
+        {"id": 2, "email": CUSTOMER_EMAIL, "username": "bench-customer", "hashed_password": hashed_password,
+         "full_name": "Bench Customer", "phone": "03000000001", "is_admin": False, "is_active": True},
+    ]
+    for i in range(3, users + 1):
+        user_rows.append({
+            "id": i,
+            "email": f"user{i}@example.com",
+            "username": f"user{i}",
+            "hashed_password": hashed_password,
+            "full_name": f"Customer {i}",
+            "phone": f"03{rng.randint(100000000, 499999999)}",
+            "is_admin": False,
+            "is_active": True,
+        })
+    db.execute(insert(User), user_rows)
+
+    # Offers
+    offer_types = ["under_299", "special_deals", "deal_of_month"]
+    offer_rows = []
+    product_offer_rows = []
+    for i in range(offers):
+        offer_rows.append({
+            "id": i + 1,
+            "name": f"Offer {i + 1}",
+            "description": "Synthetic benchmark offer",
+            "offer_type": offer_types[i % len(offer_types)],
+            "discount_percentage": rng.choice([10.0, 15.0, 20.0, 30.0]),
+            "start_date": now - timedelta(days=30),
+            "end_date": now + timedelta(days=3650),
+            "is_active": True,
+        })
+        for product_id in rng.sample(range(1, products + 1), min(20, products)):
+            product_offer_rows.append({"product_id": product_id, "offer_id": i + 1})
+    if offer_rows:
+        db.execute(insert(Offer), offer_rows)
+        db.execute(insert(ProductOffer), product_offer_rows)
+
+    # Orders spread over the last 90 days
+    order_rows = []
+    item_rows = []
+    statuses = ["pending", "processing", "shipped", "delivered", "cancelled"]
+    for i in range(orders):
+        user_id = rng.choice([None, rng.randint(2, users)]) if users >= 2 else None
+        lines = rng.sample(product_rows, rng.randint(1, min(4, products)))
+        total = 0.0
+        for line in lines:
+            quantity = rng.randint(1, 3)
+            total += line["price"] * quantity
+            item_rows.append({
+                "order_id": i + 1,
+                "product_id": line["id"],
+                "quantity": quantity,
+                "price": line["price"],
+            })
+        order_rows.append({
+            "id": i + 1,
+            "user_id": user_id,
+            "order_number": f"SAI-BENCH-{i + 1:08d}",
+            "customer_name": f"Customer {i + 1}",
+            "customer_email": f"order{i + 1}@example.com",
+            "customer_phone": "03001234567",
+            "shipping_address": "Street 1, Lahore",
+            "total_amount": round(total, 2),
+            "status": rng.choice(statuses),
+            "payment_method": rng.choice(["cod", "jazzcash", "easypaisa"]),
+            "payment_status": rng.choice(["pending", "success", "success", "failed"]),
+            "created_at": now - timedelta(minutes=rng.randint(0, 90 * 24 * 60)),
+        })
+    if order_rows:
+        db.execute(insert(Order), order_rows)
+        db.execute(insert(OrderItem), item_rows)
+
+    db.commit()
+
+    return {
+        "categories": categories,
+        "products": products,
+        "users": users,
+        "offers": offers,
+        "orders": orders,
+        "order_items": len(item_rows),
+        "in_stock_product_ids": [p["id"] for p in product_rows if p["is_active"] and p["stock"] >= 50],
+        "category_ids": [c["id"] for c in category_rows],
+    }
@@ -0,0 +1,97 @@
+"""Measure cold starts of the API and fail when they exceed a budget.
+
+Usage (from store-be/):
+    python -m benchmarks.startup                       # 5 cold starts, default budget
+    python -m benchmarks.startup --runs 10 --budget-ms 1500
+
+Each run is a fresh interpreter, as a new pod or worker would be. It
+reports the time to import main, to finish the lifespan startup (pool
+and cache warm-up), and to answer a first request. The budget applies
+to the median of import plus startup, the time before a worker can
+take traffic. The schema is created once up front, as the deploy's
+migration step would.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "2500"))
+
+# Runs in the child interpreter; prints one JSON line of timings
+_CHILD = """
+import asyncio, json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def measure():
+    import httpx
+    async with main.app.router.lifespan_context(main.app):
+        ready = time.perf_counter()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+            response = await client.get("/api/products", params={"limit": 20})
+        answered = time.perf_counter()
+    return ready, answered, response.status_code
+
+ready, answered, status = asyncio.run(measure())
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (ready - imported) * 1000,
+    "first_request_ms": (answered - ready) * 1000,
+    "status": status,
+}))
+"""
+
+def _environment(database_url: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": database_url,
+        "LOG_LEVEL": "WARNING",
+        "BACKGROUND_JOBS_ENABLED": "false",
+    })
+    return env
+
+def cold_start(env: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", _CHILD], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Saiyaara API cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="Allowed median of import plus startup")
+    args = parser.parse_args(argv)
+
+    tmpdir = tempfile.mkdtemp(prefix="saiyaara-startup-")
+    env = _environment(f"sqlite:///{Path(tmpdir, 'startup.db').as_posix()}")
+    subprocess.run([sys.executable, "-m", "app.migrate"], cwd=BACKEND_DIR, env=env, capture_output=True, check=True)
+    # One untimed start compiles the bytecode, as a built image would ship it
+    cold_start(env)
+
+    runs = [cold_start(env) for _ in range(args.runs)]
+    if any(run["status"] >= 400 for run in runs):
+        raise SystemExit("first request failed during a cold start")
+
+    header = f"{'phase':<18}{'median ms':>12}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for phase in ("import_ms", "startup_ms", "first_request_ms"):
+        values = [run[phase] for run in runs]
+        print(f"{phase[:-3]:<18}{statistics.median(values):>12.1f}{max(values):>10.1f}")
+
+    ready = statistics.median(run["import_ms"] + run["startup_ms"] for run in runs)
+    print(f"\nready in {ready:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    if ready > args.budget_ms:
+        raise SystemExit(f"cold start of {ready:.0f} ms exceeds the {args.budget_ms:.0f} ms budget")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import pytest
+
+# app.database reads the URL on import, so point it (and main's schema cache) at scratch space before anything loads it
+_scratch = tempfile.mkdtemp(prefix='saiyaara-tests-')
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL", f"sqlite:///{_scratch}/test.db")
+os.environ["OPENAPI_CACHE_DIR"] = os.path.join(_scratch, "openapi")
+os.environ["BACKGROUND_JOBS_ENABLED"] = "false"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+import itertools  # noqa: E402
+from app.querycount import assert_query_budget  # noqa: E402
+
+_product_numbers = itertools.count(1)
+
+@pytest.fixture(scope="session")
+def client():
+    """A TestClient over a migrated database seeded with a small synthetic catalogue"""
+    from fastapi.testclient import TestClient
+    from app.database import SessionLocal
+    from app.migrate import migrate
+    from app.rollups import refresh_all_rollups
+    from benchmarks.seed import generate
+    import main
+
+    # The lifespan doesn't create tables (DB_AUTO_MIGRATE is off), so migrate as a deploy would
+    migrate()
+    with SessionLocal() as db:
+        generate(db, products=60, categories=5, users=10, orders=40, seed=1)
+    # As the category-rollups job would have by the time traffic arrives
+    refresh_all_rollups()
+    with TestClient(main.app) as client:
+        yield client
+
+@pytest.fixture
+def db(client):
+    """A session on the test database"""
+    from app.database import SessionLocal
+
+    with SessionLocal() as session:
+        yield session
+
+@pytest.fixture
+def admin_headers(client):
+    from app.auth import create_access_token
+    from benchmarks.seed import ADMIN_EMAIL
+
+    return {"Authorization": f"Bearer {create_access_token({'sub': ADMIN_EMAIL})}"}
+
+@pytest.fixture
+def customer_headers(client):
+    from app.auth import create_access_token
+    from benchmarks.seed import CUSTOMER_EMAIL
+
+    return {"Authorization": f"Bearer {create_access_token({'sub': CUSTOMER_EMAIL})}"}
+
+@pytest.fixture
+def make_product(db):
+    """Create a fresh active product holding `stock` units at Store, or the given {location: units}"""
+    from app import inventory
+    from app.models import Product
+
+    def make(stock: int = 10, levels: dict = None, price: float = 1000.0) -> Product:
+        product = Product(
+            name=f"Test Product {next(_product_numbers)}", retail_price=price, price=price,
+            location=inventory.DEFAULT_LOCATION, category_id=1, is_active=True
+        )
+        db.add(product)
+        db.flush()
+        for location, quantity in (levels or {inventory.DEFAULT_LOCATION: stock}).items():
+            inventory.set_level(db, product, quantity, location)
+        db.commit()
+        return product
+
+    return make
+
+@pytest.fixture
+def place_order(client):
+    """Place a guest order for {product id: quantity}; returns the response"""
+    def place(lines: dict, payment_method: str = "cod", headers: dict = None):
+        return client.post("/api/orders/guest", headers=headers or {}, json={
+            "customer_name": "Test Customer",
+            "customer_email": "test-customer@example.com",
+            "customer_phone": "03001234567",
+            "shipping_address": "1 Test Street, Lahore",
+            "payment_method": payment_method,
+            "items": [
+                {"product_id": product_id, "quantity": quantity, "price": 0}
+                for product_id, quantity in lines.items()
+            ],
+        })
+
+    return place
+
+@pytest.fixture
+def query_budget():
+    """Assert an endpoint stays within a SQL statement budget.
+
+    Usage:
+        def test_collections(client, query_budget):
+            with query_budget(3):
+                client.get("/api/collections/")
+    """
+    return assert_query_budget
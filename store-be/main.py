@@ -1,12 +1,23 @@
-from fastapi import FastAPI, Request, Depends, HTTPException, status, Query
+from fastapi import FastAPI, Request, __version__ as fastapi_version
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse, RedirectResponse, Response
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_, func
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from pathlib import Path
 from typing import Optional
+import hashlib
+import json
 import logging
 import os
+import time
+import uuid
+
+# Set up logging before anything else logs
+from app.logging_config import configure_logging, request_id_var
+configure_logging()
+logger = logging.getLogger(__name__)
 
 # Import routers
 from app.routers import (
@@ -16,58 +27,159 @@ from app.routers import (
     collections_router,
     offers_router,
     orders_router,
-    payments_router
+    payments_router,
+    inventory_router,
+    cart_router,
+    hair_accessories_router
 )
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+from app.database import engine
+from app import carts, querycount, profiler, pubsub, rankings, ratelimit, rollups, reconciliation, recommendations, reservations, typeahead
+from app.migrate import DB_AUTO_MIGRATE, migrate
+from app.scheduler import scheduler, BACKGROUND_JOBS_ENABLED
 
-# Import models after database is initialized
-from app.database import get_db, engine
-from app.models import Product, Base
+# Startup configuration
+WARM_CACHES_ON_STARTUP = os.getenv("WARM_CACHES_ON_STARTUP", "true").lower() == "true"
+OPENAPI_CACHE_DIR = os.getenv("OPENAPI_CACHE_DIR", str(Path(__file__).resolve().parent / ".cache" / "openapi"))
 
-# Create database tables
-try:
-    Base.metadata.create_all(bind=engine)
-    logger.info("Database tables created successfully")
-except Exception as e:
-    logger.error(f"Error creating database tables: {e}")
+def _source_fingerprint() -> str:
+    """Hash of the FastAPI version, main.py and the app package; any code change gets a fresh schema"""
+    root = Path(__file__).resolve().parent
+    digest = hashlib.sha256(fastapi_version.encode())
+    for path in sorted([root / "main.py", *(root / "app").rglob("*.py")]):
+        digest.update(path.relative_to(root).as_posix().encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+def _private_dir(path: str) -> Optional[Path]:
+    """`path`, created with mode 0700 if missing; None unless it is ours and nobody else can write to it"""
+    directory = Path(path)
+    try:
+        directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        info = directory.stat()
+    except OSError as e:
+        logger.warning("Could not create %s: %s", directory, e)
+        return None
+    # A schema planted by another user would be served as this API's docs
+    if info.st_uid != os.getuid() or info.st_mode & 0o022:
+        logger.warning("Not using %s: it must be owned by this user and not group or world writable", directory)
+        return None
+    return directory
 
 class CustomFastAPI(FastAPI):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         
     def openapi(self):
+        """Built on the first docs request, then shared through OPENAPI_CACHE_DIR with every later worker"""
         if self.openapi_schema:
             return self.openapi_schema
-            
-        openapi_schema = super().openapi()
-        
-        # Add support for both /path and /path/ in the OpenAPI schema
-        paths = openapi_schema.get("paths", {})
-        new_paths = {}
-        
-        for path, methods in paths.items():
-            # Add both versions of the path
-            if not path.endswith('/'):
-                new_paths[path] = methods
-                new_paths[f"{path}/"] = methods
-            else:
-                new_paths[path] = methods
-                new_paths[path.rstrip('/')] = methods
-        
-        openapi_schema["paths"] = new_paths
-        self.openapi_schema = openapi_schema
+
+        cache_dir = _private_dir(OPENAPI_CACHE_DIR)
+        cache_path = cache_dir / f"openapi-{_source_fingerprint()}.json" if cache_dir else None
+        if cache_path:
+            try:
+                self.openapi_schema = json.loads(cache_path.read_text())
+                return self.openapi_schema
+            except (OSError, ValueError):
+                pass
+
+        # Each route is listed once; the other slash variant is served by redirect_slashes
+        self.openapi_schema = super().openapi()
+
+        if cache_path:
+            try:
+                partial_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+                partial_path.write_text(json.dumps(self.openapi_schema))
+                os.replace(partial_path, cache_path)
+            except OSError as e:
+                logger.warning("Could not cache the OpenAPI schema: %s", e)
         return self.openapi_schema
 
+def warm_up():
+    """Open a pooled connection and load this worker's in-memory indexes before it takes traffic"""
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        typeahead.rebuild()
+        rankings.reload()
+    except Exception as e:
+        # Both indexes load themselves on first use, so a failure here only costs latency
+        logger.warning("Cache warm-up failed: %s", e)
+
+def add_background_jobs():
+    scheduler.add_job(
+        "payment-reconciliation",
+        reconciliation.RECONCILE_INTERVAL_SECONDS,
+        reconciliation.run_reconciliation
+    )
+    scheduler.add_job(
+        "reservation-sweeper",
+        reservations.RESERVATION_SWEEP_INTERVAL_SECONDS,
+        reservations.sweep_expired_reservations
+    )
+    scheduler.add_job(
+        "cart-cleanup",
+        carts.CART_CLEANUP_INTERVAL_SECONDS,
+        carts.cleanup_expired_carts
+    )
+    scheduler.add_job(
+        "category-rollups",
+        rollups.ROLLUP_FULL_REFRESH_INTERVAL_SECONDS,
+        rollups.refresh_all_rollups
+    )
+    scheduler.add_job(
+        "recommendations",
+        recommendations.RECOMMENDATION_REFRESH_INTERVAL_SECONDS,
+        recommendations.refresh_neighbors
+    )
+
+# Per-worker startup and shutdown. The server stops accepting connections and
+# drains in-flight requests (see app/server.py) before the shutdown half runs.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    os.makedirs("static/uploads", exist_ok=True)
+    if ratelimit.RATE_LIMIT_ENABLED:
+        # Outside the limiter's fail-open path: a redis:// URL without the redis package stops the worker
+        ratelimit.get_backend()
+    if DB_AUTO_MIGRATE:
+        try:
+            await run_in_threadpool(migrate)
+        except Exception as e:
+            logger.error("Error creating database tables: %s", e)
+    if WARM_CACHES_ON_STARTUP:
+        await run_in_threadpool(warm_up)
+    # Background jobs run in-process; the scheduler's DB lease keeps them on one worker
+    if BACKGROUND_JOBS_ENABLED:
+        add_background_jobs()
+        scheduler.start()
+    logger.info("Worker %s ready", os.getpid())
+
+    yield
+
+    await scheduler.stop()
+    await run_in_threadpool(rollups.flush_queued)
+    await pubsub.close_broker()
+    await ratelimit.close_backend()
+    engine.dispose()
+    logger.info("Worker %s stopped", os.getpid())
+
 app = CustomFastAPI(
     title="Gem-Heart Jewelry API",
     description="E-commerce API for Gem-Heart Jewelry Store",
     version="1.0.0",
-    redirect_slashes=True  # Enable automatic redirect from /path to /path/
+    redirect_slashes=True,  # Enable automatic redirect from /path to /path/
+    lifespan=lifespan
 )
 
+# Per-route token-bucket rate limits; registered before CORS so 429s still carry CORS headers
+@app.middleware("http")
+async def rate_limit(request: Request, call_next):
+    limited = await ratelimit.check_request(request)
+    if limited is not None:
+        return limited
+    return await call_next(request)
+
 # CORS middleware configuration
 origins = [
     "http://localhost:3000",
@@ -84,17 +196,61 @@ app.add_middleware(
     max_age=86400  # 24 hours
 )
 
-# Mount static files for product images
-os.makedirs("static/uploads", exist_ok=True)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Mount static files for product images (the directory is created at startup)
+app.mount("/static", StaticFiles(directory="static", check_dir=False), name="static")
 
-# Add middleware to log all requests
+# Add middleware to log all requests with a correlation id
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    logger.info(f"Incoming request: {request.method} {request.url}")
-    response = await call_next(request)
-    logger.info(f"Response status: {response.status_code}")
-    return response
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+        logger.info(
+            "%s %s -> %s in %.1fms",
+            request.method, request.url.path, response.status_code,
+            (time.perf_counter() - started) * 1000
+        )
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        request_id_var.reset(token)
+
+# Opt-in SQL statement counting and N+1 detection (SQL_QUERY_DEBUG=true)
+if querycount.QUERY_DEBUG:
+    @app.middleware("http")
+    async def count_queries(request: Request, call_next):
+        with querycount.collect_queries() as stats:
+            response = await call_next(request)
+        querycount.report(stats, request.method, request.url.path, response.headers)
+        return response
+
+# Sample stacks of slow requests (PROFILE_SLOW_REQUESTS=true) and/or on demand for admins
+# (PROFILE_ON_DEMAND=true, X-Profile: 1); with both off the middleware isn't installed
+if profiler.PROFILING_ENABLED or profiler.PROFILE_ON_DEMAND:
+    @app.middleware("http")
+    async def profile_requests(request: Request, call_next):
+        forced = (
+            profiler.PROFILE_ON_DEMAND
+            and request.headers.get(profiler.PROFILE_HEADER) == "1"
+            and await run_in_threadpool(profiler.is_admin_request, request.headers.get("Authorization"))
+        )
+        if not (profiler.PROFILING_ENABLED or forced):
+            return await call_next(request)
+
+        session = profiler.sampler.start()
+        started = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            profiler.sampler.stop(session)
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        if forced or duration_ms >= profiler.PROFILE_THRESHOLD_MS:
+            profile_id = profiler.store_profile(request.method, request.url.path, duration_ms, session)
+            response.headers["X-Profile-Id"] = str(profile_id)
+        return response
 
 # Include routers with proper ordering
 routers = [
@@ -104,97 +260,17 @@ routers = [
     (admin_router, "/api/admin", ["Admin"]),
     (offers_router, "/api/offers", ["Offers"]),
     (payments_router, "/api/payments", ["Payments"]),
+    (inventory_router, "/api/inventory", ["Inventory"]),
+    (cart_router, "/api/cart", ["Cart"]),
+    (hair_accessories_router, "/api/hair-accessories", ["Hair Accessories"]),
     (collections_router, "/api/collections", ["Collections"])
 ]
 
 # Log and include all routers
 for router, prefix, tags in routers:
-    logger.info(f"Including router at {prefix} with tags {tags}")
+    logger.debug("Including router at %s with tags %s", prefix, tags)
     app.include_router(router, prefix=prefix, tags=tags)
 
-# Handle both /api/products and /api/products/ directly in main.py
-@app.get("/api/products")
-@app.get("/api/products/")
-async def get_products(
-    request: Request,
-    category: Optional[str] = Query(None, description="Filter by category"),
-    subcategory: Optional[str] = Query(None, description="Filter by subcategory"),
-    min_price: Optional[float] = Query(None, description="Minimum price"),
-    max_price: Optional[float] = Query(None, description="Maximum price"),
-    search: Optional[str] = Query(None, description="Search in name and description"),
-    limit: Optional[int] = Query(None, description="Limit number of results"),
-    db: Session = Depends(get_db)
-):
-    logger.info("GET /api/products endpoint called from main.py")
-    logger.info(f"Query parameters - category: {category}, subcategory: {subcategory}, "
-               f"min_price: {min_price}, max_price: {max_price}, search: {search}, limit: {limit}")
-    
-    try:
-        # Start building the query
-        query = db.query(Product).options(joinedload(Product.category)).filter(Product.is_active == True)
-        logger.debug(f"Initial query: {query.statement}")
-        
-        # Apply filters if provided
-        if category:
-            if category.isdigit():
-                query = query.filter(Product.category_id == int(category))
-            else:
-                category_filter = category.replace('-', ' ').lower()
-                query = query.filter(
-                    or_(
-                        Product.subcategory.ilike(f"%{category_filter}%"),
-                        func.lower(Product.subcategory) == category_filter
-                    )
-                )
-        
-        if subcategory:
-            query = query.filter(Product.subcategory == subcategory)
-        
-        if min_price is not None:
-            query = query.filter(
-                (Product.offer_price >= min_price) | 
-                ((Product.offer_price == None) & (Product.retail_price >= min_price))
-            )
-        
-        if max_price is not None:
-            query = query.filter(
-                (Product.offer_price <= max_price) | 
-                ((Product.offer_price == None) & (Product.retail_price <= max_price))
-            )
-        
-        if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                (Product.name.ilike(search_term)) | 
-                (Product.description.ilike(search_term)) |
-                (Product.full_name.ilike(search_term))
-            )
-        
-        if limit:
-            query = query.limit(limit)
-        
-        # Execute the query
-        products = query.all()
-        logger.info(f"Found {len(products)} products")
-        
-        # Set legacy fields for backward compatibility
-        for product in products:
-            if not hasattr(product, 'price') or product.price is None:
-                product.price = getattr(product, 'offer_price', None) or getattr(product, 'retail_price', 0)
-            if not hasattr(product, 'original_price') or product.original_price is None:
-                product.original_price = getattr(product, 'retail_price', 0)
-            if not hasattr(product, 'stock_quantity') or product.stock_quantity is None:
-                product.stock_quantity = getattr(product, 'stock', 0)
-        
-        return products
-        
-    except Exception as e:
-        logger.error(f"Error in get_products: {str(e)}", exc_info=True)
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error retrieving products: {str(e)}"
-        )
-
 @app.get("/")
 async def root():
     return {"message": "Welcome to Gem-Heart Jewelry API"}
@@ -221,7 +297,7 @@ async def options_handler(request: Request):
         headers={
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
-            "Access-Control-Allow-Headers": "Content-Type, Authorization, Accept, Origin, User-Agent",
+            "Access-Control-Allow-Headers": "Content-Type, Authorization, Accept, Origin, User-Agent, X-Cart-Token",
             "Access-Control-Max-Age": "86400",
         }
     )
@@ -0,0 +1,12 @@
+from app.cache import TTLCache
+
+def test_value_loaded_across_an_invalidation_is_not_stored():
+    cache = TTLCache(ttl=60)
+
+    def load_while_another_request_changes_it():
+        cache.invalidate("cart")
+        return "before the change"
+
+    assert cache.get_or_set("cart", load_while_another_request_changes_it) == "before the change"
+    assert cache.get_or_set("cart", lambda: "after the change") == "after the change"
+    assert cache.get_or_set("cart", lambda: "not loaded again") == "after the change"
@@ -0,0 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from app import inventory
+from app.carts import MAX_LINE_QUANTITY
+from app.models import Cart, CartLine
+from benchmarks.seed import CUSTOMER_EMAIL, PASSWORD
+
+def _add(client, product_id, quantity, token=None):
+    headers = {"X-Cart-Token": token} if token else {}
+    return client.post("/api/cart/items", json={"product_id": product_id, "quantity": quantity}, headers=headers)
+
+def _quantities(response):
+    return {item["product_id"]: item["quantity"] for item in response.json()["items"]}
+
+@pytest.mark.parametrize("quantity", [0, -3, MAX_LINE_QUANTITY + 1])
+def test_add_rejects_quantities_out_of_range(client, make_product, quantity):
+    product = make_product()
+    token = _add(client, product.id, 5).json()["token"]
+
+    assert _add(client, product.id, quantity, token).status_code == 422
+    assert _quantities(client.get("/api/cart/", headers={"X-Cart-Token": token})) == {product.id: 5}
+
+def test_add_rejects_totals_over_the_line_limit(client, make_product):
+    product = make_product(stock=200)
+    token = _add(client, product.id, MAX_LINE_QUANTITY).json()["token"]
+
+    assert _add(client, product.id, 1, token).status_code == 400
+
+@pytest.mark.parametrize("quantity", [-1, MAX_LINE_QUANTITY + 1])
+def test_update_rejects_quantities_out_of_range(client, make_product, quantity):
+    product = make_product()
+    token = _add(client, product.id, 2).json()["token"]
+
+    response = client.put(f"/api/cart/items/{product.id}", json={"quantity": quantity}, headers={"X-Cart-Token": token})
+    assert response.status_code == 422
+
+def test_adding_a_product_again_increments_its_line(client, make_product):
+    product = make_product()
+    token = _add(client, product.id, 2).json()["token"]
+
+    assert _quantities(_add(client, product.id, 3, token)) == {product.id: 5}
+
+def test_concurrent_adds_all_count(client, make_product):
+    product, other = make_product(), make_product()
+    token = _add(client, other.id, 1).json()["token"]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        statuses = list(executor.map(lambda _: _add(client, product.id, 1, token).status_code, range(8)))
+
+    assert statuses == [200] * 8
+    assert _quantities(client.get("/api/cart/", headers={"X-Cart-Token": token}))[product.id] == 8
+
+def test_login_merges_the_guest_cart(client, make_product, customer_headers):
+    shared, guest_only = make_product(), make_product()
+    client.post("/api/cart/items", json={"product_id": shared.id, "quantity": 1}, headers=customer_headers)
+    token = _add(client, shared.id, 2).json()["token"]
+    _add(client, guest_only.id, 4, token)
+
+    response = client.post(
+        "/api/auth/login", json={"email": CUSTOMER_EMAIL, "password": PASSWORD}, headers={"X-Cart-Token": token}
+    )
+    assert response.status_code == 200
+
+    merged = _quantities(client.get("/api/cart/", headers=customer_headers))
+    assert merged[shared.id] == 3
+    assert merged[guest_only.id] == 4
+    # The guest cart was folded in, not copied
+    assert client.get("/api/cart/", headers={"X-Cart-Token": token}).json()["items"] == []
+
+def test_checkout_rejects_out_of_stock_lines_without_taking_stock(client, db, make_product, place_order):
+    scarce, plenty = make_product(stock=1), make_product(stock=10)
+
+    response = place_order({plenty.id: 2, scarce.id: 2})
+
+    assert response.status_code == 400
+    assert "Insufficient stock" in response.json()["detail"]
+    assert inventory.on_hand(db, [scarce.id, plenty.id]) == {scarce.id: 1, plenty.id: 10}
+
+def test_checkout_rejects_lines_for_products_no_longer_sold(client, db, make_product, place_order):
+    product = make_product()
+    token = _add(client, product.id, 1).json()["token"]
+    product.is_active = False
+    db.commit()
+
+    response = place_order({product.id: 1}, headers={"X-Cart-Token": token})
+
+    assert response.status_code == 404
+    assert inventory.on_hand(db, [product.id]) == {product.id: 10}
+    # A failed checkout leaves the cart as it was
+    assert db.query(CartLine).join(Cart).filter(Cart.token == token).count() == 1
@@ -0,0 +1,68 @@
+from sqlalchemy import update
+from app import inventory, reservations
+from app.models import InventoryLevel, Order, StockReservation
+
+def _levels(db, product):
+    db.expire_all()
+    return inventory.levels_by_product(db, [product.id])[product.id]
+
+def test_allocation_order_puts_configured_locations_first_then_the_fullest(monkeypatch):
+    monkeypatch.setattr(inventory, "INVENTORY_ALLOCATION_ORDER", ["Store", "Warehouse"])
+
+    order = inventory.allocation_order({"Depot": 1, "Warehouse": 2, "Outlet": 9, "Store": 0})
+
+    assert order == ["Store", "Warehouse", "Outlet", "Depot"]
+
+def test_take_spills_over_into_the_next_location(db, make_product):
+    product = make_product(levels={"Store": 2, "Warehouse": 5})
+
+    assert inventory.take(db, product, 4) == {"Store": 2, "Warehouse": 2}
+    db.commit()
+
+    assert _levels(db, product) == {"Store": 0, "Warehouse": 3}
+    assert product.stock_quantity == 3
+
+def test_take_returns_none_when_short(db, make_product):
+    product = make_product(levels={"Store": 2, "Warehouse": 1})
+
+    assert inventory.take(db, product, 4) is None
+    db.rollback()
+
+    assert _levels(db, product) == {"Store": 2, "Warehouse": 1}
+
+def test_take_rereads_the_levels_when_another_order_got_there_first(db, make_product, monkeypatch):
+    product = make_product(levels={"Store": 3, "Warehouse": 5})
+    allocation_order = inventory.allocation_order
+    calls = []
+
+    def racing_allocation_order(levels):
+        # Another order takes two Store units between our read and our conditional UPDATE
+        if not calls:
+            db.execute(update(InventoryLevel).where(
+                InventoryLevel.product_id == product.id, InventoryLevel.location == "Store"
+            ).values(quantity=1))
+        calls.append(dict(levels))
+        return allocation_order(levels)
+
+    monkeypatch.setattr(inventory, "allocation_order", racing_allocation_order)
+
+    assert inventory.take(db, product, 3) == {"Store": 1, "Warehouse": 2}
+    db.commit()
+
+    assert calls == [{"Store": 3, "Warehouse": 5}, {"Store": 1, "Warehouse": 5}]
+    assert _levels(db, product) == {"Store": 0, "Warehouse": 3}
+
+def test_released_stock_goes_back_to_the_location_it_came_from(db, make_product, place_order):
+    product = make_product(levels={"Store": 1, "Warehouse": 5})
+    order = db.get(Order, place_order({product.id: 3}, payment_method="jazzcash").json()["id"])
+
+    holds = db.query(StockReservation.location, StockReservation.quantity).filter(
+        StockReservation.order_id == order.id
+    ).order_by(StockReservation.location).all()
+    assert holds == [("Store", 1), ("Warehouse", 2)]
+    assert _levels(db, product) == {"Store": 0, "Warehouse": 3}
+
+    reservations.release_order(db, order)
+    db.commit()
+
+    assert _levels(db, product) == {"Store": 1, "Warehouse": 5}
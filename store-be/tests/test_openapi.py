@@ -0,0 +1,23 @@
+import os
+import main
+
+def test_schema_lists_each_route_once(client):
+    schema = client.get("/openapi.json").json()
+
+    paths = set(schema["paths"])
+    assert not {path for path in paths if path.endswith("/") and path.rstrip("/") in paths}
+    operation_ids = [operation["operationId"] for methods in schema["paths"].values() for operation in methods.values()]
+    assert len(operation_ids) == len(set(operation_ids))
+
+def test_schema_cache_dir_is_created_private(tmp_path):
+    directory = main._private_dir(str(tmp_path / "openapi"))
+
+    assert directory == tmp_path / "openapi"
+    assert directory.stat().st_mode & 0o777 == 0o700
+
+def test_schema_cache_dir_others_can_write_to_is_refused(tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    os.chmod(shared, 0o777)
+
+    assert main._private_dir(str(shared)) is None
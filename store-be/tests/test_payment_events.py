@@ -0,0 +1,90 @@
+import uuid
+import pytest
+from app import ledger, payment_events, reservations
+from app.models import Order, PaymentCallbackEvent, StockReservation
+from app.routers import payments
+
+def _callback(client, transaction_id, response_code):
+    return client.post("/api/payments/jazzcash/callback", json={
+        "pp_ResponseCode": response_code, "pp_TxnRefNo": transaction_id, "pp_ResponseMessage": "test"
+    })
+
+@pytest.fixture
+def published(monkeypatch):
+    """Transaction ids whose status was published, instead of publishing them"""
+    published = []
+
+    async def publish(transaction_id):
+        published.append(transaction_id)
+
+    async def notify(email, order_number, amount, status):
+        pass
+
+    monkeypatch.setattr(payments, "_publish_payment_status", publish)
+    monkeypatch.setattr(payments, "send_payment_notification", notify)
+    return published
+
+@pytest.fixture
+def pending_payment(db, make_product, place_order):
+    """A jazzcash order with one pending attempt; returns the order and the attempt's transaction id"""
+    product = make_product()
+    order = db.get(Order, place_order({product.id: 1}, payment_method="jazzcash").json()["id"])
+    transaction_id = f"TX-EV-{uuid.uuid4().hex[:12]}"
+    ledger.record_attempt(db, order, "jazzcash", transaction_id, order.total_amount)
+    db.commit()
+    return order, transaction_id
+
+def _hold_statuses(db, order):
+    return [status for (status,) in db.query(StockReservation.status).filter(StockReservation.order_id == order.id)]
+
+def test_duplicate_callback_is_acknowledged_without_side_effects(client, db, pending_payment, published):
+    order, transaction_id = pending_payment
+    assert _callback(client, transaction_id, "000").json().get("duplicate") is None
+
+    response = _callback(client, transaction_id, "000")
+
+    assert response.status_code == 200
+    assert response.json()["duplicate"] is True
+    assert published == [transaction_id]
+    db.expire_all()
+    payment = ledger.find_payment(db, transaction_id)
+    assert [entry.to_status for entry in payment.history] == ["pending", "success"]
+    assert db.query(PaymentCallbackEvent).filter(PaymentCallbackEvent.reference == transaction_id).count() == 1
+
+def test_duplicate_is_caught_by_the_database_when_the_filter_has_not_seen_it(db, pending_payment, monkeypatch):
+    _, transaction_id = pending_payment
+    assert payment_events.register_callback(db, "jazzcash", transaction_id, "000", {})
+    db.commit()
+
+    # A fresh filter, as after a restart or in another worker
+    monkeypatch.setattr(payment_events, "seen_events", payment_events.BloomFilter(100, 0.01))
+
+    assert not payment_events.register_callback(db, "jazzcash", transaction_id, "000", {})
+
+def test_failure_after_success_is_refused(client, db, pending_payment, published):
+    order, transaction_id = pending_payment
+    _callback(client, transaction_id, "000")
+
+    assert _callback(client, transaction_id, "999").status_code == 200
+
+    db.expire_all()
+    assert ledger.find_payment(db, transaction_id).status == "success"
+    assert db.get(Order, order.id).payment_status == "success"
+    assert _hold_statuses(db, order) == [reservations.CONVERTED]
+    assert published == [transaction_id]
+
+@pytest.mark.parametrize("old_status, new_status", [
+    ("success", "failed"), ("success", "pending"), ("refunded", "success"), ("pending", "refunded"), ("pending", "pending")
+])
+def test_illegal_order_transitions_change_nothing(db, pending_payment, old_status, new_status):
+    order, _ = pending_payment
+    order.payment_status = old_status
+    db.commit()
+
+    assert not payment_events.can_transition(old_status, new_status)
+    assert not payment_events.transition_order_payment(db, order, new_status)
+    db.commit()
+
+    db.expire_all()
+    assert db.get(Order, order.id).payment_status == old_status
+    assert _hold_statuses(db, order) == [reservations.ACTIVE]
@@ -0,0 +1,35 @@
+from app import ledger
+from app.models import Order
+from app.routers import payments
+
+def _callback(client, transaction_id, response_code):
+    return client.post("/api/payments/jazzcash/callback", json={
+        "pp_ResponseCode": response_code, "pp_TxnRefNo": transaction_id, "pp_ResponseMessage": "test"
+    })
+
+def test_late_failure_of_another_attempt_leaves_paid_order_alone(client, db, make_product, place_order, monkeypatch):
+    published, notified = [], []
+
+    async def publish(transaction_id):
+        published.append(transaction_id)
+
+    async def notify(email, order_number, amount, status):
+        notified.append(status)
+
+    monkeypatch.setattr(payments, "_publish_payment_status", publish)
+    monkeypatch.setattr(payments, "send_payment_notification", notify)
+
+    product = make_product()
+    order = db.get(Order, place_order({product.id: 1}, payment_method="jazzcash").json()["id"])
+    ledger.record_attempt(db, order, "jazzcash", f"TX-A-{order.id}", order.total_amount)
+    ledger.record_attempt(db, order, "jazzcash", f"TX-B-{order.id}", order.total_amount)
+    db.commit()
+
+    assert _callback(client, f"TX-A-{order.id}", "000").status_code == 200
+    assert _callback(client, f"TX-B-{order.id}", "999").status_code == 200
+
+    db.refresh(order)
+    assert order.payment_status == "success"
+    assert ledger.find_payment(db, f"TX-B-{order.id}").status == "failed"
+    assert published == [f"TX-A-{order.id}"]
+    assert notified == ["success"]
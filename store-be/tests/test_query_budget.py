@@ -0,0 +1,15 @@
+from app import rollups
+
+def test_collections_query_budget(client, query_budget):
+    # Uncached: rollup check, counts, categories
+    rollups.dashboard_cache.clear()
+    with query_budget(3):
+        response = client.get("/api/collections/")
+    assert response.status_code == 200
+    assert response.json()
+
+def test_product_list_query_budget(client, query_budget):
+    with query_budget(4):
+        response = client.get("/api/products/", params={"limit": 20})
+    assert response.status_code == 200
+    assert len(response.json()) == 20
@@ -0,0 +1,23 @@
+from datetime import datetime
+from app import rankings
+from app.models import ProductTrend
+
+def test_trend_rows_far_from_their_epoch_are_rebased_instead_of_overflowing(db, make_product):
+    product = make_product()
+    rankings.record_paid_units(db, [(product.id, product.category_id, 1)], 1, datetime.utcnow())
+    db.commit()
+    # Decades of half-lives: the weight against this epoch is far beyond float range
+    db.query(ProductTrend).filter(ProductTrend.product_id == product.id).update({"epoch": datetime(2000, 1, 1)})
+    db.commit()
+
+    ordered_at = datetime.utcnow()
+    rankings.record_paid_units(db, [(product.id, product.category_id, 2)], 1, ordered_at)
+    db.commit()
+    rankings.record_paid_units(db, [(product.id, product.category_id, 2)], -1, ordered_at)
+    db.commit()
+
+    trend = db.query(ProductTrend).filter(ProductTrend.product_id == product.id).one()
+    db.refresh(trend)
+    assert trend.epoch > datetime(2000, 1, 1)
+    # The old unit decayed to nothing; the refund took back exactly what the payment added
+    assert abs(trend.score) < 1e-9
@@ -0,0 +1,32 @@
+import asyncio
+import fakeredis.aioredis
+from starlette.requests import Request
+from app import ratelimit
+
+def _request(headers=None, path="/api/payments/jazzcash/initiate", client="203.0.113.7"):
+    return Request({
+        "type": "http",
+        "method": "POST",
+        "path": path,
+        "query_string": b"",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+        "client": (client, 50000),
+    })
+
+def test_redis_backend_take_empties_bucket():
+    async def take_all():
+        backend = ratelimit.RedisBackend(client=fakeredis.aioredis.FakeRedis())
+        waits = [await backend.take("login:ip:203.0.113.7", capacity=2, rate=1 / 60) for _ in range(3)]
+        other = await backend.take("login:ip:198.51.100.1", capacity=2, rate=1 / 60)
+        await backend.close()
+        return waits, other
+
+    waits, other = asyncio.run(take_all())
+    assert waits[:2] == [0.0, 0.0]
+    assert 0 < waits[2] <= 60
+    assert other == 0.0
+
+def test_forged_bearer_token_is_keyed_on_address():
+    policy = ratelimit.Policy("payments", frozenset({"POST"}), "/api/payments/", 5, 10, key="user")
+    key = asyncio.run(ratelimit._client_key(policy, _request({"Authorization": "Bearer forged"})))
+    assert key == "ip:203.0.113.7"
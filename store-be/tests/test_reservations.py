@@ -0,0 +1,107 @@
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from app import inventory, ledger, reservations
+from app.models import Order, StockReservation
+
+@pytest.fixture
+def gateway_order(db, make_product, place_order):
+    """A jazzcash order for 3 of a fresh 10-unit product and the reference of its pending payment"""
+    product = make_product(stock=10)
+    order = db.get(Order, place_order({product.id: 3}, payment_method="jazzcash").json()["id"])
+    reference = f"TX-HOLD-{uuid.uuid4().hex[:12]}"
+    ledger.record_attempt(db, order, "jazzcash", reference, order.total_amount)
+    db.commit()
+    return order, product, reference
+
+def _holds(db, order_id):
+    db.expire_all()
+    return [(hold.status, hold.quantity) for hold in db.query(StockReservation).filter(StockReservation.order_id == order_id)]
+
+def _on_hand(db, product):
+    return inventory.on_hand(db, [product.id])[product.id]
+
+def _callback(client, reference, response_code):
+    response = client.post("/api/payments/jazzcash/callback", json={
+        "pp_ResponseCode": response_code, "pp_TxnRefNo": reference, "pp_ResponseMessage": "test"
+    })
+    assert response.status_code == 200
+
+def test_gateway_order_holds_its_stock_until_it_expires(db, gateway_order):
+    order, product, reference = gateway_order
+
+    hold = db.query(StockReservation).filter(StockReservation.order_id == order.id).one()
+    assert (hold.status, hold.quantity) == (reservations.ACTIVE, 3)
+    assert hold.expires_at > datetime.utcnow()
+    assert _on_hand(db, product) == 7
+
+def test_cash_on_delivery_order_is_sold_at_once(db, make_product, place_order):
+    product = make_product(stock=10)
+    order = db.get(Order, place_order({product.id: 2}).json()["id"])
+
+    assert _holds(db, order.id) == [(reservations.CONVERTED, 2)]
+    assert _on_hand(db, product) == 8
+
+def test_payment_success_converts_the_hold(client, db, gateway_order):
+    order, product, reference = gateway_order
+
+    _callback(client, reference, "000")
+
+    assert _holds(db, order.id) == [(reservations.CONVERTED, 3)]
+    assert _on_hand(db, product) == 7
+
+def test_payment_failure_releases_the_hold(client, db, gateway_order):
+    order, product, reference = gateway_order
+
+    _callback(client, reference, "999")
+
+    assert _holds(db, order.id) == [(reservations.RELEASED, 3)]
+    assert _on_hand(db, product) == 10
+
+def test_cancelling_a_paid_order_restocks_it(client, db, gateway_order, admin_headers):
+    order, product, reference = gateway_order
+    _callback(client, reference, "000")
+
+    response = client.put(f"/api/admin/orders/{order.id}", json={"status": "cancelled"}, headers=admin_headers)
+
+    assert response.status_code == 200
+    assert _holds(db, order.id) == [(reservations.RELEASED, 3)]
+    assert _on_hand(db, product) == 10
+
+def test_deleting_an_order_restocks_it_and_drops_its_holds(client, db, gateway_order, admin_headers):
+    order, product, reference = gateway_order
+    order_id = order.id
+
+    assert client.delete(f"/api/admin/orders/{order_id}", headers=admin_headers).status_code == 200
+
+    assert _holds(db, order_id) == []
+    assert _on_hand(db, product) == 10
+
+def test_sweeper_releases_expired_holds_and_a_late_payment_takes_the_stock_again(client, db, gateway_order):
+    order, product, reference = gateway_order
+    db.query(StockReservation).filter(StockReservation.order_id == order.id).update(
+        {"expires_at": datetime.utcnow() - timedelta(minutes=1)}
+    )
+    db.commit()
+
+    assert reservations.sweep_expired_reservations() >= 1
+    assert _holds(db, order.id) == [(reservations.RELEASED, 3)]
+    assert _on_hand(db, product) == 10
+
+    _callback(client, reference, "000")
+    assert _holds(db, order.id) == [(reservations.CONVERTED, 3)]
+    assert _on_hand(db, product) == 7
+
+def test_repeated_convert_and_release_change_nothing(db, gateway_order):
+    order, product, reference = gateway_order
+
+    reservations.convert_order(db, order)
+    reservations.convert_order(db, order)
+    db.commit()
+    assert _on_hand(db, product) == 7
+
+    assert reservations.release_order(db, order, include_converted=True) == 1
+    assert reservations.release_order(db, order, include_converted=True) == 0
+    db.commit()
+    assert _holds(db, order.id) == [(reservations.RELEASED, 3)]
+    assert _on_hand(db, product) == 10
@@ -12,22 +12,35 @@ const PaymentStatus: React.FC<PaymentStatusProps> = ({ transactionId, onComplete
   const [message, setMessage] = useState('Processing your payment...');
 
   useEffect(() => {
+    let pollTimer: ReturnType<typeof setTimeout> | undefined;
+    let source: EventSource | undefined;
+    let finished = false;
+
+    // Returns true once the payment reached a final state
+    const handleStatus = (data: { status: string }) => {
+      if (data.status === 'success') {
+        setStatus('success');
+        setMessage('Payment successful! You will receive a confirmation notification.');
+        onComplete('success');
+        return true;
+      }
+      if (data.status === 'failed') {
+        setStatus('failed');
+        setMessage('Payment failed. Please try again.');
+        onComplete('failed');
+        return true;
+      }
+      return false;
+    };
+
     const checkPaymentStatus = async () => {
       try {
         const response = await fetch(`/api/payments/status/${transactionId}`);
         const data = await response.json();
         
-        if (data.status === 'success') {
-          setStatus('success');
-          setMessage('Payment successful! You will receive a confirmation notification.');
-          onComplete('success');
-        } else if (data.status === 'failed') {
-          setStatus('failed');
-          setMessage('Payment failed. Please try again.');
-          onComplete('failed');
-        } else {
+        if (!finished && !handleStatus(data)) {
           // Still pending, continue polling
-          setTimeout(checkPaymentStatus, 3000);
+          pollTimer = setTimeout(checkPaymentStatus, 3000);
         }
       } catch (error) {
         setStatus('failed');
@@ -36,7 +49,32 @@ const PaymentStatus: React.FC<PaymentStatusProps> = ({ transactionId, onComplete
       }
     };
 
-    checkPaymentStatus();
+    if (typeof EventSource !== 'undefined') {
+      // The server pushes every status change; fall back to polling if the stream breaks
+      source = new EventSource(`/api/payments/status/${transactionId}/stream`);
+      source.onmessage = (event) => {
+        if (handleStatus(JSON.parse(event.data))) {
+          finished = true;
+          source?.close();
+        }
+      };
+      source.onerror = () => {
+        source?.close();
+        if (!finished) {
+          checkPaymentStatus();
+        }
+      };
+    } else {
+      checkPaymentStatus();
+    }
+
+    return () => {
+      finished = true;
+      source?.close();
+      if (pollTimer) {
+        clearTimeout(pollTimer);
+      }
+    };
   }, [transactionId, onComplete]);
 
   if (status === 'loading') {
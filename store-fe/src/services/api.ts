@@ -25,6 +25,11 @@ api.interceptors.request.use(
     if (token) {
       config.headers.Authorization = `Bearer ${token}`;
     }
+    // Guest cart token; the server merges the cart into the account on login
+    const cartToken = localStorage.getItem("cartToken");
+    if (cartToken) {
+      config.headers["X-Cart-Token"] = cartToken;
+    }
     
     // Log the request
     console.log(`[API Request] ${config.method?.toUpperCase()} ${config.url}`, {
@@ -120,10 +125,38 @@ export const authAPI = {
 
 // Product API
 export const productAPI = {
+  // filters.attr takes a list such as ["material:gold|silver", "stone:pearl"]; sent as repeated attr=
   getProducts: (filters?: any) =>
-    api.get("/api/products/", { params: filters }).then((res) => res.data),
+    api
+      .get("/api/products/", { params: filters, paramsSerializer: { indexes: null } })
+      .then((res) => res.data),
+  // Homepage "popular" rails; categoryId narrows to one category
+  getBestsellers: (categoryId?: number, limit = 12) =>
+    api
+      .get("/api/products/bestsellers", { params: { category_id: categoryId, limit } })
+      .then((res) => res.data),
+  getTrending: (categoryId?: number, limit = 12) =>
+    api
+      .get("/api/products/trending", { params: { category_id: categoryId, limit } })
+      .then((res) => res.data),
+  // Frequently bought together (precomputed from paid orders)
+  getRelatedProducts: (id: number, limit = 8) =>
+    api.get(`/api/products/${id}/related`, { params: { limit } }).then((res) => res.data),
+  // Search-as-you-type: [{ type: "category" | "subcategory" | "product", id, label }]
+  suggest: (q: string, limit = 8, signal?: AbortSignal) =>
+    api
+      .get("/api/products/suggest", { params: { q, limit }, signal })
+      .then((res) => res.data),
+  // { material: { gold: 12, silver: 8 }, ... } for building filter menus
+  getAttributeValues: (names?: string[]) =>
+    api
+      .get("/api/products/attributes", { params: { names: names?.join(",") } })
+      .then((res) => res.data),
   getProductById: (id: number) =>
-    api.get(`/api/products/${id}/`).then((res) => res.data),
+    api.get(`/api/products/${id}`).then((res) => res.data),
+  // Several products (e.g. cart or wishlist lines) in one request: { items, missing }
+  getProductsByIds: (ids: number[]) =>
+    api.get("/api/products/batch", { params: { ids: ids.join(",") } }).then((res) => res.data),
   getCategories: () => api.get("/api/categories/").then((res) => res.data),
   getSubcategories: (category?: string) =>
     api
@@ -138,6 +171,62 @@ export const productAPI = {
       .then((res) => res.data),
 };
 
+// Inventory API
+export const inventoryAPI = {
+  // Stock for many products (e.g. every cart line) in one request
+  getAvailability: (ids: number[], locations = false) =>
+    api
+      .get("/api/inventory/availability", { params: { ids: ids.join(","), locations } })
+      .then((res) => res.data),
+};
+
+// Hair accessories API
+export const hairAccessoryAPI = {
+  // Pass the previous page's next_cursor as cursor to keep paging
+  getPage: (params?: {
+    category?: string;
+    material?: string;
+    color?: string;
+    min_price?: number;
+    max_price?: number;
+    cursor?: number;
+    limit?: number;
+  }) => api.get("/api/hair-accessories", { params }).then((res) => res.data),
+
+  getFacets: (params?: { category?: string; material?: string; color?: string }) =>
+    api.get("/api/hair-accessories/facets", { params }).then((res) => res.data),
+
+  getFeatured: (limit = 12) =>
+    api.get("/api/hair-accessories/featured", { params: { limit } }).then((res) => res.data),
+
+  getById: (id: number) =>
+    api.get(`/api/hair-accessories/${id}`).then((res) => res.data),
+};
+
+// Cart API (server-side cart, priced and stock-checked on every read)
+const keepCartToken = (res: { headers: Record<string, any>; data: any }) => {
+  const cartToken = res.headers["x-cart-token"];
+  if (cartToken) {
+    localStorage.setItem("cartToken", cartToken);
+  }
+  return res.data;
+};
+
+export const cartAPI = {
+  getCart: () => api.get("/api/cart").then(keepCartToken),
+
+  addItem: (productId: number, quantity = 1) =>
+    api.post("/api/cart/items", { product_id: productId, quantity }).then(keepCartToken),
+
+  updateItem: (productId: number, quantity: number) =>
+    api.put(`/api/cart/items/${productId}`, { quantity }).then(keepCartToken),
+
+  removeItem: (productId: number) =>
+    api.delete(`/api/cart/items/${productId}`).then(keepCartToken),
+
+  clear: () => api.delete("/api/cart").then(keepCartToken),
+};
+
 // Order API
 export const orderAPI = {
   createGuestOrder: (orderData: {
@@ -158,8 +247,23 @@ export const orderAPI = {
     items: { product_id: number; quantity: number; price: number }[];
   }) => api.post("/orders", orderData).then((res) => res.data),
 
+  // Guest order tracking: the email or phone used at checkout must match
+  trackOrder: (lookup: { order_number: string; email?: string; phone?: string }) =>
+    api.post("/orders/track", lookup).then((res) => res.data),
+
   getUserOrders: () => api.get("/orders/my-orders").then((res) => res.data),
 
+  // Paged order history: summaries without items, or with items and products
+  getOrderHistory: (cursor?: number, limit = 20) =>
+    api
+      .get("/orders/history", { params: { cursor, limit } })
+      .then((res) => res.data),
+
+  getOrderHistoryDetailed: (cursor?: number, limit = 10) =>
+    api
+      .get("/orders/history/detailed", { params: { cursor, limit } })
+      .then((res) => res.data),
+
   getOrderById: (id: number) =>
     api.get(`/orders/${id}`).then((res) => res.data),
 };